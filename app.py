@@ -4,20 +4,25 @@ from datetime import datetime, timedelta
 import json
 import logging
 import os
+import threading
 from functools import wraps
 from dotenv import load_dotenv
 from sqlalchemy.orm import joinedload
 from config import config
-from models import db, Funcionario, Restricao, Turno, Escala, Configuracao
+from models import db, Funcionario, Restricao, Turno, Escala, Configuracao, TarefaGeracao
 from otimizador_mensal import OtimizadorMensal
-
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from tarefas import GestorTarefas, MODO_LOCAL, ESPERA_SOLUCAO
+from grelha_escalas import consulta_grelha_mensal, montar_grelha_escalas
+from migracoes import aplicar_colunas, aplicar_indices
+from perfis_solver import listar_perfis, criar_perfis_predefinidos
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Configurar logging (LOG_LEVEL=DEBUG ativa os diagnósticos detalhados da geração)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'sua_chave_secreta_aqui'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/escalas.db'
@@ -30,6 +35,35 @@ app.config.from_object(config[config_name])
 # Inicializar SQLAlchemy com a aplicação
 db.init_app(app)
 
+# Pool de workers para gerar escalas fora do pedido HTTP (ou só a fila, com o servico_solver.py)
+gestor_tarefas = GestorTarefas(
+    app,
+    max_workers=app.config['GERACAO_MAX_WORKERS'],
+    max_threads=app.config['GERACAO_MAX_THREADS'],
+    modo=app.config['GERACAO_MODO']
+)
+
+_base_preparada = False
+_lock_base = threading.Lock()
+
+def preparar_base_de_dados():
+    """Cria as tabelas e acrescenta as colunas, os índices e os perfis em falta (uma vez por processo)"""
+    global _base_preparada
+    with _lock_base:
+        if _base_preparada:
+            return
+        db.create_all()
+        # create_all não acrescenta colunas nem índices a tabelas que já existem
+        aplicar_colunas()
+        aplicar_indices()
+        criar_perfis_predefinidos()
+        _base_preparada = True
+
+@app.before_request
+def garantir_base_de_dados():
+    """Migra a base de dados no primeiro pedido, seja qual for o servidor (python app.py, flask run, gunicorn)"""
+    preparar_base_de_dados()
+
 # Funções helper para tratamento de erros consistentes
 def flash_success(message):
     """Exibe mensagem de sucesso padronizada"""
@@ -79,6 +113,32 @@ def safe_int_conversion(value, field_name, min_val=None, max_val=None):
     except (ValueError, TypeError):
         return None, f"O valor de '{field_name}' deve ser um número válido."
 
+def consulta_escalas_futuras(coluna, valor, desde):
+    """Contagem das escalas a partir de desde com coluna == valor (funcionário, turno ou valência)"""
+    return db.session.query(db.func.count(Escala.id)).filter(coluna == valor, Escala.data >= desde)
+
+def reparar_escalas_afetadas(funcionario, data_inicio, data_fim):
+    """Põe na fila a reparação, mês a mês, das escalas em que o funcionário trabalha durante a nova restrição"""
+    escalas_afetadas = db.session.query(db.func.count(Escala.id)).filter(
+        Escala.funcionario_id == funcionario.id,
+        Escala.data >= data_inicio,
+        Escala.data <= data_fim
+    ).scalar()
+    if not escalas_afetadas:
+        return
+    
+    mes, ano = data_inicio.month, data_inicio.year
+    while (ano, mes) <= (data_fim.year, data_fim.month):
+        try:
+            gestor_tarefas.submeter(mes, ano, funcionario.valencia,
+                                    reparacao=(funcionario.id, data_inicio, data_fim))
+            flash_info(f'A reparação da escala de {mes}/{ano} foi posta na fila; '
+                       f'o resultado aparece na escala do mês quando terminar.')
+        except Exception as e:
+            logger.error(f"Erro ao pedir a reparação da escala de {mes}/{ano}: {str(e)}")
+            flash_warning(f'Erro ao reparar a escala de {mes}/{ano}. Gere novamente a escala do mês.')
+        mes, ano = (1, ano + 1) if mes == 12 else (mes + 1, ano)
+
 @app.route('/')
 def index():
     # Otimizar queries com joinedload
@@ -122,6 +182,7 @@ def adicionar_funcionario():
             funcionario = Funcionario(
                 nome=request.form['nome'].strip(),
                 valencia=request.form['valencia'],
+                equipa=request.form.get('equipa', '').strip() or None,
                 ativo=True
             )
             db.session.add(funcionario)
@@ -147,10 +208,7 @@ def eliminar_funcionario(id):
     funcionario = Funcionario.query.get_or_404(id)
     
     # Verificar se há escalas futuras
-    escalas_futuras = db.session.query(db.func.count(Escala.id)).filter(
-        Escala.funcionario_id == id,
-        Escala.data >= datetime.now().date()
-    ).scalar()
+    escalas_futuras = consulta_escalas_futuras(Escala.funcionario_id, id, datetime.now().date()).scalar()
     
     if escalas_futuras > 0:
         flash_error(f'Não é possível eliminar o funcionário {funcionario.nome} pois tem {escalas_futuras} escalas futuras.')
@@ -228,6 +286,9 @@ def adicionar_restricao(id):
         db.session.add(restricao)
         db.session.commit()
         flash_success('Restrição adicionada com sucesso!')
+        
+        # Reparar localmente as escalas já geradas que a restrição afeta
+        reparar_escalas_afetadas(funcionario, data_inicio, data_fim)
     except ValueError:
         flash_error("Formato de data inválido. Use o formato AAAA-MM-DD.")
     except Exception as e:
@@ -341,10 +402,7 @@ def eliminar_turno(id):
     turno = Turno.query.get_or_404(id)
     
     # Verificar se há escalas futuras
-    escalas_futuras = db.session.query(db.func.count(Escala.id)).filter(
-        Escala.turno_id == id,
-        Escala.data >= datetime.now().date()
-    ).scalar()
+    escalas_futuras = consulta_escalas_futuras(Escala.turno_id, id, datetime.now().date()).scalar()
     
     if escalas_futuras > 0:
         flash_error(f'Não é possível eliminar o turno {turno.nome} pois tem {escalas_futuras} escalas futuras.')
@@ -400,6 +458,18 @@ def adicionar_configuracao():
 
         dias_funcionamento = json.dumps(dias_funcionamento_list)
 
+        perfil_solver = request.form.get('perfil_solver') or None
+        if perfil_solver and perfil_solver not in listar_perfis():
+            erros.append('Perfil do solver inválido.')
+        equipas_solver = None
+        if request.form.get('equipas_solver', '').strip():
+            try:
+                equipas_solver = int(request.form['equipas_solver'])
+                if equipas_solver < 2:
+                    erros.append('O número de subequipas deve ser pelo menos 2.')
+            except ValueError:
+                erros.append('Número de subequipas inválido.')
+
         # Validação de rodízio
         ativar_rodizio = 'ativar_rodizio' in request.form
         data_inicio_rodizio = None
@@ -440,7 +510,7 @@ def adicionar_configuracao():
         if erros:
             for erro in erros:
                 flash_error(erro)
-            return render_template('adicionar_configuracao.html', editar=False, config=None, dias_funcionamento=dias_funcionamento_list, padrao_rodizio=padrao_rodizio)
+            return render_template('adicionar_configuracao.html', perfis=listar_perfis(), editar=False, config=None, dias_funcionamento=dias_funcionamento_list, padrao_rodizio=padrao_rodizio)
 
         # Se passou por todas as validações, salvar
         config = Configuracao(
@@ -450,13 +520,15 @@ def adicionar_configuracao():
             dias_funcionamento=dias_funcionamento,
             ativar_rodizio=ativar_rodizio,
             data_inicio_rodizio=data_inicio_rodizio,
-            padrao_rodizio=padrao_rodizio
+            padrao_rodizio=padrao_rodizio,
+            perfil_solver=perfil_solver,
+            equipas_solver=equipas_solver
         )
         db.session.add(config)
         db.session.commit()
         flash_success('Configuração adicionada com sucesso!')
         return redirect(url_for('configuracoes'))
-    return render_template('adicionar_configuracao.html', editar=False, config=None, dias_funcionamento=[], padrao_rodizio=None)
+    return render_template('adicionar_configuracao.html', perfis=listar_perfis(), editar=False, config=None, dias_funcionamento=[], padrao_rodizio=None)
 
 @app.route('/configuracoes/editar/<int:id>', methods=['GET', 'POST'])
 @handle_database_error
@@ -496,6 +568,18 @@ def editar_configuracao(id):
 
         dias_funcionamento = json.dumps(dias_funcionamento_list)
 
+        perfil_solver = request.form.get('perfil_solver') or None
+        if perfil_solver and perfil_solver not in listar_perfis():
+            erros.append('Perfil do solver inválido.')
+        equipas_solver = None
+        if request.form.get('equipas_solver', '').strip():
+            try:
+                equipas_solver = int(request.form['equipas_solver'])
+                if equipas_solver < 2:
+                    erros.append('O número de subequipas deve ser pelo menos 2.')
+            except ValueError:
+                erros.append('Número de subequipas inválido.')
+
         # Validação de rodízio
         ativar_rodizio = 'ativar_rodizio' in request.form
         data_inicio_rodizio = None
@@ -543,7 +627,7 @@ def editar_configuracao(id):
                     padrao_rodizio = json.loads(config.padrao_rodizio)
                 except:
                     padrao_rodizio = []
-            return render_template('adicionar_configuracao.html', editar=True, config=config, dias_funcionamento=dias_funcionamento, padrao_rodizio=padrao_rodizio)
+            return render_template('adicionar_configuracao.html', perfis=listar_perfis(), editar=True, config=config, dias_funcionamento=dias_funcionamento, padrao_rodizio=padrao_rodizio)
 
         # Se passou por todas as validações, salvar
         try:
@@ -554,6 +638,8 @@ def editar_configuracao(id):
             config.ativar_rodizio = ativar_rodizio
             config.data_inicio_rodizio = data_inicio_rodizio
             config.padrao_rodizio = padrao_rodizio
+            config.perfil_solver = perfil_solver
+            config.equipas_solver = equipas_solver
             db.session.commit()
             flash_success('Configuração atualizada com sucesso!')
             return redirect(url_for('configuracoes'))
@@ -569,7 +655,7 @@ def editar_configuracao(id):
             padrao_rodizio = json.loads(config.padrao_rodizio)
         except:
             padrao_rodizio = []
-    return render_template('adicionar_configuracao.html', editar=True, config=config, dias_funcionamento=dias_funcionamento, padrao_rodizio=padrao_rodizio)
+    return render_template('adicionar_configuracao.html', perfis=listar_perfis(), editar=True, config=config, dias_funcionamento=dias_funcionamento, padrao_rodizio=padrao_rodizio)
 
 @app.route('/configuracoes/eliminar/<int:id>', methods=['POST'])
 def eliminar_configuracao(id):
@@ -577,10 +663,7 @@ def eliminar_configuracao(id):
     valencia = config.valencia
     
     # Verificar se há escalas futuras para esta valência usando query otimizada
-    escalas_futuras = db.session.query(db.func.count(Escala.id)).filter(
-        Escala.valencia == valencia,
-        Escala.data >= datetime.now().date()
-    ).scalar()
+    escalas_futuras = consulta_escalas_futuras(Escala.valencia, valencia, datetime.now().date()).scalar()
     
     if escalas_futuras > 0:
         flash_error(f'Não é possível eliminar a configuração de {valencia} pois existem {escalas_futuras} escalas futuras.')
@@ -620,65 +703,159 @@ def escalas():
     else:
         data_fim = datetime(int(ano), int(mes) + 1, 1).date() - timedelta(days=1)
     
-    # Filtrar por valência se especificada
-    query = Escala.query.filter(
-        Escala.data >= data_inicio,
-        Escala.data <= data_fim
-    ).options(joinedload(Escala.funcionario), joinedload(Escala.turno))
-    
-    if valencia:
-        query = query.filter(Escala.valencia == valencia)
+    # Grelha funcionário × dia, contagens por turno e totais calculados numa só passagem
+    grelha = montar_grelha_escalas(consulta_grelha_mensal(data_inicio, data_fim, valencia).all(), int(ano), int(mes))
     
-    escalas = query.all()
+    tarefa_id = request.args.get('tarefa', '')
     
-    # Calcular total de dias trabalhados por funcionário usando agregação na base de dados
-    total_trabalhados_por_funcionario = {}
-    if escalas:
-        # Usar query de agregação para melhor performance
-        resultados = db.session.query(
-            Escala.funcionario_id,
-            db.func.count(Escala.id).label('total')
-        ).filter(
-            Escala.data >= data_inicio,
-            Escala.data <= data_fim
-        )
-        
-        if valencia:
-            resultados = resultados.filter(Escala.valencia == valencia)
-        
-        resultados = resultados.group_by(Escala.funcionario_id).all()
-        
-        for funcionario_id, total in resultados:
-            total_trabalhados_por_funcionario[funcionario_id] = total
-    
-    return render_template('escalas.html', escalas=escalas, mes=mes, ano=ano, valencia=valencia, total_trabalhados_por_funcionario=total_trabalhados_por_funcionario, datetime=datetime)
+    return render_template('escalas.html', grelha=grelha, mes=mes, ano=ano, valencia=valencia, tarefa_id=tarefa_id,
+                           perfis=listar_perfis())
 
 @app.route('/escalas/gerar', methods=['POST'])
 def gerar_escalas():
-    """Centraliza toda a lógica de geração de escalas no OtimizadorMensal"""
+    """Coloca a geração na fila e devolve de imediato o id da tarefa"""
     mes = int(request.form['mes'])
     ano = int(request.form['ano'])
     valencia = request.form['valencia']
     tipo_geracao = request.form.get('tipo_geracao', 'otimizada')  # Por padrão, usar otimizada
+    arranque_quente = request.form.get('arranque_quente') or None
+    if arranque_quente not in (None, 'atual', 'anterior'):
+        arranque_quente = None
+    # Sem perfil (ou desconhecido) usa-se o da configuração da valência
+    perfil_solver = request.form.get('perfil_solver') or None
+    if perfil_solver not in listar_perfis():
+        perfil_solver = None
+    quer_json = request.accept_mimetypes.best == 'application/json'
 
     try:
-        # Importar o otimizador de forma lazy para evitar importação circular
-        otimizador = OtimizadorMensal(mes, ano, valencia)
-        melhor_escala = otimizador.gerar_escala_mensal_completa()
-        
-        if melhor_escala is not None:
-            salvo = otimizador.salvar_escala_otimizada(melhor_escala)
-            if salvo:
-                flash_success(f'Escala mensal gerada e salva com sucesso para {valencia}!')
-            else:
-                flash_error('Erro ao salvar a escala otimizada.')
-        else:
-            flash_error('Erro ao gerar escala. Verifique se há funcionários e turnos suficientes.')
-        
+        tarefa_id = gestor_tarefas.submeter(mes, ano, valencia, arranque_quente=arranque_quente,
+                                           perfil_solver=perfil_solver)
     except Exception as e:
+        logger.error(f"Erro ao submeter geração de escala: {str(e)}")
+        if quer_json:
+            return jsonify({'erro': 'Erro ao submeter a geração da escala.'}), 500
         flash_error(f'Erro inesperado ao gerar escala: {str(e)}')
+        return redirect(url_for('escalas'))
+    
+    if quer_json:
+        return jsonify({
+            'tarefa_id': tarefa_id,
+            'estado_url': url_for('estado_tarefa', tarefa_id=tarefa_id)
+        }), 202
+    
+    flash_info(f'Geração da escala para {valencia} iniciada. A página será atualizada quando terminar.')
+    return redirect(url_for('escalas', mes=mes, ano=ano, valencia=valencia, tarefa=tarefa_id))
+
+@app.route('/escalas/tarefas/<tarefa_id>')
+def estado_tarefa(tarefa_id):
+    """Estado da tarefa de geração: fase, tempo decorrido, melhor objetivo e resultado"""
+    estado = gestor_tarefas.obter_estado(tarefa_id)
+    if estado is None:
+        return jsonify({'erro': 'Tarefa não encontrada.'}), 404
+    return jsonify(estado)
+
+@app.route('/escalas/tarefas/<tarefa_id>/cancelar', methods=['POST'])
+def cancelar_tarefa(tarefa_id):
+    """Cancela a tarefa de geração (retira-a da fila ou interrompe a procura em curso)"""
+    try:
+        novo_estado = gestor_tarefas.cancelar(tarefa_id)
+    except Exception as e:
+        logger.error(f"Erro ao cancelar tarefa {tarefa_id}: {str(e)}")
+        return jsonify({'erro': 'Erro ao cancelar a tarefa.'}), 500
+    if novo_estado is None:
+        return jsonify({'erro': 'Tarefa não encontrada ou já terminada.'}), 409
+    return jsonify({'id': tarefa_id, 'estado': novo_estado})
+
+@app.route('/escalas/tarefas/<tarefa_id>/aceitar', methods=['POST'])
+def aceitar_tarefa(tarefa_id):
+    """Termina a procura em curso e grava a melhor solução encontrada até agora"""
+    try:
+        novo_estado = gestor_tarefas.aceitar(tarefa_id)
+    except Exception as e:
+        logger.error(f"Erro ao aceitar solução da tarefa {tarefa_id}: {str(e)}")
+        return jsonify({'erro': 'Erro ao aceitar a solução atual.'}), 500
+    if novo_estado is None:
+        return jsonify({'erro': 'Tarefa não encontrada ou não está em execução.'}), 409
+    return jsonify({'id': tarefa_id, 'estado': novo_estado})
+
+@app.route('/escalas/tarefas/<tarefa_id>/alternativa', methods=['POST'])
+def aceitar_alternativa_tarefa(tarefa_id):
+    """Grava a escala heurística parcial de uma geração que falhou"""
+    try:
+        resumo = gestor_tarefas.aceitar_alternativa(tarefa_id)
+    except Exception as e:
+        logger.error(f"Erro ao gravar a escala heurística da tarefa {tarefa_id}: {str(e)}")
+        return jsonify({'erro': 'Erro ao gravar a escala heurística.'}), 500
+    if resumo is None:
+        return jsonify({'erro': 'Tarefa não encontrada ou sem escala heurística por gravar.'}), 409
+    return jsonify({'id': tarefa_id, 'gravacao': resumo})
+
+@app.route('/escalas/tarefas/<tarefa_id>/solucao')
+def solucao_tarefa(tarefa_id):
+    """Long-poll da melhor solução da tarefa: responde quando houver uma solução posterior a 'desde'.
+
+    Espera no máximo ESPERA_SOLUCAO segundos; sem solução nova o cliente volta a pedir.
+    """
+    desde = request.args.get('desde', 0, type=int)
+    espera = min(request.args.get('espera', ESPERA_SOLUCAO, type=float), ESPERA_SOLUCAO)
+    solucao = gestor_tarefas.aguardar_solucao(tarefa_id, desde=desde, espera=espera)
+    if solucao is None:
+        return jsonify({'erro': 'Tarefa não encontrada.'}), 404
+    
+    escalas = solucao.pop('escalas')
+    solucao['html'] = None
+    if escalas:
+        tarefa = db.session.get(TarefaGeracao, tarefa_id)
+        nomes = dict(db.session.query(Funcionario.id, Funcionario.nome).filter(
+            Funcionario.id.in_({funcionario_id for funcionario_id, _, _ in escalas})
+        ))
+        turnos = dict(db.session.query(Turno.id, Turno.nome).filter(Turno.valencia == tarefa.valencia))
+        grelha = montar_grelha_escalas(
+            [(funcionario_id, nomes.get(funcionario_id, f'Funcionário {funcionario_id}'), dia, turnos.get(turno_id))
+             for funcionario_id, dia, turno_id in escalas],
+            tarefa.ano, tarefa.mes
+        )
+        solucao['html'] = render_template('grelha_escalas.html', grelha=grelha)
+    return jsonify(solucao)
+
+@app.route('/api/escalas/diagnostico')
+def diagnostico_escalas():
+    """Explica porque é que a escala do mês não tem solução (lista vazia se tiver).
+
+    Devolve o diagnóstico da última geração falhada (ou do último diagnóstico) do mês; se não
+    houver, ou com novo=1, coloca um diagnóstico na fila e responde 202 com o id da tarefa.
+    """
+    mes, erro_mes = safe_int_conversion(request.args.get('mes', ''), 'mes', 1, 12)
+    ano, erro_ano = safe_int_conversion(request.args.get('ano', ''), 'ano', 2000, 2100)
+    valencia = request.args.get('valencia', '')
+    if erro_mes or erro_ano or not valencia:
+        return jsonify({'erro': erro_mes or erro_ano or "O campo 'valencia' é obrigatório."}), 400
+    
+    try:
+        tarefa, mensagens = gestor_tarefas.ultimo_diagnostico(mes, ano, valencia)
+        if mensagens is not None and request.args.get('novo') != '1':
+            return jsonify({
+                'valencia': valencia,
+                'mes': mes,
+                'ano': ano,
+                'inviavel': bool(mensagens),
+                'mensagens': mensagens,
+                'tarefa_id': tarefa.id,
+                'diagnosticado_em': tarefa.terminada_em.isoformat() if tarefa.terminada_em else None
+            })
+        if tarefa is None or mensagens is not None:
+            tarefa_id = gestor_tarefas.submeter(mes, ano, valencia, diagnostico=True)
+        else:
+            # Já há um diagnóstico do mês na fila ou a correr
+            tarefa_id = tarefa.id
+    except Exception as e:
+        logger.error(f"Erro ao diagnosticar escala: {str(e)}")
+        return jsonify({'erro': 'Erro ao diagnosticar a escala.'}), 500
     
-    return redirect(url_for('escalas'))
+    return jsonify({
+        'tarefa_id': tarefa_id,
+        'estado_url': url_for('estado_tarefa', tarefa_id=tarefa_id)
+    }), 202
 
 # Filtro customizado para Jinja2
 @app.template_filter('from_json')
@@ -690,5 +867,8 @@ def from_json_filter(s):
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        preparar_base_de_dados()
+        # Em modo serviço é o servico_solver.py que recupera (e continua) as tarefas
+        if gestor_tarefas.modo == MODO_LOCAL:
+            gestor_tarefas.recuperar_tarefas_interrompidas()
     app.run(debug=True) 
\ No newline at end of file
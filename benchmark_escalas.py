@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Benchmarks de desempenho do sistema de escalas.
+
+Uso:
+    python benchmark_escalas.py grelha --funcionarios 200 --mes 8 --ano 2025
+    python benchmark_escalas.py arranque-quente --funcionarios 40 --mes 8 --ano 2025
+    python benchmark_escalas.py modelo --funcionarios 300 --dias 31
+    python benchmark_escalas.py sequencias --funcionarios 21 --dias 31 365
+    python benchmark_escalas.py gravacao --funcionarios 300 --mes 8 --ano 2025
+    python benchmark_escalas.py disponibilidade --funcionarios 500 --dias 365
+    python benchmark_escalas.py rodizio --funcionarios 500 --dias 365
+    python benchmark_escalas.py diagnosticos --funcionarios 300 --mes 8 --ano 2025
+    python benchmark_escalas.py horizonte --funcionarios 21 --ano 2025 --periodo anual
+    python benchmark_escalas.py heuristica --funcionarios 21 300 --dias 31 --procura 1.0 1.2
+    python benchmark_escalas.py simetrias --funcionarios 21 60 --dias 31 --perfil
+    python benchmark_escalas.py extracao --funcionarios 40 --dias 31
+    python benchmark_escalas.py decomposicao --funcionarios 35 --equipas 2 4 --perfil
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, time as hora
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+VALENCIA_BENCHMARK = "Benchmark"
+
+def criar_app_temporaria():
+    """Cria a aplicação apontada para uma base de dados SQLite temporária"""
+    ficheiro_db = os.path.join(tempfile.mkdtemp(prefix='escalas_bench_'), 'escalas.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{ficheiro_db}'
+
+    from app import app
+    from models import db
+    with app.app_context():
+        db.create_all()
+    return app
+
+def criar_valencia(app, n_funcionarios, escala=1):
+    """Cria funcionários, turnos M/I/T/N (necessidades 5/2/3/3 × escala) e configuração"""
+    import json
+    from models import db, Funcionario, Turno, Configuracao
+
+    with app.app_context():
+        necessidades = [('Manhã', 5), ('Intermédio', 2), ('Tarde', 3), ('Noite', 3)]
+        db.session.add_all([
+            Turno(nome=nome, hora_inicio=hora(0), hora_fim=hora(8), valencia=VALENCIA_BENCHMARK, funcionarios_necessarios=n * escala)
+            for nome, n in necessidades
+        ])
+        db.session.add_all([
+            Funcionario(nome=f'Funcionário {i:03d}', email=f'bench{i}@exemplo.pt', valencia=VALENCIA_BENCHMARK, ativo=True)
+            for i in range(n_funcionarios)
+        ])
+        db.session.add(Configuracao(
+            valencia=VALENCIA_BENCHMARK,
+            hora_abertura=hora(0),
+            hora_fecho=hora(23, 59),
+            dias_funcionamento=json.dumps(['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']),
+            ativar_rodizio=False
+        ))
+        db.session.commit()
+
+def popular_mes(app, n_funcionarios, mes, ano):
+    """Insere funcionários, turnos M/I/T/N e um mês completo de escalas sintéticas"""
+    import calendar
+    from models import db, Funcionario, Turno, Escala
+
+    with app.app_context():
+        turnos = [
+            Turno(nome=nome, hora_inicio=hora(0), hora_fim=hora(8), valencia=VALENCIA_BENCHMARK, funcionarios_necessarios=1)
+            for nome in ['Manhã', 'Intermédio', 'Tarde', 'Noite']
+        ]
+        funcionarios = [
+            Funcionario(nome=f'Funcionário {i:03d}', email=f'bench{i}@exemplo.pt', valencia=VALENCIA_BENCHMARK, ativo=True)
+            for i in range(n_funcionarios)
+        ]
+        db.session.add_all(turnos + funcionarios)
+        db.session.flush()
+
+        n_dias = calendar.monthrange(ano, mes)[1]
+        linhas = []
+        for i, funcionario in enumerate(funcionarios):
+            for dia in range(1, n_dias + 1):
+                # Duas folgas seguidas a cada sete dias, desfasadas por funcionário
+                if (dia + i) % 7 in (0, 1):
+                    continue
+                linhas.append({
+                    'funcionario_id': funcionario.id,
+                    'turno_id': turnos[(dia + i) % len(turnos)].id,
+                    'data': date(ano, mes, dia),
+                    'valencia': VALENCIA_BENCHMARK
+                })
+        db.session.execute(Escala.__table__.insert(), linhas)
+        db.session.commit()
+        return len(linhas)
+
+def benchmark_grelha(args):
+    """Mede o tempo de renderização da vista mensal /escalas"""
+    app = criar_app_temporaria()
+    n_escalas = popular_mes(app, args.funcionarios, args.mes, args.ano)
+    cliente = app.test_client()
+    url = f'/escalas?mes={args.mes}&ano={args.ano}&valencia={VALENCIA_BENCHMARK}'
+
+    # Primeiro pedido compila o template
+    resposta = cliente.get(url)
+    if resposta.status_code != 200:
+        print(f"❌ Pedido falhou com estado {resposta.status_code}")
+        return 1
+
+    tempos = []
+    for _ in range(args.repeticoes):
+        inicio = time.perf_counter()
+        cliente.get(url)
+        tempos.append(time.perf_counter() - inicio)
+
+    print(f"=== BENCHMARK GRELHA MENSAL ===")
+    print(f"Funcionários: {args.funcionarios}")
+    print(f"Escalas no mês: {n_escalas}")
+    print(f"Tamanho da página: {len(resposta.data) / 1024:.0f} KiB")
+    print(f"Tempo médio: {sum(tempos) / len(tempos) * 1000:.1f} ms")
+    print(f"Tempo mínimo: {min(tempos) * 1000:.1f} ms")
+    return 0
+
+def gerar_e_medir(app, mes, ano, arranque_quente=None, salvar=True):
+    """Gera a escala de um mês e devolve as estatísticas do solver"""
+    from otimizador_mensal import OtimizadorMensal
+
+    with app.app_context():
+        otimizador = OtimizadorMensal(mes, ano, VALENCIA_BENCHMARK, arranque_quente=arranque_quente)
+        resultado = otimizador.gerar_escala_mensal_completa()
+        if resultado and salvar:
+            otimizador.salvar_escala_otimizada(resultado)
+        return otimizador.estatisticas
+
+def benchmark_arranque_quente(args):
+    """Compara a geração do zero com o arranque a quente ('atual' e 'anterior')"""
+    import contextlib
+    import io
+
+    app = criar_app_temporaria()
+    criar_valencia(app, args.funcionarios, escala=max(1, args.funcionarios // 20))
+    mes_seguinte, ano_seguinte = (1, args.ano + 1) if args.mes == 12 else (args.mes + 1, args.ano)
+
+    cenarios = [
+        ('Mês do zero', args.mes, args.ano, None, True),
+        ('Regenerar (atual)', args.mes, args.ano, 'atual', False),
+        ('Mês seguinte do zero', mes_seguinte, ano_seguinte, None, False),
+        ('Mês seguinte (anterior)', mes_seguinte, ano_seguinte, 'anterior', False),
+    ]
+    linhas = []
+    for nome, mes, ano, arranque_quente, salvar in cenarios:
+        with contextlib.redirect_stdout(io.StringIO()):
+            estatisticas = gerar_e_medir(app, mes, ano, arranque_quente, salvar)
+        linhas.append((nome, estatisticas))
+
+    print(f"=== BENCHMARK ARRANQUE A QUENTE ({args.funcionarios} funcionários) ===")
+    print(f"{'Cenário':<26}{'Estado':<10}{'1ª solução':>12}{'Total':>10}{'Dicas mantidas':>18}")
+    for nome, estatisticas in linhas:
+        primeira = estatisticas.get('tempo_primeira_solucao')
+        primeira = f"{primeira:.2f}s" if primeira is not None else '-'
+        total = f"{estatisticas.get('tempo_resolucao', 0):.2f}s"
+        taxa = f"{estatisticas['taxa_dicas']:.0%}" if 'taxa_dicas' in estatisticas else '-'
+        print(f"{nome:<26}{estatisticas.get('status', '-'):<10}{primeira:>12}{total:>10}{taxa:>18}")
+
+    for frio, quente in ((0, 1), (2, 3)):
+        t_frio = linhas[frio][1].get('tempo_primeira_solucao')
+        t_quente = linhas[quente][1].get('tempo_primeira_solucao')
+        if t_frio and t_quente:
+            print(f"Aceleração até à 1ª solução ({linhas[quente][0]}): {t_frio / t_quente:.1f}x")
+    return 0
+
+def instancia_sintetica(n_funcionarios, n_dias, ano=2025, mes=1):
+    """Dados de entrada do solver sem base de dados: rodízio 5×2 desfasado e férias
+
+    Devolve (funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia).
+    """
+    from datetime import timedelta
+
+    funcionarios = [{'id': i + 1, 'nome': f'Funcionário {i:03d}'} for i in range(n_funcionarios)]
+    turnos = [{'id': i + 1, 'nome': nome} for i, nome in enumerate(['Manhã', 'Intermédio', 'Tarde', 'Noite'])]
+    dias = [date(ano, mes, 1) + timedelta(days=i) for i in range(n_dias)]
+
+    restricoes = {}
+    for i, funcionario in enumerate(funcionarios):
+        folgas = {dia for d, dia in enumerate(dias) if (d + i) % 7 in (5, 6)}
+        # Um em cada dez funcionários está de férias numa semana diferente
+        if i % 10 == 0:
+            inicio = (i * 3) % max(1, n_dias - 7)
+            folgas.update(dias[inicio:inicio + 7])
+        restricoes[funcionario['id']] = folgas
+
+    # Necessidades proporcionais à equipa: cerca de 60% a trabalhar em cada dia
+    por_dia = max(4, int(n_funcionarios * 0.6))
+    distribuicao = [5, 2, 3, 3]
+    necessarios = [max(1, por_dia * n // sum(distribuicao)) for n in distribuicao]
+    turnos_necessarios_por_dia = {dia: list(necessarios) for dia in dias}
+    return funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia
+
+def benchmark_modelo(args):
+    """Compara o tamanho e o tempo de construção do modelo denso e do esparso"""
+    import tracemalloc
+    from escalonador import construir_modelo, tamanho_modelo
+    from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+
+    funcionarios, turnos, dias, restricoes, necessarios = instancia_sintetica(args.funcionarios, args.dias)
+    variaveis_densas = len(funcionarios) * len(dias) * len(turnos)
+
+    print(f"=== BENCHMARK CONSTRUÇÃO DO MODELO ({args.funcionarios} funcionários × {args.dias} dias) ===")
+    print(f"{'Modelo':<10}{'Variáveis':>12}{'Restrições':>12}{'Construção':>13}{'Memória':>12}")
+    for nome, esparso in (('Denso', False), ('Esparso', True)):
+        inicio = time.perf_counter()
+        model, _ = construir_modelo(funcionarios, turnos, dias, restricoes, necessarios,
+                                    SEQUENCIAS_PROIBIDAS, esparso=esparso)
+        duracao = time.perf_counter() - inicio
+
+        # A memória é medida numa segunda construção, porque o tracemalloc distorce os tempos
+        del model
+        tracemalloc.start()
+        model, _ = construir_modelo(funcionarios, turnos, dias, restricoes, necessarios,
+                                    SEQUENCIAS_PROIBIDAS, esparso=esparso)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tamanho = tamanho_modelo(model, variaveis_densas)
+        print(f"{nome:<10}{tamanho['variaveis']:>12}{tamanho['restricoes']:>12}"
+              f"{duracao:>12.2f}s{pico / 1024 / 1024:>10.1f}MiB")
+    return 0
+
+def benchmark_sequencias(args):
+    """Compara a codificação por cláusulas/janelas com a codificação por autómato"""
+    import contextlib
+    import io
+    from escalonador import gerar_escala_ortools
+    from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+
+    print(f"=== BENCHMARK CODIFICAÇÃO DAS SEQUÊNCIAS ({args.funcionarios} funcionários) ===")
+    print(f"{'Dias':>5}  {'Codificação':<12}{'Variáveis':>11}{'Restrições':>12}{'Construção':>12}{'Estado':>10}{'Resolução':>11}")
+    for n_dias in args.dias:
+        entrada = instancia_sintetica(args.funcionarios, n_dias)
+        for codificacao in ('clausulas', 'automato'):
+            estatisticas = {}
+            with contextlib.redirect_stdout(io.StringIO()):
+                gerar_escala_ortools(*entrada, SEQUENCIAS_PROIBIDAS, estatisticas=estatisticas,
+                                     tempo_limite=args.tempo_limite, codificacao_sequencias=codificacao)
+            print(f"{n_dias:>5}  {codificacao:<12}{estatisticas['variaveis']:>11}{estatisticas['restricoes']:>12}"
+                  f"{estatisticas['tempo_construcao']:>11.2f}s{estatisticas['status']:>10}"
+                  f"{estatisticas['tempo_resolucao']:>10.2f}s")
+    return 0
+
+def benchmark_gravacao(args):
+    """Compara a gravação antiga (apagar o mês + um add por escala) com a gravação por diferenças"""
+    import contextlib
+    import io
+    import random
+    from models import db, Escala
+    from otimizador_mensal import OtimizadorMensal
+
+    app = criar_app_temporaria()
+    popular_mes(app, args.funcionarios, args.mes, args.ano)
+    otimizador = OtimizadorMensal(args.mes, args.ano, VALENCIA_BENCHMARK)
+
+    with app.app_context():
+        data_inicio, data_fim = otimizador.limites_mes()
+        existentes = otimizador.carregar_escala_existente()
+        turno_ids = sorted({turno_id for _, turno_id in existentes.values()})
+
+    def nova_escala(fracao_alterada):
+        random.seed(0)
+        escalas = []
+        for (funcionario_id, dia), (_, turno_id) in existentes.items():
+            if random.random() < fracao_alterada:
+                turno_id = random.choice([t for t in turno_ids if t != turno_id])
+            escalas.append({'funcionario_id': funcionario_id, 'data': dia, 'turno_id': turno_id})
+        return escalas
+
+    def gravar_tudo(escalas):
+        Escala.query.filter(
+            Escala.data >= data_inicio,
+            Escala.data <= data_fim,
+            Escala.valencia == VALENCIA_BENCHMARK
+        ).delete()
+        for escala in escalas:
+            db.session.add(Escala(funcionario_id=escala['funcionario_id'], turno_id=escala['turno_id'],
+                                  data=escala['data'], valencia=VALENCIA_BENCHMARK))
+        db.session.commit()
+
+    print(f"=== BENCHMARK GRAVAÇÃO ({args.funcionarios} funcionários, {len(existentes)} escalas) ===")
+    print(f"{'Alteradas':>10}{'Apagar + add':>15}{'Diferenças':>13}{'Inseridas':>11}{'Removidas':>11}{'Inalteradas':>13}")
+    for fracao in args.alteradas:
+        escalas = nova_escala(fracao)
+        with app.app_context():
+            # Repor o mês original antes de cada medição
+            gravar_tudo([{'funcionario_id': f, 'data': d, 'turno_id': t} for (f, d), (_, t) in existentes.items()])
+            inicio = time.perf_counter()
+            gravar_tudo(escalas)
+            tempo_antigo = time.perf_counter() - inicio
+
+            gravar_tudo([{'funcionario_id': f, 'data': d, 'turno_id': t} for (f, d), (_, t) in existentes.items()])
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                resumo = otimizador.salvar_escala_otimizada(escalas)
+            tempo_novo = time.perf_counter() - inicio
+
+        print(f"{fracao:>10.0%}{tempo_antigo * 1000:>13.1f}ms{tempo_novo * 1000:>11.1f}ms"
+              f"{resumo['inseridas']:>11}{resumo['removidas']:>11}{resumo['inalteradas']:>13}")
+    return 0
+
+def benchmark_disponibilidade(args):
+    """Compara a expansão dia a dia das restrições em sets com a matriz de disponibilidade"""
+    import random
+    from datetime import timedelta
+    from otimizador_mensal import construir_disponibilidade
+
+    random.seed(0)
+    dias = [date(2025, 1, 1) + timedelta(days=i) for i in range(args.dias)]
+    funcionario_ids = list(range(1, args.funcionarios + 1))
+    intervalos = []
+    for funcionario_id in funcionario_ids:
+        for _ in range(args.restricoes):
+            inicio = dias[0] + timedelta(days=random.randrange(args.dias))
+            intervalos.append((funcionario_id, inicio, inicio + timedelta(days=random.randrange(1, 15))))
+
+    def expandir_em_sets():
+        restricoes = {}
+        for funcionario_id, data_inicio, data_fim in intervalos:
+            dia_atual = max(data_inicio, dias[0])
+            while dia_atual <= min(data_fim, dias[-1]):
+                if dia_atual in dias:
+                    restricoes.setdefault(funcionario_id, set()).add(dia_atual)
+                dia_atual += timedelta(days=1)
+        return restricoes
+
+    inicio = time.perf_counter()
+    restricoes = expandir_em_sets()
+    tempo_sets = time.perf_counter() - inicio
+
+    tempos = []
+    for _ in range(args.repeticoes):
+        inicio = time.perf_counter()
+        disponibilidade = construir_disponibilidade(funcionario_ids, dias, intervalos)
+        tempos.append(time.perf_counter() - inicio)
+
+    iguais = all(
+        {dias[d] for d in range(len(dias)) if not disponibilidade[i, d]} == restricoes.get(funcionario_id, set())
+        for i, funcionario_id in enumerate(funcionario_ids)
+    )
+    print(f"=== BENCHMARK DISPONIBILIDADE ({args.funcionarios} funcionários × {args.dias} dias, {len(intervalos)} restrições) ===")
+    print(f"Sets dia a dia: {tempo_sets * 1000:.1f} ms")
+    print(f"Matriz NumPy:   {min(tempos) * 1000:.1f} ms ({disponibilidade.nbytes / 1024:.0f} KiB)")
+    print(f"Resultados iguais: {'sim' if iguais else 'NÃO'}")
+    return 0 if iguais else 1
+
+def benchmark_rodizio(args):
+    """Compara o cálculo dia a dia das folgas do rodízio com a máscara vetorizada (e a cache)"""
+    import json
+    from datetime import timedelta
+    import numpy as np
+    from otimizador_mensal import mascara_rodizio
+
+    padrao = [{'tipo': 'trabalho', 'dias': 5}, {'tipo': 'folga', 'dias': 2},
+              {'tipo': 'trabalho', 'dias': 4}, {'tipo': 'folga', 'dias': 3}]
+    padrao_json = json.dumps(padrao)
+    data_inicio_rodizio = date(2024, 12, 30)
+    dias = tuple(date(2025, 1, 1) + timedelta(days=i) for i in range(args.dias))
+    offsets = tuple(funcionario_id % args.funcionarios for funcionario_id in range(1, args.funcionarios + 1))
+
+    def dia_a_dia():
+        ciclo_total = sum(periodo['dias'] for periodo in padrao)
+        folgas = np.zeros((len(offsets), len(dias)), dtype=bool)
+        for i, offset in enumerate(offsets):
+            for d, dia in enumerate(dias):
+                posicao_ciclo = ((dia - data_inicio_rodizio).days + offset) % ciclo_total
+                posicao_acumulada = 0
+                for periodo in padrao:
+                    if posicao_ciclo < posicao_acumulada + periodo['dias']:
+                        folgas[i, d] = periodo['tipo'] == 'folga'
+                        break
+                    posicao_acumulada += periodo['dias']
+        return folgas
+
+    inicio = time.perf_counter()
+    referencia = dia_a_dia()
+    tempo_antigo = time.perf_counter() - inicio
+
+    mascara_rodizio.cache_clear()
+    inicio = time.perf_counter()
+    mascara = mascara_rodizio(data_inicio_rodizio, padrao_json, offsets, dias)
+    tempo_vetorizado = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    mascara_rodizio(data_inicio_rodizio, padrao_json, offsets, dias)
+    tempo_cache = time.perf_counter() - inicio
+
+    iguais = bool((mascara == referencia).all())
+    print(f"=== BENCHMARK RODÍZIO ({args.funcionarios} funcionários × {args.dias} dias) ===")
+    print(f"Dia a dia:   {tempo_antigo * 1000:.1f} ms")
+    print(f"Vetorizado:  {tempo_vetorizado * 1000:.2f} ms")
+    print(f"Em cache:    {tempo_cache * 1000:.3f} ms ({mascara_rodizio.cache_info()})")
+    print(f"Resultados iguais: {'sim' if iguais else 'NÃO'}")
+    return 0 if iguais else 1
+
+def benchmark_diagnosticos(args):
+    """Mede o custo dos diagnósticos detalhados (pares de folgas) com o log em INFO e em DEBUG"""
+    import logging
+    import numpy as np
+    from otimizador_mensal import OtimizadorMensal, logger
+
+    app = criar_app_temporaria()
+    criar_valencia(app, args.funcionarios)
+    with app.app_context():
+        otimizador = OtimizadorMensal(args.mes, args.ano, VALENCIA_BENCHMARK)
+        otimizador.carregar_dados()
+    otimizador.disponibilidade &= np.random.default_rng(0).random(otimizador.disponibilidade.shape) > 0.25
+
+    # Os registos em DEBUG são descartados, só interessa o custo de os calcular
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    tempos = {}
+    for nivel in (logging.INFO, logging.DEBUG):
+        logger.setLevel(nivel)
+        inicio = time.perf_counter()
+        for _ in range(args.repeticoes):
+            otimizador.diagnostico.registar('folgas', otimizador.resumo_pares_folgas)
+        tempos[logging.getLevelName(nivel)] = (time.perf_counter() - inicio) / args.repeticoes
+
+    print(f"=== BENCHMARK DIAGNÓSTICOS ({args.funcionarios} funcionários, {args.mes}/{args.ano}) ===")
+    for nivel, tempo in tempos.items():
+        print(f"{nivel:6s} {tempo * 1000:.3f} ms por secção")
+    return 0
+
+def benchmark_horizonte(args):
+    """Mede o tempo e a memória de cada janela do horizonte deslizante (devem ser constantes por mês)"""
+    import tracemalloc
+    from otimizador_anual import OtimizadorAnual
+
+    app = criar_app_temporaria()
+    criar_valencia(app, args.funcionarios)
+    with app.app_context():
+        otimizador = OtimizadorAnual(args.ano, VALENCIA_BENCHMARK, args.periodo, perfil_solver=args.perfil)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        resultado = otimizador.gerar_escala_periodo()
+        tempo_total = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    print(f"=== BENCHMARK HORIZONTE DESLIZANTE ({args.funcionarios} funcionários, {args.periodo} {args.ano}) ===")
+    print(f"{'Mês':>7} {'Dias':>5} {'Previsão':>9} {'Fronteira':>10} {'Variáveis':>10} {'Estado':>10} {'Solver':>8}")
+    for mes in otimizador.estatisticas['meses']:
+        print(f"{mes['mes']:02d}/{mes['ano']} {mes['dias']:>5} {mes['dias_previsao']:>9} {mes['fronteira']:>10} "
+              f"{mes['variaveis'] or 0:>10} {mes['status'] or '-':>10} {mes['tempo_resolucao'] or 0:>7.2f}s")
+    print(f"Total: {tempo_total:.1f}s, pico de memória Python {pico / 1e6:.1f} MB, "
+          f"{'todos os meses resolvidos' if resultado else 'falhou'}")
+    return 0 if resultado else 1
+
+def benchmark_heuristica(args):
+    """Compara a heurística (construção + pesquisa local) com o CP-SAT, com procura normal e apertada"""
+    from escalonador import gerar_escala_ortools
+    from heuristica import gerar_escala_heuristica
+    from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+
+    print(f"=== BENCHMARK HEURÍSTICA ({args.dias} dias) ===")
+    print(f"{'Funcionários':>12} {'Procura':>8} {'Heurística':>11} {'Vagas':>6} {'Movimentos':>11} {'CP-SAT':>14}")
+    for n_funcionarios in args.funcionarios:
+        for fator in args.procura:
+            funcionarios, turnos, dias, restricoes, necessarios = instancia_sintetica(n_funcionarios, args.dias)
+            necessarios = {dia: [int(n * fator) for n in procura] for dia, procura in necessarios.items()}
+            estatisticas = {}
+            _, vagas = gerar_escala_heuristica(funcionarios, turnos, dias, restricoes, necessarios,
+                                               SEQUENCIAS_PROIBIDAS, estatisticas=estatisticas)
+            solver = '-'
+            if args.tempo_limite:
+                estatisticas_solver = {}
+                gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                     estatisticas=estatisticas_solver, tempo_limite=args.tempo_limite)
+                solver = f"{estatisticas_solver['status'][:8]} {estatisticas_solver['tempo_resolucao']:.1f}s"
+            print(f"{n_funcionarios:>12} {fator:>7.1f}× {estatisticas['tempo']:>10.2f}s "
+                  f"{sum(vaga['em_falta'] for vaga in vagas):>6} {estatisticas['movimentos']:>11} {solver:>14}")
+    return 0
+
+def benchmark_simetrias(args):
+    """Tempo de resolução com e sem quebra de simetrias entre funcionários intermutáveis"""
+    from escalonador import gerar_escala_ortools
+    from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+
+    print(f"=== BENCHMARK QUEBRA DE SIMETRIAS ({args.dias} dias{', com perfil ideal' if args.perfil else ''}) ===")
+    print(f"{'Funcionários':>12} {'Simetrias':>10} {'Classes':>8} {'Estado':>9} {'1ª solução':>11} {'Total':>8} {'Objetivo':>9}")
+    for n_funcionarios in args.funcionarios:
+        funcionarios, turnos, dias, restricoes, necessarios = instancia_sintetica(n_funcionarios, args.dias)
+        perfil_ideal = None
+        if args.perfil:
+            # O mesmo perfil para todos: a parte de cada turno no total, arredondada
+            total = sum(sum(procura) for procura in necessarios.values())
+            por_turno = [sum(procura[t] for procura in necessarios.values()) for t in range(len(turnos))]
+            perfil_ideal = {f['id']: {turno['nome'][0]: por_turno[t] * (total // n_funcionarios) // total
+                                      for t, turno in enumerate(turnos)} for f in funcionarios}
+        for quebrar in (False, True):
+            estatisticas = {}
+            gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                 perfil_ideal, estatisticas=estatisticas, tempo_limite=args.tempo_limite,
+                                 num_workers=args.workers, quebrar_simetrias=quebrar)
+            classes = estatisticas.get('simetrias', {}).get('classes', '-')
+            primeira = estatisticas['tempo_primeira_solucao']
+            objetivo = estatisticas.get('objetivo')
+            print(f"{n_funcionarios:>12} {'sim' if quebrar else 'não':>10} {classes:>8} {estatisticas['status'][:9]:>9} "
+                  f"{f'{primeira:.2f}s' if primeira is not None else '-':>11} {estatisticas['tempo_resolucao']:>7.2f}s "
+                  f"{objetivo if objetivo is not None else '-':>9}")
+    return 0
+
+def benchmark_extracao(args):
+    """Extração da solução variável a variável vs. leitura única para a SolucaoEscala"""
+    from ortools.sat.python import cp_model
+    from escalonador import SolucaoEscala, construir_modelo
+    from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+
+    funcionarios, turnos, dias, restricoes, necessarios = instancia_sintetica(args.funcionarios, args.dias)
+    model, x = construir_modelo(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS)
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = args.tempo_limite
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        print(f"❌ Sem solução para a instância ({solver.StatusName(status)})")
+        return 1
+
+    def por_variavel():
+        # Extração anterior: um solver.Value por triplo (funcionário, dia, turno)
+        return [{'funcionario_id': funcionario['id'], 'turno_id': turno['id'], 'data': dia}
+                for d, dia in enumerate(dias) for t, turno in enumerate(turnos) for f, funcionario in enumerate(funcionarios)
+                if (f, d, t) in x and solver.Value(x[f, d, t])]
+
+    def compacta():
+        return SolucaoEscala.de_solver(solver, x, funcionarios, dias, turnos)
+
+    def compacta_com_dicts():
+        return compacta().escalas()
+
+    print(f"=== BENCHMARK EXTRAÇÃO DA SOLUÇÃO ({args.funcionarios} funcionários × {args.dias} dias, {len(x)} variáveis) ===")
+    referencia = por_variavel()
+    assert compacta_com_dicts() == referencia, "a vista em dicts difere da extração variável a variável"
+    for nome, funcao in (('Variável a variável', por_variavel), ('SolucaoEscala', compacta),
+                         ('SolucaoEscala + dicts', compacta_com_dicts)):
+        inicio = time.perf_counter()
+        for _ in range(args.repeticoes):
+            funcao()
+        print(f"{nome:<24}{(time.perf_counter() - inicio) / args.repeticoes * 1000:>10.1f} ms")
+    return 0
+
+def benchmark_decomposicao(args):
+    """Modelo completo vs. geração por subequipas, com a escala junta validada no modelo completo"""
+    from decomposicao import gerar_escala_decomposta
+    from escalonador import gerar_escala_ortools
+    from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+
+    funcionarios, turnos, dias, restricoes, necessarios = instancia_sintetica(args.funcionarios, args.dias)
+    perfil_ideal = None
+    if args.perfil:
+        # O mesmo perfil para todos: a parte de cada turno no total, arredondada
+        total = sum(sum(procura) for procura in necessarios.values())
+        por_turno = [sum(procura[t] for procura in necessarios.values()) for t in range(len(turnos))]
+        perfil_ideal = {f['id']: {turno['nome'][0]: por_turno[t] * (total // args.funcionarios) // total
+                                  for t, turno in enumerate(turnos)} for f in funcionarios}
+
+    print(f"=== BENCHMARK DECOMPOSIÇÃO ({args.funcionarios} funcionários × {args.dias} dias"
+          f"{', com perfil ideal' if args.perfil else ''}) ===")
+    print(f"{'Subequipas':>10} {'Estado':>9} {'Total':>8} {'Alocação':>9} {'Objetivo':>9} {'Coordenação':>12} {'Válida':>7}")
+    for n_equipas in [0] + args.equipas:
+        estatisticas = {}
+        inicio = time.perf_counter()
+        if n_equipas:
+            escalas = gerar_escala_decomposta(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                              perfil_ideal, n_equipas=n_equipas, estatisticas=estatisticas,
+                                              tempo_limite=args.tempo_limite)
+        else:
+            escalas = gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                           perfil_ideal, estatisticas=estatisticas, tempo_limite=args.tempo_limite)
+        tempo = time.perf_counter() - inicio
+
+        valida = '-'
+        if escalas:
+            # Fixar todas as células no modelo completo: só tem solução se a escala cumprir todas as regras
+            fixas = {(f['id'], dia): None for f in funcionarios for dia in dias}
+            fixas.update({(e['funcionario_id'], e['data']): e['turno_id'] for e in escalas})
+            valida = 'sim' if gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios,
+                                                   SEQUENCIAS_PROIBIDAS, fixas=fixas, tempo_limite=30) else 'NÃO'
+        decomposicao = estatisticas.get('decomposicao', {})
+        alocacao = decomposicao.get('tempo_alocacao')
+        coordenacao = decomposicao.get('coordenacao')
+        objetivo = estatisticas.get('objetivo')
+        print(f"{n_equipas or 'completo':>10} {estatisticas.get('status', '-')[:9]:>9} {tempo:>7.1f}s "
+              f"{f'{alocacao:.2f}s' if alocacao is not None else '-':>9} {objetivo if objetivo is not None else '-':>9} "
+              f"{coordenacao['status'][:12] if coordenacao else '-':>12} {valida:>7}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do sistema de escalas")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    grelha = subparsers.add_parser('grelha', help="Renderização da vista mensal /escalas")
+    grelha.add_argument('--funcionarios', type=int, default=200)
+    grelha.add_argument('--mes', type=int, default=8)
+    grelha.add_argument('--ano', type=int, default=2025)
+    grelha.add_argument('--repeticoes', type=int, default=5)
+    grelha.set_defaults(funcao=benchmark_grelha)
+
+    arranque = subparsers.add_parser('arranque-quente', help="Geração do zero vs. arranque a quente")
+    arranque.add_argument('--funcionarios', type=int, default=40)
+    arranque.add_argument('--mes', type=int, default=8)
+    arranque.add_argument('--ano', type=int, default=2025)
+    arranque.set_defaults(funcao=benchmark_arranque_quente)
+
+    modelo = subparsers.add_parser('modelo', help="Tamanho do modelo denso vs. esparso")
+    modelo.add_argument('--funcionarios', type=int, default=300)
+    modelo.add_argument('--dias', type=int, default=31)
+    modelo.set_defaults(funcao=benchmark_modelo)
+
+    sequencias = subparsers.add_parser('sequencias', help="Cláusulas vs. autómato para as sequências")
+    sequencias.add_argument('--funcionarios', type=int, default=21)
+    sequencias.add_argument('--dias', type=int, nargs='+', default=[31, 365])
+    sequencias.add_argument('--tempo-limite', type=float, default=60.0)
+    sequencias.set_defaults(funcao=benchmark_sequencias)
+
+    gravacao = subparsers.add_parser('gravacao', help="Apagar e inserir tudo vs. gravação por diferenças")
+    gravacao.add_argument('--funcionarios', type=int, default=300)
+    gravacao.add_argument('--mes', type=int, default=8)
+    gravacao.add_argument('--ano', type=int, default=2025)
+    gravacao.add_argument('--alteradas', type=float, nargs='+', default=[0.0, 0.05, 0.5, 1.0])
+    gravacao.set_defaults(funcao=benchmark_gravacao)
+
+    disponibilidade = subparsers.add_parser('disponibilidade', help="Restrições em sets vs. matriz de disponibilidade")
+    disponibilidade.add_argument('--funcionarios', type=int, default=500)
+    disponibilidade.add_argument('--dias', type=int, default=365)
+    disponibilidade.add_argument('--restricoes', type=int, default=4, help="Restrições por funcionário")
+    disponibilidade.add_argument('--repeticoes', type=int, default=5)
+    disponibilidade.set_defaults(funcao=benchmark_disponibilidade)
+
+    rodizio = subparsers.add_parser('rodizio', help="Folgas do rodízio dia a dia vs. máscara vetorizada")
+    rodizio.add_argument('--funcionarios', type=int, default=500)
+    rodizio.add_argument('--dias', type=int, default=365)
+    rodizio.set_defaults(funcao=benchmark_rodizio)
+
+    diagnosticos = subparsers.add_parser('diagnosticos', help="Custo dos diagnósticos detalhados em INFO vs. DEBUG")
+    diagnosticos.add_argument('--funcionarios', type=int, default=300)
+    diagnosticos.add_argument('--mes', type=int, default=8)
+    diagnosticos.add_argument('--ano', type=int, default=2025)
+    diagnosticos.add_argument('--repeticoes', type=int, default=10)
+    diagnosticos.set_defaults(funcao=benchmark_diagnosticos)
+
+    horizonte = subparsers.add_parser('horizonte', help="Tempo e memória por janela do otimizador anual")
+    horizonte.add_argument('--funcionarios', type=int, default=21)
+    horizonte.add_argument('--ano', type=int, default=2025)
+    horizonte.add_argument('--periodo', choices=['anual', 'semestral', 'trimestral'], default='anual')
+    horizonte.add_argument('--perfil', default='rápido')
+    horizonte.set_defaults(funcao=benchmark_horizonte)
+
+    heuristica = subparsers.add_parser('heuristica', help="Heurística de recurso vs. CP-SAT")
+    heuristica.add_argument('--funcionarios', type=int, nargs='+', default=[21, 300])
+    heuristica.add_argument('--dias', type=int, default=31)
+    heuristica.add_argument('--procura', type=float, nargs='+', default=[1.0, 1.2], help="Fator sobre as necessidades por turno")
+    heuristica.add_argument('--tempo-limite', type=float, default=10.0, help="Tempo do CP-SAT para comparação (0 = não correr)")
+    heuristica.set_defaults(funcao=benchmark_heuristica)
+
+    simetrias = subparsers.add_parser('simetrias', help="Resolução com e sem quebra de simetrias")
+    simetrias.add_argument('--funcionarios', type=int, nargs='+', default=[21, 60])
+    simetrias.add_argument('--dias', type=int, default=31)
+    simetrias.add_argument('--perfil', action='store_true', help="Minimizar o desvio a um perfil ideal igual para todos")
+    simetrias.add_argument('--tempo-limite', type=float, default=60.0)
+    simetrias.add_argument('--workers', type=int, default=None, help="Threads do CP-SAT (None = todos os núcleos)")
+    simetrias.set_defaults(funcao=benchmark_simetrias)
+
+    extracao = subparsers.add_parser('extracao', help="Extração da solução variável a variável vs. compacta")
+    extracao.add_argument('--funcionarios', type=int, default=40)
+    extracao.add_argument('--dias', type=int, default=31)
+    extracao.add_argument('--tempo-limite', type=float, default=60.0)
+    extracao.add_argument('--repeticoes', type=int, default=5)
+    extracao.set_defaults(funcao=benchmark_extracao)
+
+    decomposicao = subparsers.add_parser('decomposicao', help="Modelo completo vs. geração por subequipas")
+    decomposicao.add_argument('--funcionarios', type=int, default=35)
+    decomposicao.add_argument('--dias', type=int, default=31)
+    decomposicao.add_argument('--equipas', type=int, nargs='+', default=[2, 4])
+    decomposicao.add_argument('--perfil', action='store_true', help="Minimizar o desvio a um perfil ideal igual para todos")
+    decomposicao.add_argument('--tempo-limite', type=float, default=60.0)
+    decomposicao.set_defaults(funcao=benchmark_decomposicao)
+
+    args = parser.parse_args()
+    return args.funcao(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
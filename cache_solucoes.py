@@ -0,0 +1,99 @@
+from models import db, CacheSolucao
+from datetime import date, datetime
+import hashlib
+import json
+import numpy as np
+import os
+import threading
+
+# Número máximo de soluções guardadas; acima disto são removidas as usadas há mais tempo
+CACHE_SOLUCOES_MAX = int(os.environ.get('CACHE_SOLUCOES_MAX', 200))
+
+# Parâmetros que só dizem como a procura é executada (não o problema nem o resultado pedido): ficam fora do hash
+PARAMETROS_EXECUCAO = ('num_workers',)
+
+_contadores = {'acertos': 0, 'falhas': 0}
+_lock = threading.Lock()
+
+def impressao_digital(funcionarios, turnos, dias, disponibilidade, turnos_necessarios_por_dia,
+                      sequencias_proibidas, perfil_ideal=None, parametros=None, fronteira=None):
+    """sha256 canónico dos dados de entrada do solver (a mesma entrada dá sempre o mesmo hash).
+
+    As dicas do arranque a quente não entram: só orientam a procura, não mudam o problema.
+    Dos parâmetros também não entram os de PARAMETROS_EXECUCAO (ex: as threads atribuídas
+    pelo pool), para o mesmo mês gerado com outro número de threads continuar em cache.
+    """
+    h = hashlib.sha256()
+    cabecalho = {
+        'funcionarios': [f['id'] for f in funcionarios],
+        'turnos': [[t['id'], t['nome']] for t in turnos],
+        'dias': [dia.isoformat() for dia in dias],
+        'procura': [list(turnos_necessarios_por_dia[dia]) for dia in dias],
+        'sequencias': sorted(list(sequencia) for sequencia in sequencias_proibidas),
+        'perfil_ideal': perfil_ideal,
+        'parametros': {
+            chave: valor for chave, valor in (parametros or {}).items() if chave not in PARAMETROS_EXECUCAO
+        },
+        'fronteira': sorted([f_id, *estado] for f_id, estado in (fronteira or {}).items())
+    }
+    h.update(json.dumps(cabecalho, sort_keys=True, default=str).encode())
+    disponibilidade = np.asarray(disponibilidade, dtype=bool)
+    h.update(repr(disponibilidade.shape).encode())
+    h.update(np.packbits(disponibilidade).tobytes())
+    return h.hexdigest()
+
+def _contar(resultado):
+    with _lock:
+        _contadores[resultado] += 1
+
+def obter_solucao(chave):
+    """Devolve (escalas, info) guardadas para o hash, ou (None, None), e regista o acerto/falha"""
+    try:
+        entrada = db.session.get(CacheSolucao, chave)
+    except Exception:
+        # Ex: tabela ainda não criada; sem cache, o mês é resolvido normalmente
+        db.session.rollback()
+        entrada = None
+    if entrada is None:
+        _contar('falhas')
+        return None, None
+
+    entrada.usada_em = datetime.now()
+    entrada.acessos = (entrada.acessos or 0) + 1
+    escalas = [
+        {'funcionario_id': funcionario_id, 'data': date.fromisoformat(dia), 'turno_id': turno_id}
+        for funcionario_id, dia, turno_id in json.loads(entrada.solucao)
+    ]
+    info = {'status': entrada.status, 'objetivo': entrada.objetivo, 'acessos': entrada.acessos}
+    db.session.commit()
+    _contar('acertos')
+    return escalas, info
+
+def guardar_solucao(chave, valencia, escalas, status=None, objetivo=None):
+    """Guarda a solução para o hash e remove as entradas menos usadas acima de CACHE_SOLUCOES_MAX"""
+    solucao = json.dumps([[e['funcionario_id'], e['data'].isoformat(), e['turno_id']] for e in escalas],
+                         separators=(',', ':'))
+    try:
+        db.session.merge(CacheSolucao(
+            hash=chave, valencia=valencia, solucao=solucao, status=status, objetivo=objetivo,
+            criada_em=datetime.now(), usada_em=datetime.now(), acessos=0
+        ))
+        db.session.flush()
+
+        # Primeira entrada que já não cabe, por ordem de utilização mais recente
+        limiar = db.session.query(CacheSolucao.usada_em).order_by(
+            CacheSolucao.usada_em.desc()
+        ).offset(CACHE_SOLUCOES_MAX).limit(1).scalar()
+        if limiar is not None:
+            db.session.query(CacheSolucao).filter(CacheSolucao.usada_em <= limiar).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception:
+        # A cache é só uma otimização: uma falha aqui não pode estragar a geração
+        db.session.rollback()
+        return False
+    return True
+
+def estatisticas_cache():
+    """Acertos e falhas da cache neste processo"""
+    with _lock:
+        return dict(_contadores)
@@ -15,6 +15,11 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Geração de escalas em segundo plano
+    GERACAO_MAX_WORKERS = int(os.environ.get('GERACAO_MAX_WORKERS', '2'))
+    GERACAO_MAX_THREADS = int(os.environ.get('GERACAO_MAX_THREADS', str(os.cpu_count() or 1)))
+    GERACAO_MODO = os.environ.get('GERACAO_MODO', 'local')  # 'local' ou 'servico' (servico_solver.py)
+    
     # Configurações de debug
     DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
 
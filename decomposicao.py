@@ -0,0 +1,262 @@
+"""Geração por subequipas, para valências com centenas de funcionários.
+
+O modelo completo cresce com funcionários × dias × turnos e o equilíbrio liga todos
+os funcionários entre si. Aqui os funcionários são divididos em subequipas (as
+configuradas em Funcionario.equipa ou, sem estas, por padrão de disponibilidade), um
+modelo pequeno de alocação reparte a procura de cada dia e turno pelas subequipas, e
+cada subequipa é resolvida com gerar_escala_ortools em paralelo. As regras por
+funcionário ficam todas dentro de uma subequipa, por isso a junção das soluções já
+é uma escala válida; uma passagem curta de coordenação sobre o modelo completo
+melhora o perfil ideal entre subequipas ou completa as que falharam (e, se for
+inviável, é a única que diagnostica porquê).
+"""
+
+from escalonador import gerar_escala_ortools, matriz_disponibilidade, estados_iniciais, MAX_DIAS_CONSECUTIVOS
+from ortools.sat.python import cp_model
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import numpy as np
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Fração do tempo limite dada à passagem de coordenação sobre o modelo completo
+FRACAO_COORDENACAO = 0.2
+
+def particionar_equipas(funcionarios, disponibilidade, n_equipas, equipas=None):
+    """Divide os funcionários em subequipas; devolve [[posição f, ...], ...].
+
+    Os funcionários sem equipa configurada (equipas: dict opcional {funcionario_id: nome})
+    são ordenados por padrão de disponibilidade e distribuídos alternadamente pelas
+    subequipas que faltam para chegar a n_equipas, para cada uma ter a mesma mistura de
+    padrões (e conseguir cobrir todos os dias); se as configuradas já chegam, vão para
+    as mais pequenas.
+    """
+    equipas = equipas or {}
+    ordem = sorted(range(len(funcionarios)), key=lambda f: disponibilidade[f].tobytes())
+    grupos = {nome: [] for nome in sorted(set(equipas.values()))}
+    sem_equipa = []
+    for f in ordem:
+        nome = equipas.get(funcionarios[f]['id'])
+        (grupos[nome] if nome is not None else sem_equipa).append(f)
+    particao = list(grupos.values())
+    automaticas = max(0, min(n_equipas - len(particao), len(sem_equipa)))
+    if automaticas or not particao:
+        automaticas = max(1, automaticas)
+        particao += [sem_equipa[k::automaticas] for k in range(automaticas)]
+    else:
+        for f in sem_equipa:
+            min(particao, key=len).append(f)
+    return [sorted(grupo) for grupo in particao if grupo]
+
+def alocar_procura(particao, disponibilidade, dias, turnos_necessarios_por_dia, n_turnos, pares_proibidos,
+                   dias_contados, ideais=None, tempo_limite=10.0, iniciais=None):
+    """Modelo mestre: quantos funcionários de cada subequipa fazem cada turno em cada dia.
+
+    Respeita a procura, os disponíveis de cada subequipa por dia, o equilíbrio (o total
+    da subequipa cabe entre min_turnos e max_turnos por funcionário), os dias consecutivos
+    e as sequências proibidas agregados. Com ideais ([[soma do perfil ideal por turno]] por
+    subequipa) aproxima primeiro os totais de cada turno da subequipa dessa soma; depois
+    reparte a procura na proporção dos disponíveis. iniciais ({f: (dias_seguidos, último
+    turno t)}, ver estados_iniciais) limita também os primeiros dias de quem chega ao
+    período a meio de uma sequência.
+    Devolve [{dia: [n por turno]}] por subequipa, ou None se não houver alocação.
+    """
+    iniciais = iniciais or {}
+    model = cp_model.CpModel()
+    n_dias = len(dias)
+    n_func = sum(len(grupo) for grupo in particao)
+    procura = np.array([turnos_necessarios_por_dia[dia] for dia in dias], dtype=np.int64).reshape(n_dias, n_turnos)
+    disponiveis = np.array([disponibilidade[grupo].sum(axis=0) for grupo in particao], dtype=np.int64)
+    total_disponiveis = np.maximum(disponiveis.sum(axis=0), 1)
+    min_turnos = int(procura[:dias_contados].sum()) // n_func
+    max_turnos = min_turnos + 1
+
+    a = {}
+    desvios = []
+    for k, grupo in enumerate(particao):
+        for d in range(n_dias):
+            for t in range(n_turnos):
+                a[k, d, t] = model.NewIntVar(0, int(min(procura[d, t], disponiveis[k, d])), f'a_{k}_{d}_{t}')
+                # Desvio à parte proporcional (escalado por total_disponiveis[d] para ficar inteiro)
+                alvo = int(procura[d, t] * disponiveis[k, d])
+                desvio = model.NewIntVar(0, int(procura[d, t] * total_disponiveis[d]), f'desvio_{k}_{d}_{t}')
+                model.Add(desvio >= a[k, d, t] * int(total_disponiveis[d]) - alvo)
+                model.Add(desvio >= alvo - a[k, d, t] * int(total_disponiveis[d]))
+                desvios.append(desvio)
+            model.Add(sum(a[k, d, t] for t in range(n_turnos)) <= int(disponiveis[k, d]))
+
+        total = sum(a[k, d, t] for d in range(dias_contados) for t in range(n_turnos))
+        model.Add(total >= len(grupo) * min_turnos)
+        if ideais is not None:
+            # Um turno a mais ou a menos face ao perfil pesa mais do que qualquer troca na repartição
+            peso = 2 * int(total_disponiveis.max()) + 1
+            for t in range(n_turnos):
+                real = sum(a[k, d, t] for d in range(dias_contados))
+                desvio = model.NewIntVar(0, int(procura[:, t].sum()) + int(ideais[k][t]), f'desvio_perfil_{k}_{t}')
+                model.Add(desvio >= real - int(ideais[k][t]))
+                model.Add(desvio >= int(ideais[k][t]) - real)
+                desvios.append(desvio * peso)
+        model.Add(total <= len(grupo) * max_turnos)
+
+        # Cada funcionário trabalha no máximo MAX_DIAS_CONSECUTIVOS dias em cada janela de 7
+        janela = MAX_DIAS_CONSECUTIVOS + 1
+        for d in range(n_dias - MAX_DIAS_CONSECUTIVOS):
+            limite = int(np.minimum(disponibilidade[grupo, d:d + janela].sum(axis=1), MAX_DIAS_CONSECUTIVOS).sum())
+            if limite < disponiveis[k, d:d + janela].sum():
+                model.Add(sum(a[k, d + i, t] for i in range(janela) for t in range(n_turnos)) <= limite)
+
+        # Fronteira: quem chega com dias_seguidos trabalhados tem de folgar num dos primeiros
+        # MAX_DIAS_CONSECUTIVOS + 1 - dias_seguidos dias, e o turno da véspera proíbe os pares no dia 0
+        com_fronteira = [f for f in grupo if f in iniciais]
+        if com_fronteira:
+            for comprimento in range(1, min(MAX_DIAS_CONSECUTIVOS, n_dias) + 1):
+                limite = 0
+                for f in grupo:
+                    livres = int(disponibilidade[f, :comprimento].sum())
+                    if f in iniciais and comprimento >= MAX_DIAS_CONSECUTIVOS + 1 - iniciais[f][0]:
+                        livres = min(livres, comprimento - 1)
+                    limite += livres
+                if limite < disponiveis[k, :comprimento].sum():
+                    model.Add(sum(a[k, d, t] for d in range(comprimento) for t in range(n_turnos)) <= limite)
+            for t in range(n_turnos):
+                impedidos = sum(1 for f in com_fronteira if disponibilidade[f, 0] and (iniciais[f][1], t) in pares_proibidos)
+                if impedidos:
+                    model.Add(a[k, 0, t] <= int(disponiveis[k, 0]) - impedidos)
+
+        # Quem faz t_ant num dia não pode fazer t_atual no seguinte: são pessoas diferentes
+        for d in range(n_dias - 1):
+            pessoas = int((disponibilidade[grupo, d] | disponibilidade[grupo, d + 1]).sum())
+            for t_ant in {t_ant for t_ant, _ in pares_proibidos}:
+                seguintes = [t_atual for anterior, t_atual in pares_proibidos if anterior == t_ant]
+                model.Add(a[k, d, t_ant] + sum(a[k, d + 1, t] for t in seguintes) <= pessoas)
+
+    for d in range(n_dias):
+        for t in range(n_turnos):
+            model.Add(sum(a[k, d, t] for k in range(len(particao))) == int(procura[d, t]))
+    model.Minimize(sum(desvios))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = tempo_limite
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        logger.warning("Alocação da procura pelas subequipas sem solução: %s", solver.StatusName(status))
+        return None
+    return [
+        {dia: [solver.Value(a[k, d, t]) for t in range(n_turnos)] for d, dia in enumerate(dias)}
+        for k in range(len(particao))
+    ]
+
+def gerar_escala_decomposta(funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia, sequencias_proibidas,
+                            perfil_ideal=None, n_equipas=2, equipas=None, estatisticas=None, tempo_limite=60.0,
+                            num_workers=None, parar=None, fronteira=None, dias_previsao=0, dicas=None, **parametros):
+    """Gera a escala por subequipas; mesmos argumentos e resultado de gerar_escala_ortools.
+
+    n_equipas: número de subequipas automáticas; equipas: {funcionario_id: nome} configuradas
+    (ver particionar_equipas). As subequipas são resolvidas em paralelo, repartindo
+    num_workers threads; a coordenação final usa FRACAO_COORDENACAO do tempo limite.
+    Os outros parametros (semente, gap_relativo, ...) são passados a cada chamada do solver.
+    """
+    inicio = time.perf_counter()
+    # As soluções de cada subequipa não são escalas completas: o callback e os diagnósticos
+    # ficam só para a coordenação
+    callback_solucao = parametros.pop('callback_solucao', None)
+    diagnostico = parametros.pop('diagnostico', None)
+    disponibilidade = matriz_disponibilidade(funcionarios, dias, restricoes)
+    turno_idx = {t['nome'][0].upper(): i for i, t in enumerate(turnos)}
+    pares_proibidos = [
+        (turno_idx[ant], turno_idx[atual]) for ant, atual in sequencias_proibidas
+        if ant in turno_idx and atual in turno_idx
+    ]
+    particao = particionar_equipas(funcionarios, disponibilidade, n_equipas, equipas)
+    resumo = {'equipas': [], 'configuradas': bool(equipas)}
+    if estatisticas is not None:
+        estatisticas['decomposicao'] = resumo
+    logger.info("Decomposição em %s subequipas (%s)", len(particao),
+                ', '.join(str(len(grupo)) for grupo in particao))
+
+    tempo_coordenacao = tempo_limite * FRACAO_COORDENACAO
+    inicio_alocacao = time.perf_counter()
+    ideais = None
+    if perfil_ideal:
+        ideais = [[sum(perfil_ideal.get(funcionarios[f]['id'], {}).get(turno['nome'][0].upper(), 0) for f in grupo)
+                   for turno in turnos] for grupo in particao]
+    alocacao = alocar_procura(particao, disponibilidade, dias, turnos_necessarios_por_dia, len(turnos),
+                              pares_proibidos, len(dias) - dias_previsao, ideais, tempo_limite=tempo_coordenacao,
+                              iniciais=estados_iniciais(funcionarios, turnos, fronteira))
+    resumo['tempo_alocacao'] = time.perf_counter() - inicio_alocacao
+
+    juntas = []
+    falhadas = []
+    if alocacao is not None:
+        paralelo = min(len(particao), num_workers or os.cpu_count() or 1)
+        threads = max(1, (num_workers or os.cpu_count() or 1) // paralelo)
+        tempo_equipas = tempo_limite - tempo_coordenacao - resumo['tempo_alocacao']
+
+        def resolver_equipa(k):
+            grupo = particao[k]
+            ids = {funcionarios[f]['id'] for f in grupo}
+            info = {'funcionarios': len(grupo)}
+            escalas = gerar_escala_ortools(
+                [funcionarios[f] for f in grupo], turnos, dias, disponibilidade[grupo], alocacao[k],
+                sequencias_proibidas,
+                {i: perfil for i, perfil in perfil_ideal.items() if i in ids} if perfil_ideal else None,
+                dicas={dica for dica in dicas if dica[0] in ids} if dicas else None,
+                estatisticas=info, tempo_limite=max(1.0, tempo_equipas), num_workers=threads, parar=parar,
+                fronteira={i: estado for i, estado in fronteira.items() if i in ids} if fronteira else None,
+                dias_previsao=dias_previsao, diagnosticar=False, **parametros
+            )
+            return escalas, info
+
+        with ThreadPoolExecutor(max_workers=paralelo, thread_name_prefix='subequipa') as executor:
+            for k, (escalas, info) in enumerate(executor.map(resolver_equipa, range(len(particao)))):
+                resumo['equipas'].append({campo: info.get(campo) for campo in (
+                    'funcionarios', 'status', 'objetivo', 'tempo_resolucao', 'variaveis', 'restricoes')})
+                if escalas is None:
+                    falhadas.append(k)
+                else:
+                    juntas.extend(escalas)
+    resumo['falhadas'] = len(falhadas)
+
+    resultado = juntas if alocacao is not None and not falhadas else None
+    status = 'FEASIBLE' if resultado is not None else 'UNKNOWN'
+    objetivo = None
+    if resultado is not None and perfil_ideal:
+        objetivo = sum(equipa['objetivo'] or 0 for equipa in resumo['equipas'])
+
+    # Coordenação: o modelo completo parte da junção das subequipas (incompleta se alguma falhou)
+    # e pode trocar turnos entre subequipas. Uma junção válida só é revista com perfil ideal e
+    # alguma subequipa sem ótimo provado (com todas ótimas a passagem curta não a melhora)
+    rever = perfil_ideal and any(equipa['status'] != 'OPTIMAL' for equipa in resumo['equipas'])
+    if (resultado is None or rever) and not (parar is not None and parar.is_set()):
+        # Só para melhorar uma junção válida basta uma passagem curta; para completar fica o tempo que resta
+        limite_coordenacao = tempo_limite - (time.perf_counter() - inicio)
+        if resultado is not None:
+            limite_coordenacao = min(limite_coordenacao, tempo_coordenacao)
+        info = {}
+        coordenada = gerar_escala_ortools(
+            funcionarios, turnos, dias, disponibilidade, turnos_necessarios_por_dia, sequencias_proibidas,
+            perfil_ideal, dicas={(e['funcionario_id'], e['data'], e['turno_id']) for e in juntas} or dicas,
+            estatisticas=info, tempo_limite=max(1.0, limite_coordenacao),
+            num_workers=num_workers, parar=parar, fronteira=fronteira, dias_previsao=dias_previsao,
+            callback_solucao=callback_solucao, diagnostico=diagnostico, **parametros
+        )
+        resumo['coordenacao'] = {campo: info.get(campo) for campo in ('status', 'objetivo', 'tempo_resolucao', 'taxa_dicas')}
+        # O diagnóstico da inviabilidade é o do modelo completo, feito uma só vez aqui
+        if estatisticas is not None and 'diagnostico' in info:
+            estatisticas['diagnostico'] = info['diagnostico']
+            estatisticas['tempo_diagnostico'] = info['tempo_diagnostico']
+        if coordenada is not None and (objetivo is None or info.get('objetivo', objetivo) <= objetivo):
+            resultado, objetivo, status = coordenada, info.get('objetivo'), info.get('status')
+
+    if estatisticas is not None:
+        estatisticas['tempo_resolucao'] = time.perf_counter() - inicio
+        estatisticas['status'] = status
+        if objetivo is not None:
+            estatisticas['objetivo'] = objetivo
+        if parar is not None and parar.is_set():
+            estatisticas['interrompida'] = True
+    logger.info("Decomposição: %s subequipas, %s falhadas, %.2fs", len(particao), len(falhadas),
+                time.perf_counter() - inicio)
+    return resultado
@@ -0,0 +1,30 @@
+import json
+import logging
+
+class Diagnostico:
+    """Diagnósticos detalhados de uma geração (folgas, pares, distribuição), com custo zero quando desligados.
+
+    Só quando o logger tem o nível ativo é que as secções são calculadas, guardadas
+    como dados estruturados e escritas no log em JSON (uma linha por secção).
+    """
+    def __init__(self, logger, nivel=logging.DEBUG):
+        self.logger = logger
+        self.nivel = nivel
+        self.secoes = {}
+
+    @property
+    def ativo(self):
+        return self.logger.isEnabledFor(self.nivel)
+
+    def registar(self, secao, calcular):
+        """Calcula (só se ativo) os dados da secção com calcular() e regista-os"""
+        if not self.ativo:
+            return
+        dados = calcular()
+        self.secoes[secao] = dados
+        self.logger.log(self.nivel, "%s %s", secao, json.dumps(dados, default=str, ensure_ascii=False))
+
+def registar_estatisticas(logger, contexto, estatisticas):
+    """Escreve as estatísticas da geração numa só linha JSON (nível INFO)"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s %s", contexto, json.dumps(estatisticas, default=str, ensure_ascii=False))
@@ -1,77 +1,423 @@
 from ortools.sat.python import cp_model
+from collections import defaultdict
 from datetime import timedelta
+import logging
+import numpy as np
+import threading
+import time
 
-def gerar_escala_ortools(funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia, sequencias_proibidas, perfil_ideal=None):
+logger = logging.getLogger(__name__)
+
+class ProgressoSolucoes(cp_model.CpSolverSolutionCallback):
+    """Regista o tempo da primeira solução e notifica cada solução encontrada.
+
+    O callback recebe o objetivo, o gap face ao melhor limite, o tempo decorrido e,
+    se for dada a lista atribuicao [(variável, funcionario_id, dia, turno_id)], uma
+    função 'escalas' que devolve a atribuição da solução. Só pode ser chamada dentro
+    do callback, e só quem a chama paga a extração.
     """
-    funcionarios: lista de dicts com 'id' e 'nome'
-    turnos: lista de dicts com 'id' e 'nome' (ex: 'M', 'I', 'T', 'N')
-    dias: lista de datas (datetime.date)
-    restricoes: dict {funcionario_id: set(dias_folga)}
-    turnos_necessarios_por_dia: dict {dia: [n_M, n_I, n_T, n_N]}
-    sequencias_proibidas: lista de tuplas [('N','M'), ...]
-    perfil_ideal: dict opcional {funcionario_id: {turno: quantidade_ideal}}
+    def __init__(self, callback=None, atribuicao=None):
+        super().__init__()
+        self.callback = callback
+        self.atribuicao = atribuicao
+        self.solucoes = 0
+        self.tempo_primeira_solucao = None
+
+    def escalas_atuais(self):
+        """[(funcionario_id, dia, turno_id)] da solução atual (só dentro do callback)"""
+        return [(funcionario_id, dia, turno_id) for variavel, funcionario_id, dia, turno_id in self.atribuicao
+                if self.BooleanValue(variavel)]
+
+    def on_solution_callback(self):
+        self.solucoes += 1
+        if self.tempo_primeira_solucao is None:
+            self.tempo_primeira_solucao = self.WallTime()
+        if self.callback:
+            objetivo = self.ObjectiveValue()
+            dados = {
+                'solucoes': self.solucoes,
+                'objetivo': objetivo,
+                'gap': abs(objetivo - self.BestObjectiveBound()) / max(1.0, abs(objetivo)),
+                'tempo': self.WallTime()
+            }
+            if self.atribuicao is not None:
+                dados['escalas'] = self.escalas_atuais
+            self.callback(dados)
+
+MAX_DIAS_CONSECUTIVOS = 6
+
+def resumo_turnos(totais):
+    """{'media', 'minimo', 'maximo', 'variacao'} dos turnos por funcionário (só conta quem tem turnos)"""
+    totais = np.asarray(totais)
+    totais = totais[totais > 0]
+    if not totais.size:
+        return None
+    minimo, maximo = int(totais.min()), int(totais.max())
+    return {'media': round(float(totais.mean()), 1), 'minimo': minimo, 'maximo': maximo, 'variacao': maximo - minimo}
+
+class SolucaoEscala:
+    """Solução do solver em forma compacta.
+
+    matriz: array funcionários × dias (int8) com o índice do turno, -1 = folga; as
+    posições correspondem a funcionario_ids, dias e turno_ids. escalas() devolve a
+    vista em dicts usada pelo resto da aplicação.
+    """
+    def __init__(self, matriz, funcionario_ids, dias, turno_ids):
+        self.matriz = matriz
+        self.funcionario_ids = funcionario_ids
+        self.dias = dias
+        self.turno_ids = turno_ids
+
+    @classmethod
+    def de_solver(cls, solver, x, funcionarios, dias, turnos):
+        """Lê todas as variáveis x {(f, d, t): BoolVar} de uma vez da resposta do solver"""
+        matriz = np.full((len(funcionarios), len(dias)), -1, dtype=np.int8)
+        if x:
+            posicoes = np.array(list(x.keys()), dtype=np.int32)
+            indices = np.fromiter((variavel.Index() for variavel in x.values()), dtype=np.int64, count=len(x))
+            ativas = np.asarray(solver.ResponseProto().solution, dtype=np.int64)[indices] > 0
+            f, d, t = posicoes[ativas].T
+            matriz[f, d] = t
+        return cls(matriz, [funcionario['id'] for funcionario in funcionarios], list(dias),
+                   [turno['id'] for turno in turnos])
+
+    def __len__(self):
+        return int(np.count_nonzero(self.matriz >= 0))
+
+    def cobertura(self):
+        """Array dias × turnos com o número de funcionários em cada turno"""
+        f, d = np.nonzero(self.matriz >= 0)
+        cobertura = np.zeros((len(self.dias), len(self.turno_ids)), dtype=np.int32)
+        np.add.at(cobertura, (d, self.matriz[f, d]), 1)
+        return cobertura
+
+    def totais(self):
+        """Turnos de cada funcionário"""
+        return np.count_nonzero(self.matriz >= 0, axis=1)
+
+    def mantidas(self, atribuicoes):
+        """Quantas atribuições (funcionario_id, dia, turno_id) estão na solução"""
+        posicao_func = {funcionario_id: f for f, funcionario_id in enumerate(self.funcionario_ids)}
+        posicao_dia = {dia: d for d, dia in enumerate(self.dias)}
+        posicao_turno = {turno_id: t for t, turno_id in enumerate(self.turno_ids)}
+        return sum(
+            1 for funcionario_id, dia, turno_id in atribuicoes
+            if funcionario_id in posicao_func and dia in posicao_dia and turno_id in posicao_turno
+            and self.matriz[posicao_func[funcionario_id], posicao_dia[dia]] == posicao_turno[turno_id]
+        )
+
+    def escalas(self):
+        """Lista [{'funcionario_id', 'turno_id', 'data'}] ordenada por dia, turno e funcionário"""
+        f, d = np.nonzero(self.matriz >= 0)
+        t = self.matriz[f, d]
+        ordem = np.lexsort((f, t, d))
+        return [
+            {'funcionario_id': self.funcionario_ids[f[i]], 'turno_id': self.turno_ids[t[i]], 'data': self.dias[d[i]]}
+            for i in ordem.tolist()
+        ]
+
+def matriz_disponibilidade(funcionarios, dias, restricoes):
+    """Matriz booleana funcionários × dias (True = disponível) a partir de {funcionario_id: set(dias_folga)}.
+
+    Se restricoes já for uma matriz (como a do OtimizadorMensal) é devolvida tal como está.
+    """
+    if isinstance(restricoes, np.ndarray):
+        return restricoes
+    disponibilidade = np.ones((len(funcionarios), len(dias)), dtype=bool)
+    indice_dia = {dia: d for d, dia in enumerate(dias)}
+    for f, funcionario in enumerate(funcionarios):
+        for dia in restricoes.get(funcionario['id'], ()):
+            d = indice_dia.get(dia)
+            if d is not None:
+                disponibilidade[f, d] = False
+    return disponibilidade
+
+def estado_fronteira(atribuicoes, dia_inicio):
+    """Estado de cada funcionário à entrada de dia_inicio, a partir das escalas dos dias anteriores.
+
+    atribuicoes: iterável de (funcionario_id, dia, turno_id) com (pelo menos) os
+    MAX_DIAS_CONSECUTIVOS dias de calendário antes de dia_inicio.
+    Devolve {funcionario_id: (dias_seguidos, ultimo_turno_id)} só para quem trabalhou
+    na véspera; dias_seguidos conta os dias seguidos a trabalhar até à véspera (no
+    máximo MAX_DIAS_CONSECUTIVOS).
+    """
+    turnos_por_dia = defaultdict(dict)
+    inicio_janela = dia_inicio - timedelta(days=MAX_DIAS_CONSECUTIVOS)
+    for funcionario_id, dia, turno_id in atribuicoes:
+        if inicio_janela <= dia < dia_inicio:
+            turnos_por_dia[funcionario_id][dia] = turno_id
+
+    fronteira = {}
+    vespera = dia_inicio - timedelta(days=1)
+    for funcionario_id, turnos in turnos_por_dia.items():
+        if vespera not in turnos:
+            continue
+        dias_seguidos = 1
+        while dias_seguidos < MAX_DIAS_CONSECUTIVOS and vespera - timedelta(days=dias_seguidos) in turnos:
+            dias_seguidos += 1
+        fronteira[funcionario_id] = (dias_seguidos, turnos[vespera])
+    return fronteira
+
+def estados_iniciais(funcionarios, turnos, fronteira):
+    """Estado à entrada do primeiro dia por posição: {f: (dias_seguidos, índice do último turno)}.
+
+    fronteira: {funcionario_id: (dias_seguidos, ultimo_turno_id)} (ver estado_fronteira) ou None.
+    """
+    if not fronteira:
+        return {}
+    indice_turno = {turno['id']: t for t, turno in enumerate(turnos)}
+    iniciais = {}
+    for f, funcionario in enumerate(funcionarios):
+        if funcionario['id'] in fronteira:
+            dias_seguidos, ultimo_turno_id = fronteira[funcionario['id']]
+            if ultimo_turno_id in indice_turno:
+                iniciais[f] = (min(dias_seguidos, MAX_DIAS_CONSECUTIVOS), indice_turno[ultimo_turno_id])
+    return iniciais
+
+def adicionar_automato_sequencias(model, x, n_func, n_dias, n_turnos, pares_proibidos, iniciais=None):
+    """Codifica as sequências proibidas e o máximo de dias consecutivos com um autómato por funcionário.
+
+    Cada dia tem um rótulo inteiro (0 = folga, t+1 = turno t) ligado às variáveis x.
+    O estado do autómato é (dias seguidos a trabalhar, último turno), por isso uma
+    só restrição substitui as cláusulas por par proibido e as janelas de 7 dias.
+    iniciais: dict opcional {f: (dias_seguidos, último turno t)} com o estado à entrada do primeiro dia.
+    """
+    proibidos = set(pares_proibidos)
+    estados = {}
+
+    def estado(dias_seguidos, ultimo_turno):
+        return estados.setdefault((dias_seguidos, ultimo_turno), len(estados))
+
+    inicial = estado(0, None)
+    transicoes = []
+    for dias_seguidos in range(MAX_DIAS_CONSECUTIVOS + 1):
+        for ultimo_turno in [None] + list(range(n_turnos)):
+            # Só o estado de folga tem zero dias seguidos
+            if (dias_seguidos == 0) != (ultimo_turno is None):
+                continue
+            origem = estado(dias_seguidos, ultimo_turno)
+            transicoes.append((origem, 0, inicial))
+            if dias_seguidos == MAX_DIAS_CONSECUTIVOS:
+                continue
+            for t in range(n_turnos):
+                if (ultimo_turno, t) not in proibidos:
+                    transicoes.append((origem, t + 1, estado(dias_seguidos + 1, t)))
+
+    for f in range(n_func):
+        rotulos = []
+        for d in range(n_dias):
+            turnos_possiveis = [t for t in range(n_turnos) if (f, d, t) in x]
+            rotulo = model.NewIntVarFromDomain(
+                cp_model.Domain.FromValues([0] + [t + 1 for t in turnos_possiveis]), f'dia_{f}_{d}'
+            )
+            model.Add(rotulo == cp_model.LinearExpr.WeightedSum(
+                [x[f, d, t] for t in turnos_possiveis], [t + 1 for t in turnos_possiveis]
+            ))
+            rotulos.append(rotulo)
+        origem = estado(*iniciais[f]) if iniciais and f in iniciais else inicial
+        model.AddAutomaton(rotulos, origem, list(estados.values()), transicoes)
+
+def classes_equivalencia(funcionarios, disponibilidade, perfil_ideal=None, fronteira=None, fixas=None):
+    """Grupos de funcionários intermutáveis no modelo (posições f, só grupos com 2 ou mais).
+
+    Dois funcionários são intermutáveis se têm os mesmos dias disponíveis, o mesmo
+    perfil ideal (ou nenhum) e o mesmo estado de fronteira, e nenhuma célula fixa:
+    trocar as suas linhas numa solução dá outra solução com o mesmo objetivo.
+    """
+    com_fixas = {id_func for id_func, _ in (fixas or {})}
+    perfil_ideal = perfil_ideal or {}
+    fronteira = fronteira or {}
+    grupos = defaultdict(list)
+    for f, funcionario in enumerate(funcionarios):
+        if funcionario['id'] in com_fixas:
+            continue
+        chave = (
+            disponibilidade[f].tobytes(),
+            tuple(sorted((turno, ideal) for turno, ideal in perfil_ideal.get(funcionario['id'], {}).items() if ideal)),
+            fronteira.get(funcionario['id'])
+        )
+        grupos[chave].append(f)
+    return [grupo for grupo in grupos.values() if len(grupo) > 1]
+
+def adicionar_quebra_simetrias(model, x, classes, n_dias, n_turnos, ordem=None):
+    """Ordena lexicograficamente as linhas dos funcionários de cada classe de equivalência.
+
+    A linha de f é o vetor dos rótulos diários (0 = folga, t+1 = turno t); dentro de
+    cada classe, a linha de cada funcionário é >= (lexicográfico) a do seguinte. Como
+    os funcionários da classe são intermutáveis, fica uma só das soluções simétricas.
+    ordem: chave opcional f -> vetor para ordenar cada classe (ex: os rótulos das dicas,
+    para a escala sugerida continuar válida). Devolve o número de pares ordenados.
+    """
+    def rotulo(f, d):
+        variaveis = [(x[f, d, t], t + 1) for t in range(n_turnos) if (f, d, t) in x]
+        return cp_model.LinearExpr.WeightedSum([v for v, _ in variaveis], [peso for _, peso in variaveis])
+
+    pares = 0
+    for classe in classes:
+        if ordem is not None:
+            classe = sorted(classe, key=ordem, reverse=True)
+        # Os membros da classe têm variáveis nos mesmos dias
+        dias_livres = [d for d in range(n_dias) if any((classe[0], d, t) in x for t in range(n_turnos))]
+        for a, b in zip(classe, classe[1:]):
+            # igual: prefixo das duas linhas igual até ao dia atual (exclusive)
+            igual = []
+            for i, d in enumerate(dias_livres):
+                rotulo_a, rotulo_b = rotulo(a, d), rotulo(b, d)
+                if i == len(dias_livres) - 1:
+                    model.Add(rotulo_a >= rotulo_b).OnlyEnforceIf(igual)
+                    break
+                seguinte = model.NewBoolVar(f'lex_{a}_{b}_{d}')
+                # Com o prefixo igual: o dia continua igual ou a linha a fica à frente
+                model.Add(rotulo_a == rotulo_b).OnlyEnforceIf(igual + [seguinte])
+                model.Add(rotulo_a >= rotulo_b + 1).OnlyEnforceIf(igual + [seguinte.Not()])
+                igual = [seguinte]
+            pares += 1
+    return pares
+
+def construir_modelo(funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia, sequencias_proibidas, perfil_ideal=None, dicas=None, fixas=None, esparso=True, codificacao_sequencias='clausulas', fronteira=None, dias_previsao=0, quebrar_simetrias=False):
+    """Constrói o modelo CP-SAT da escala e devolve (model, x).
+
+    Com esparso=True só são criadas variáveis para os triplos (funcionário, dia, turno)
+    possíveis: dias de folga/restrição e células fixas em folga não têm variável, e
+    células fixas num turno só têm a variável desse turno. x é um dict
+    {(f, d, t): BoolVar} indexado pelas posições nas listas recebidas.
+    Com esparso=False é criado o modelo denso original (uma variável por triplo e
+    restrições x == 0), útil para comparar tamanhos.
+    codificacao_sequencias: 'clausulas' (uma cláusula por par proibido e uma soma por
+    janela de 7 dias) ou 'automato' (ver adicionar_automato_sequencias).
+    fronteira: dict opcional {funcionario_id: (dias_seguidos, ultimo_turno_id)} com o estado
+    à entrada do primeiro dia (ver estado_fronteira), para as regras 3) e 6) continuarem
+    através do limite do período.
+    dias_previsao: os últimos dias_previsao dias só têm as regras obrigatórias; o
+    equilíbrio e o perfil ideal contam apenas os dias anteriores (horizonte deslizante).
+    quebrar_simetrias: ordenar os funcionários intermutáveis (ver classes_equivalencia).
+    Desligado por omissão: o CP-SAT já deteta estas simetrias no pré-processamento e,
+    nas instâncias medidas (benchmark_escalas.py simetrias), as restrições só atrasam.
     """
     model = cp_model.CpModel()
     n_func = len(funcionarios)
     n_turnos = len(turnos)
     n_dias = len(dias)
-    func_idx = {f['id']: i for i, f in enumerate(funcionarios)}
     turno_idx = {t['nome'][0].upper(): i for i, t in enumerate(turnos)}
+    fixas = fixas or {}
+    disponibilidade = matriz_disponibilidade(funcionarios, dias, restricoes)
+    dias_contados = n_dias - dias_previsao
+    # Estado à entrada do primeiro dia por posição
+    iniciais = estados_iniciais(funcionarios, turnos, fronteira)
 
     # Variáveis: x[f][d][t] = 1 se funcionario f faz turno t no dia d
     x = {}
     for f in range(n_func):
-        for d in range(n_dias):
+        id_func = funcionarios[f]['id']
+        for d, dia in enumerate(dias):
+            if esparso:
+                if not disponibilidade[f, d]:
+                    continue
+                if (id_func, dia) in fixas:
+                    turno_fixo = fixas[id_func, dia]
+                    for t, turno in enumerate(turnos):
+                        if turno['id'] == turno_fixo:
+                            x[f, d, t] = model.NewBoolVar(f'x_{f}_{d}_{t}')
+                            model.Add(x[f, d, t] == 1)
+                    continue
             for t in range(n_turnos):
                 x[f, d, t] = model.NewBoolVar(f'x_{f}_{d}_{t}')
 
+    # Índices das variáveis existentes, para construir as restrições sobre o modelo esparso
+    por_func_dia = defaultdict(list)
+    por_dia_turno = defaultdict(list)
+    por_func = defaultdict(list)
+    por_func_turno = defaultdict(list)
+    for (f, d, t), var in x.items():
+        por_func_dia[f, d].append(var)
+        por_dia_turno[d, t].append(var)
+        if d < dias_contados:
+            por_func[f].append(var)
+            por_func_turno[f, t].append(var)
+
     # 1) Cada funcionário faz no máximo 1 turno por dia
-    for f in range(n_func):
-        for d in range(n_dias):
-            model.Add(sum(x[f, d, t] for t in range(n_turnos)) <= 1)
+    for variaveis in por_func_dia.values():
+        if len(variaveis) > 1:
+            model.Add(cp_model.LinearExpr.Sum(variaveis) <= 1)
 
     # 2) OBRIGATÓRIO: Cada turno deve ser preenchido pelo número necessário de funcionários
     # Esta é uma restrição HARD - não pode ser violada
     for d, dia in enumerate(dias):
         for t in range(n_turnos):
-            model.Add(sum(x[f, d, t] for f in range(n_func)) == turnos_necessarios_por_dia[dia][t])
+            model.Add(cp_model.LinearExpr.Sum(por_dia_turno[d, t]) == turnos_necessarios_por_dia[dia][t])
 
     # 3) Proibir sequências de turnos proibidas
-    for f in range(n_func):
-        for d in range(1, n_dias):
-            for ant, atual in sequencias_proibidas:
-                if ant in turno_idx and atual in turno_idx:
-                    model.AddBoolOr([
-                        x[f, d-1, turno_idx[ant]].Not(),
-                        x[f, d, turno_idx[atual]].Not()
-                    ])
-
-    # 4) Respeitar folgas/restrições (se houver)
-    for f in range(n_func):
-        id_func = funcionarios[f]['id']
-        folgas = restricoes.get(id_func, set())
-        for d, dia in enumerate(dias):
-            if dia in folgas:
-                for t in range(n_turnos):
-                    model.Add(x[f, d, t] == 0)
+    pares_proibidos = [
+        (turno_idx[ant], turno_idx[atual]) for ant, atual in sequencias_proibidas
+        if ant in turno_idx and atual in turno_idx
+    ]
+    if codificacao_sequencias == 'automato':
+        # Um só autómato por funcionário cobre as regras 3) e 6)
+        adicionar_automato_sequencias(model, x, n_func, n_dias, n_turnos, pares_proibidos, iniciais)
+    else:
+        # Véspera do período: o turno que o funcionário fez proíbe os pares no primeiro dia
+        for f, (_, t_vespera) in iniciais.items():
+            for t_ant, t_atual in pares_proibidos:
+                if t_ant == t_vespera and (f, 0, t_atual) in x:
+                    model.Add(x[f, 0, t_atual] == 0)
+        for f in range(n_func):
+            for d in range(1, n_dias):
+                for t_ant, t_atual in pares_proibidos:
+                    if (f, d-1, t_ant) in x and (f, d, t_atual) in x:
+                        model.AddBoolOr([
+                            x[f, d-1, t_ant].Not(),
+                            x[f, d, t_atual].Not()
+                        ])
+
+    # 4) Respeitar folgas/restrições (no modelo esparso já não há variáveis nesses dias)
+    if not esparso:
+        for f in range(n_func):
+            for d in range(n_dias):
+                if not disponibilidade[f, d]:
+                    for t in range(n_turnos):
+                        model.Add(x[f, d, t] == 0)
+
+        # 4b) Manter fixas as células fora da vizinhança a reparar (se houver)
+        for f in range(n_func):
+            id_func = funcionarios[f]['id']
+            for d, dia in enumerate(dias):
+                if (id_func, dia) not in fixas:
+                    continue
+                turno_fixo = fixas[id_func, dia]
+                for t, turno in enumerate(turnos):
+                    model.Add(x[f, d, t] == (1 if turno['id'] == turno_fixo else 0))
 
     # 5) EQUILÍBRIO OBRIGATÓRIO - Garantir que todos os funcionários tenham carga adequada
-    total_turnos = sum(sum(turnos_necessarios_por_dia[dia]) for dia in dias)
+    total_turnos = sum(sum(turnos_necessarios_por_dia[dia]) for dia in dias[:dias_contados])
     min_turnos = total_turnos // n_func
     max_turnos = min_turnos + 1
     
     # Forçar que todos os funcionários tenham pelo menos min_turnos e no máximo max_turnos
     for f in range(n_func):
-        total_func = sum(x[f, d, t] for d in range(n_dias) for t in range(n_turnos))
+        total_func = cp_model.LinearExpr.Sum(por_func[f])
         model.Add(total_func >= min_turnos)
         model.Add(total_func <= max_turnos)
 
     # 6) Garantir que nenhum funcionário trabalhe demais dias consecutivos
-    for f in range(n_func):
-        for d in range(n_dias - 6):  # Verificar blocos de 7 dias
-            # Penalizar se trabalha 7 dias consecutivos
-            dias_consecutivos = sum(x[f, d+i, t] for i in range(7) for t in range(n_turnos))
-            model.Add(dias_consecutivos <= 6)  # Máximo 6 dias consecutivos
+    # (com o autómato esta regra já está incluída na restrição 3)
+    if codificacao_sequencias != 'automato':
+        for f in range(n_func):
+            for d in range(n_dias - MAX_DIAS_CONSECUTIVOS):  # Verificar blocos de 7 dias
+                # Penalizar se trabalha 7 dias consecutivos (só se os 7 dias tiverem variáveis)
+                if any(not por_func_dia[f, d+i] for i in range(MAX_DIAS_CONSECUTIVOS + 1)):
+                    continue
+                dias_consecutivos = cp_model.LinearExpr.Sum([
+                    var for i in range(MAX_DIAS_CONSECUTIVOS + 1) for var in por_func_dia[f, d+i]
+                ])
+                model.Add(dias_consecutivos <= MAX_DIAS_CONSECUTIVOS)  # Máximo 6 dias consecutivos
+
+        # Quem chega ao período com dias_seguidos já trabalhados só pode trabalhar
+        # MAX_DIAS_CONSECUTIVOS - dias_seguidos dos primeiros dias (as outras janelas estão contidas nesta)
+        for f, (dias_seguidos, _) in iniciais.items():
+            primeiros = [var for d in range(min(MAX_DIAS_CONSECUTIVOS + 1 - dias_seguidos, n_dias))
+                         for var in por_func_dia[f, d]]
+            if len(primeiros) > MAX_DIAS_CONSECUTIVOS - dias_seguidos:
+                model.Add(cp_model.LinearExpr.Sum(primeiros) <= MAX_DIAS_CONSECUTIVOS - dias_seguidos)
 
     # 7) Minimizar diferença para o perfil ideal (se existir)
     if perfil_ideal:
@@ -81,7 +427,7 @@ def gerar_escala_ortools(funcionarios, turnos, dias, restricoes, turnos_necessar
             for t, turno in enumerate(turnos):
                 turno_letra = turno['nome'][0].upper()
                 ideal = perfil_ideal.get(id_func, {}).get(turno_letra, 0)
-                real = sum(x[f, d, t] for d in range(n_dias))
+                real = cp_model.LinearExpr.Sum(por_func_turno[f, t])
                 desvio = model.NewIntVar(0, 1000, f'desvio_{f}_{t}')
                 model.Add(desvio >= real - ideal)
                 model.Add(desvio >= ideal - real)
@@ -91,55 +437,357 @@ def gerar_escala_ortools(funcionarios, turnos, dias, restricoes, turnos_necessar
         if desvios:
             model.Minimize(sum(desvios))
 
+    # 8) Arranque a quente: sugerir ao solver a escala existente como ponto de partida
+    # (apenas nos dias cobertos pela escala de partida; os restantes ficam livres)
+    if dicas:
+        dias_com_dicas = {dia for _, dia, _ in dicas}
+        for (f, d, t), var in x.items():
+            if dias[d] in dias_com_dicas:
+                model.AddHint(var, (funcionarios[f]['id'], dias[d], turnos[t]['id']) in dicas)
+
+    # 9) Quebra de simetrias entre funcionários intermutáveis
+    # (com dicas, cada classe é ordenada pela escala sugerida para esta continuar válida)
+    if quebrar_simetrias:
+        classes = classes_equivalencia(funcionarios, disponibilidade, perfil_ideal, fronteira, fixas)
+        ordem = None
+        if dicas:
+            indice_turno = {turno['id']: t for t, turno in enumerate(turnos)}
+            rotulos = {(id_func, dia): indice_turno[turno_id] + 1 for id_func, dia, turno_id in dicas if turno_id in indice_turno}
+            ordem = lambda f: [rotulos.get((funcionarios[f]['id'], dia), 0) for dia in dias]
+        adicionar_quebra_simetrias(model, x, classes, n_dias, n_turnos, ordem)
+
+    return model, x
+
+def tamanho_modelo(model, variaveis_densas):
+    """Número de variáveis e restrições do modelo, e as variáveis do equivalente denso"""
+    proto = model.Proto()
+    return {
+        'variaveis': len(proto.variables),
+        'restricoes': len(proto.constraints),
+        'variaveis_densas': variaveis_densas
+    }
+
+def diagnosticar_inviabilidade(funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia, sequencias_proibidas, tempo_limite=10.0, fronteira=None, dias_previsao=0):
+    """Explica porque é que a escala não tem solução, com literais de suposição por família de restrições.
+
+    Cada família (cobertura por dia/turno, folgas por funcionário, mínimo e máximo
+    de turnos, dias consecutivos e sequências proibidas por funcionário) só é
+    imposta quando o seu literal é verdadeiro. O solver é chamado com todos os
+    literais como suposições; se for inviável, o conjunto devolvido pelo CP-SAT é
+    reduzido por eliminação até ser mínimo. Devolve a lista de mensagens (vazia se
+    a inviabilidade não for provada dentro do tempo limite).
+    fronteira e dias_previsao têm o mesmo significado que em construir_modelo.
+    """
+    inicio = time.perf_counter()
+    model = cp_model.CpModel()
+    n_func = len(funcionarios)
+    n_turnos = len(turnos)
+    n_dias = len(dias)
+    dias_contados = n_dias - dias_previsao
+    turno_idx = {t['nome'][0].upper(): i for i, t in enumerate(turnos)}
+    iniciais = estados_iniciais(funcionarios, turnos, fronteira)
+
+    x = {}
+    for f in range(n_func):
+        for d in range(n_dias):
+            for t in range(n_turnos):
+                x[f, d, t] = model.NewBoolVar(f'x_{f}_{d}_{t}')
+        for d in range(n_dias):
+            model.Add(cp_model.LinearExpr.Sum([x[f, d, t] for t in range(n_turnos)]) <= 1)
+
+    # Dias disponíveis por funcionário e funcionários disponíveis por dia (para as mensagens)
+    disponibilidade = matriz_disponibilidade(funcionarios, dias, restricoes)
+    folgas_por_func = [set(np.flatnonzero(~disponibilidade[f]).tolist()) for f in range(n_func)]
+    disponiveis_por_dia = disponibilidade.sum(axis=0).tolist()
+    total_turnos = sum(sum(turnos_necessarios_por_dia[dia]) for dia in dias[:dias_contados])
+    min_turnos = total_turnos // n_func
+    max_turnos = min_turnos + 1
+
+    suposicoes = []
+    descricoes = {}
+
+    def suposicao(nome, descricao):
+        literal = model.NewBoolVar(nome)
+        suposicoes.append(literal)
+        descricoes[literal.Index()] = descricao
+        return literal
+
+    for d, dia in enumerate(dias):
+        for t in range(n_turnos):
+            literal = suposicao(f'cobertura_{d}_{t}', ('cobertura', d, t))
+            model.Add(cp_model.LinearExpr.Sum([x[f, d, t] for f in range(n_func)]) == turnos_necessarios_por_dia[dia][t]).OnlyEnforceIf(literal)
+
+    pares_proibidos = [
+        (turno_idx[ant], turno_idx[atual]) for ant, atual in sequencias_proibidas
+        if ant in turno_idx and atual in turno_idx
+    ]
+    for f in range(n_func):
+        total_func = cp_model.LinearExpr.Sum([x[f, d, t] for d in range(dias_contados) for t in range(n_turnos)])
+
+        if folgas_por_func[f]:
+            literal = suposicao(f'folgas_{f}', ('folgas', f))
+            model.AddBoolAnd([x[f, d, t].Not() for d in folgas_por_func[f] for t in range(n_turnos)]).OnlyEnforceIf(literal)
+
+        literal = suposicao(f'minimo_{f}', ('minimo', f))
+        model.Add(total_func >= min_turnos).OnlyEnforceIf(literal)
+
+        literal = suposicao(f'maximo_{f}', ('maximo', f))
+        model.Add(total_func <= max_turnos).OnlyEnforceIf(literal)
+
+        literal = suposicao(f'consecutivos_{f}', ('consecutivos', f))
+        for d in range(n_dias - MAX_DIAS_CONSECUTIVOS):
+            model.Add(cp_model.LinearExpr.Sum([
+                x[f, d+i, t] for i in range(MAX_DIAS_CONSECUTIVOS + 1) for t in range(n_turnos)
+            ]) <= MAX_DIAS_CONSECUTIVOS).OnlyEnforceIf(literal)
+        if f in iniciais:
+            # Dias seguidos já trabalhados à entrada do período
+            dias_seguidos = iniciais[f][0]
+            model.Add(cp_model.LinearExpr.Sum([
+                x[f, d, t] for d in range(min(MAX_DIAS_CONSECUTIVOS + 1 - dias_seguidos, n_dias)) for t in range(n_turnos)
+            ]) <= MAX_DIAS_CONSECUTIVOS - dias_seguidos).OnlyEnforceIf(literal)
+
+        if pares_proibidos:
+            literal = suposicao(f'sequencias_{f}', ('sequencias', f))
+            for d in range(1, n_dias):
+                for t_ant, t_atual in pares_proibidos:
+                    model.AddBoolOr([x[f, d-1, t_ant].Not(), x[f, d, t_atual].Not(), literal.Not()])
+            if f in iniciais:
+                # Turno da véspera do período
+                for t_ant, t_atual in pares_proibidos:
+                    if t_ant == iniciais[f][1]:
+                        model.AddImplication(literal, x[f, 0, t_atual].Not())
+
+    def resolver(ativas, limite):
+        """Resolve só com as suposições ativas; devolve (inviável, núcleo)"""
+        model.ClearAssumptions()
+        model.AddAssumptions(ativas)
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = limite
+        solver.parameters.num_workers = 1  # necessário para obter o núcleo de suposições
+        status = solver.Solve(model)
+        if status != cp_model.INFEASIBLE:
+            return False, None
+        return True, set(solver.SufficientAssumptionsForInfeasibility())
+
+    inviavel, nucleo = resolver(suposicoes, tempo_limite)
+    if not inviavel:
+        return []
+
+    # Minimizar o núcleo por eliminação: retirar cada suposição e ver se continua inviável
+    # (se não for provado dentro do limite, a suposição fica no núcleo)
+    por_indice = {literal.Index(): literal for literal in suposicoes}
+    nucleo = sorted(nucleo)
+    i = 0
+    while i < len(nucleo) and time.perf_counter() - inicio < tempo_limite:
+        candidatas = nucleo[:i] + nucleo[i+1:]
+        inviavel, novo_nucleo = resolver([por_indice[j] for j in candidatas], 0.5)
+        if inviavel:
+            nucleo = [j for j in candidatas if not novo_nucleo or j in novo_nucleo]
+        else:
+            i += 1
+
+    # Converter o núcleo em mensagens legíveis, agrupando a cobertura por dia e as folgas
+    cobertura_por_dia = defaultdict(list)
+    com_folgas = []
+    mensagens = []
+    for j in nucleo:
+        tipo, *chave = descricoes[j]
+        if tipo == 'cobertura':
+            cobertura_por_dia[chave[0]].append(chave[1])
+            continue
+        f = chave[0]
+        nome = funcionarios[f]['nome']
+        if tipo == 'folgas':
+            com_folgas.append(nome)
+        elif tipo == 'minimo':
+            disponiveis = dias_contados - sum(1 for d in folgas_por_func[f] if d < dias_contados)
+            mensagens.append(f"{nome} tem de fazer pelo menos {min_turnos} turnos, "
+                             f"mas só tem {disponiveis} dias disponíveis")
+        elif tipo == 'maximo':
+            mensagens.append(f"{nome} não pode fazer mais de {max_turnos} turnos")
+        elif tipo == 'consecutivos':
+            anteriores = f" (chega ao período com {iniciais[f][0]} dias seguidos)" if f in iniciais else ''
+            mensagens.append(f"{nome} não pode trabalhar mais de {MAX_DIAS_CONSECUTIVOS} dias seguidos{anteriores}")
+        else:
+            vespera = f" (incluindo o turno {turnos[iniciais[f][1]]['nome']} da véspera)" if f in iniciais else ''
+            mensagens.append(f"{nome} não pode fazer as sequências de turnos proibidas{vespera}")
+
+    for d, indices_turnos in sorted(cobertura_por_dia.items()):
+        dia = dias[d]
+        if len(indices_turnos) == 1:
+            t = indices_turnos[0]
+            texto = f"{turnos[t]['nome']} em {dia.strftime('%d/%m')} precisa de {turnos_necessarios_por_dia[dia][t]}"
+        else:
+            detalhe = ", ".join(f"{turnos[t]['nome']} {turnos_necessarios_por_dia[dia][t]}" for t in indices_turnos)
+            total = sum(turnos_necessarios_por_dia[dia][t] for t in indices_turnos)
+            texto = f"{dia.strftime('%d/%m')} precisa de {total} funcionários ({detalhe})"
+        mensagens.insert(0, f"{texto}, só {disponiveis_por_dia[d]} disponíveis após folgas")
+
+    if com_folgas:
+        mensagens.append(f"Folgas/restrições de {len(com_folgas)} funcionário(s): {', '.join(com_folgas)}")
+
+    return mensagens
+
+def gerar_escala_ortools(funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia, sequencias_proibidas, perfil_ideal=None, callback_solucao=None, dicas=None, estatisticas=None, fixas=None, tempo_limite=60.0, esparso=True, codificacao_sequencias='clausulas', diagnostico=None, num_workers=None, parar=None, gap_relativo=None, semente=None, nivel_presolve=None, nivel_linearizacao=None, fronteira=None, dias_previsao=0, quebrar_simetrias=False, compacto=False, diagnosticar=True):
+    """
+    funcionarios: lista de dicts com 'id' e 'nome'
+    turnos: lista de dicts com 'id' e 'nome' (ex: 'M', 'I', 'T', 'N')
+    dias: lista de datas (datetime.date)
+    restricoes: dict {funcionario_id: set(dias_folga)} ou matriz de disponibilidade funcionários × dias
+    turnos_necessarios_por_dia: dict {dia: [n_M, n_I, n_T, n_N]}
+    sequencias_proibidas: lista de tuplas [('N','M'), ...]
+    perfil_ideal: dict opcional {funcionario_id: {turno: quantidade_ideal}}
+    callback_solucao: função opcional chamada com {'solucoes', 'objetivo', 'gap', 'tempo', 'escalas'} a cada solução encontrada (ver ProgressoSolucoes)
+    dicas: set opcional {(funcionario_id, dia, turno_id)} com uma escala anterior para arranque a quente
+    estatisticas: dict opcional preenchido com os tempos e o estado do solver
+    fixas: dict opcional {(funcionario_id, dia): turno_id ou None} com células que não podem mudar (None = folga)
+    tempo_limite: tempo máximo de resolução em segundos
+    esparso: se False, constrói o modelo denso (para comparação)
+    codificacao_sequencias: 'clausulas' ou 'automato' (ver construir_modelo)
+    diagnostico: Diagnostico opcional onde registar a distribuição de turnos (só calculada se ativo)
+    num_workers: threads de procura do CP-SAT (None = todos os núcleos)
+    parar: threading.Event opcional; quando ativado interrompe a procura (fica a melhor solução encontrada)
+    gap_relativo, semente, nivel_presolve, nivel_linearizacao: parâmetros de procura opcionais (ver perfis_solver)
+    fronteira, dias_previsao: continuidade com o período anterior e dias só de previsão (ver construir_modelo)
+    quebrar_simetrias: ordenar os funcionários intermutáveis (ver construir_modelo)
+    compacto: devolver a SolucaoEscala em vez da lista [{'funcionario_id', 'turno_id', 'data'}]
+    diagnosticar: explicar a inviabilidade provada (ver diagnosticar_inviabilidade); False nos
+    subproblemas, em que a inviabilidade pode vir só da decomposição
+    """
+    inicio_construcao = time.perf_counter()
+    model, x = construir_modelo(
+        funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia,
+        sequencias_proibidas, perfil_ideal, dicas=dicas, fixas=fixas, esparso=esparso,
+        codificacao_sequencias=codificacao_sequencias, fronteira=fronteira, dias_previsao=dias_previsao,
+        quebrar_simetrias=quebrar_simetrias
+    )
+    tempo_construcao = time.perf_counter() - inicio_construcao
+    n_func = len(funcionarios)
+    n_turnos = len(turnos)
+    n_dias = len(dias)
+
+    tamanho = tamanho_modelo(model, n_func * n_dias * n_turnos)
+    logger.info("Modelo: %s variáveis, %s restrições (%s variáveis no modelo denso), construído em %.2fs",
+                tamanho['variaveis'], tamanho['restricoes'], tamanho['variaveis_densas'], tempo_construcao)
+    if estatisticas is not None:
+        estatisticas['tempo_construcao'] = tempo_construcao
+        estatisticas.update(tamanho)
+        if quebrar_simetrias:
+            classes = classes_equivalencia(
+                funcionarios, matriz_disponibilidade(funcionarios, dias, restricoes), perfil_ideal, fronteira, fixas
+            )
+            estatisticas['simetrias'] = {'classes': len(classes), 'funcionarios': sum(len(c) for c in classes)}
+
     # Resolver
     solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 60.0  # Aumentar tempo de resolução
-    status = solver.Solve(model)
+    solver.parameters.max_time_in_seconds = tempo_limite
+    if num_workers:
+        solver.parameters.num_workers = num_workers
+    if gap_relativo:
+        solver.parameters.relative_gap_limit = gap_relativo
+    if semente is not None:
+        # Só é totalmente reprodutível com num_workers = 1
+        solver.parameters.random_seed = semente
+    if nivel_presolve == 0:
+        solver.parameters.cp_model_presolve = False
+    elif nivel_presolve == 1:
+        solver.parameters.max_presolve_iterations = 1
+    if nivel_linearizacao is not None:
+        solver.parameters.linearization_level = nivel_linearizacao
+    if dicas:
+        # Reparar a escala sugerida quando já não é totalmente válida (ex: novas folgas)
+        solver.parameters.repair_hint = True
+    atribuicao = None
+    if callback_solucao:
+        atribuicao = [
+            (variavel, funcionarios[f]['id'], dias[d], turnos[t]['id'])
+            for (f, d, t), variavel in x.items()
+        ]
+    progresso = ProgressoSolucoes(callback_solucao, atribuicao)
+    vigia = None
+    if parar is not None:
+        # O Solve bloqueia esta thread; outra fica a vigiar o pedido de paragem
+        resolvido = threading.Event()
+        def vigiar():
+            while not resolvido.wait(0.1):
+                if parar.is_set():
+                    solver.StopSearch()
+                    return
+        vigia = threading.Thread(target=vigiar, name='vigia-solver', daemon=True)
+        vigia.start()
+    status = solver.Solve(model, progresso)
+    if vigia is not None:
+        resolvido.set()
+        vigia.join()
+    interrompida = parar is not None and parar.is_set()
+
+    if estatisticas is not None:
+        estatisticas['status'] = solver.StatusName(status)
+        estatisticas['tempo_resolucao'] = solver.WallTime()
+        estatisticas['tempo_primeira_solucao'] = progresso.tempo_primeira_solucao
+        estatisticas['solucoes'] = progresso.solucoes
+        if interrompida:
+            estatisticas['interrompida'] = True
+        if perfil_ideal and progresso.solucoes:
+            estatisticas['objetivo'] = solver.ObjectiveValue()
 
-    resultado = []
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-        print(f"Solver status: {status}")
-        if perfil_ideal:
-            print(f"Objetivo: {solver.ObjectiveValue()}")
-        
-        # Verificar se todos os turnos foram preenchidos
-        turnos_nao_preenchidos = 0
-        for d, dia in enumerate(dias):
-            for t in range(n_turnos):
-                funcionarios_no_turno = sum(solver.Value(x[f, d, t]) for f in range(n_func))
-                necessarios = turnos_necessarios_por_dia[dia][t]
-                if funcionarios_no_turno < necessarios:
-                    turnos_nao_preenchidos += necessarios - funcionarios_no_turno
-                    print(f"AVISO: Dia {dia}, Turno {turnos[t]['nome']}: {funcionarios_no_turno}/{necessarios}")
-        
+        logger.info("Solver status: %s, objetivo: %s", solver.StatusName(status),
+                    solver.ObjectiveValue() if perfil_ideal else None)
+
+        # Ler a solução uma só vez para a matriz compacta
+        solucao = SolucaoEscala.de_solver(solver, x, funcionarios, dias, turnos)
+
+        # Verificar se todos os turnos foram preenchidos (contagens vetorizadas sobre a matriz)
+        procura = np.array([turnos_necessarios_por_dia[dia] for dia in dias], dtype=np.int32).reshape(n_dias, n_turnos)
+        em_falta = np.maximum(procura - solucao.cobertura(), 0)
+        turnos_nao_preenchidos = int(em_falta.sum())
+        for d, t in np.argwhere(em_falta):
+            logger.warning("Dia %s, Turno %s: %s/%s", dias[d], turnos[t]['nome'], procura[d, t] - em_falta[d, t], procura[d, t])
+
         if turnos_nao_preenchidos > 0:
-            print(f"❌ {turnos_nao_preenchidos} turnos não foram preenchidos!")
+            logger.error("%s turnos não foram preenchidos!", turnos_nao_preenchidos)
             return None
-        
-        # Construir resultado
-        for d, dia in enumerate(dias):
-            for t, turno in enumerate(turnos):
-                for f, funcionario in enumerate(funcionarios):
-                    if solver.Value(x[f, d, t]):
-                        resultado.append({
-                            'funcionario_id': funcionario['id'],
-                            'turno_id': turno['id'],
-                            'data': dia
-                        })
-        
-        print(f"✅ Solução encontrada com {len(resultado)} escalas")
-        
-        # Mostrar estatísticas de equilíbrio
-        turnos_por_funcionario = {}
-        for f in range(n_func):
-            total_func = sum(solver.Value(x[f, d, t]) for d in range(n_dias) for t in range(n_turnos))
-            turnos_por_funcionario[funcionarios[f]['nome']] = total_func
-        
-        print("Distribuição de turnos por funcionário:")
-        for nome, total in sorted(turnos_por_funcionario.items()):
-            print(f"  {nome}: {total} turnos")
-        
-        return resultado
+
+        logger.info("Solução encontrada com %s escalas", len(solucao))
+        totais = solucao.totais()
+        if estatisticas is not None:
+            estatisticas['turnos_por_funcionario'] = resumo_turnos(totais)
+
+        # Quantas das atribuições sugeridas foram mantidas na solução
+        if dicas:
+            dicas_mantidas = solucao.mantidas(dicas)
+            taxa_dicas = dicas_mantidas / len(dicas)
+            logger.info("Arranque a quente: %s/%s atribuições mantidas (%.0f%%)", dicas_mantidas, len(dicas), taxa_dicas * 100)
+            if estatisticas is not None:
+                estatisticas['dicas'] = len(dicas)
+                estatisticas['dicas_mantidas'] = dicas_mantidas
+                estatisticas['taxa_dicas'] = taxa_dicas
+
+        # Estatísticas de equilíbrio (só com diagnósticos ativos)
+        if diagnostico is not None:
+            def distribuicao():
+                return {funcionarios[f]['nome']: int(totais[f])
+                        for f in sorted(range(n_func), key=lambda f: funcionarios[f]['nome'])}
+            diagnostico.registar('distribuicao', distribuicao)
+
+        return solucao if compacto else solucao.escalas()
     else:
-        print(f"❌ Solver falhou: {status}")
+        if interrompida:
+            logger.info("Procura interrompida antes de encontrar solução")
+        else:
+            logger.error("Solver falhou: %s", solver.StatusName(status))
+        # Explicar a inviabilidade provada (não se aplica às reparações com células fixas);
+        # sem prova (UNKNOWN) o diagnóstico repetiria a procura que acabou de esgotar o tempo
+        if status == cp_model.INFEASIBLE and diagnosticar and not fixas and not interrompida:
+            inicio_diagnostico = time.perf_counter()
+            mensagens = diagnosticar_inviabilidade(
+                funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia, sequencias_proibidas,
+                fronteira=fronteira, dias_previsao=dias_previsao
+            )
+            for mensagem in mensagens:
+                logger.warning(mensagem)
+            if estatisticas is not None:
+                estatisticas['diagnostico'] = mensagens
+                estatisticas['tempo_diagnostico'] = time.perf_counter() - inicio_diagnostico
         return None 
\ No newline at end of file
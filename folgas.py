@@ -0,0 +1,28 @@
+def sequencias_de_folga(dias_folga):
+    """Codifica por comprimento de sequência (run-length) uma lista ordenada de dias de folga.
+
+    Devolve uma lista de (posição do primeiro dia na lista, comprimento) para cada
+    sequência de dias de calendário consecutivos.
+    """
+    sequencias = []
+    inicio = 0
+    for i in range(1, len(dias_folga) + 1):
+        if i == len(dias_folga) or (dias_folga[i] - dias_folga[i-1]).days != 1:
+            sequencias.append((inicio, i - inicio))
+            inicio = i
+    return sequencias
+
+def analisar_folgas(dias_folga):
+    """Agrupa uma lista ordenada de dias de folga em pares de dias seguidos e folgas isoladas.
+
+    Dentro de cada sequência os dias são emparelhados a partir do início; numa
+    sequência ímpar o último dia fica isolado. Devolve (pares, isoladas).
+    """
+    pares = []
+    isoladas = []
+    for inicio, comprimento in sequencias_de_folga(dias_folga):
+        for i in range(inicio, inicio + comprimento - 1, 2):
+            pares.append((dias_folga[i], dias_folga[i + 1]))
+        if comprimento % 2:
+            isoladas.append(dias_folga[inicio + comprimento - 1])
+    return pares, isoladas
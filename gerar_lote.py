@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Geração de escalas em lote: várias valências × vários meses, num pool de processos.
+
+Uso:
+    python gerar_lote.py --de 2025-10 --ate 2025-12                    # todas as valências, um trimestre
+    python gerar_lote.py --valencias "Lar de Idosos" --meses 2025-10 2025-11
+    python gerar_lote.py --de 2025-10 --ate 2025-12 --workers 4 --threads 2
+    python gerar_lote.py --de 2026-01 --perfil qualidade                  # perfil do solver (ver perfis_solver)
+    python gerar_lote.py --de 2026-01 --equipas 4                         # por subequipas (ver decomposicao)
+
+Cada valência é gerada num processo próprio, mês a mês por ordem, e gravada por
+diferenças: cada mês lê a fronteira da escala acabada de gravar do mês anterior (ver
+OtimizadorMensal.carregar_fronteira), por isso os meses de uma valência nunca correm
+em paralelo. Por omissão usa todos os núcleos: um processo por valência (até ao número
+de núcleos) e os núcleos restantes como threads do CP-SAT; com --workers e --threads é
+possível trocar processos por threads (workers × threads não deve passar do número de
+núcleos). Cada geração fica registada como tarefa concluída (ou falhada), com o perfil
+e os parâmetros do solver usados.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_app = None
+
+def _iniciar_worker():
+    """Cria a aplicação uma vez por processo do pool"""
+    global _app
+    from app import app
+    _app = app
+
+def gerar_par(valencia, mes, ano, threads, tempo_limite=None, arranque_quente=None, perfil=None, equipas=None):
+    """Gera e grava a escala de um mês de uma valência; devolve o resumo para a tabela final"""
+    from datetime import datetime
+    from otimizador_mensal import OtimizadorMensal
+    from tarefas import registar_geracao
+
+    inicio = time.perf_counter()
+    criada_em = datetime.now()
+    linha = {'valencia': valencia, 'mes': mes, 'ano': ano, 'estado': 'falhou', 'escalas': 0,
+             'gravacao': None, 'tempo_resolucao': None, 'mensagem': None, 'perfil': perfil}
+    try:
+        with _app.app_context():
+            otimizador = OtimizadorMensal(mes, ano, valencia, arranque_quente=arranque_quente, perfil_solver=perfil)
+            otimizador.parametros_solver['num_workers'] = threads
+            if tempo_limite:
+                otimizador.parametros_solver['tempo_limite'] = tempo_limite
+            if equipas is not None:
+                otimizador.parametros_solver['equipas'] = equipas or None
+            escalas = otimizador.gerar_escala_mensal_completa()
+            estatisticas = otimizador.estatisticas
+            linha['tempo_resolucao'] = estatisticas.get('tempo_resolucao')
+            if escalas is None:
+                linha['mensagem'] = '; '.join(estatisticas.get('diagnostico') or []) or 'sem solução'
+                # A escala heurística parcial fica na tarefa registada, à espera de ser aceite na aplicação
+                if otimizador.alternativa:
+                    linha['mensagem'] += (f"; escala heurística parcial por aceitar, "
+                                          f"{estatisticas['alternativa']['em_falta']} turno(s) por preencher")
+            else:
+                linha['escalas'] = len(escalas)
+                linha['gravacao'] = otimizador.salvar_escala_otimizada(escalas)
+                if linha['gravacao'] is None:
+                    linha['mensagem'] = 'erro ao gravar'
+                else:
+                    linha['estado'] = 'cache' if estatisticas.get('cache', {}).get('resultado') == 'acerto' else 'ok'
+            linha['perfil'] = otimizador.perfil_solver
+            # A tarefa fica com o perfil e os parâmetros do solver usados (e a escala heurística, se falhou)
+            registar_geracao(otimizador, linha['estado'] != 'falhou',
+                             f"Gerada em lote{': ' + linha['mensagem'] if linha['mensagem'] else ''}", criada_em)
+    except Exception as e:
+        linha['mensagem'] = str(e)
+    linha['tempo_total'] = time.perf_counter() - inicio
+    return linha
+
+def gerar_valencia(valencia, meses, threads, tempo_limite=None, arranque_quente=None, perfil=None, equipas=None):
+    """Gera os meses de uma valência por ordem cronológica; devolve os resumos, um por mês"""
+    return [
+        gerar_par(valencia, mes, ano, threads, tempo_limite, arranque_quente, perfil, equipas)
+        for mes, ano in sorted(meses, key=lambda mes_ano: (mes_ano[1], mes_ano[0]))
+    ]
+
+def meses_entre(de, ate):
+    """Lista [(mes, ano)] de de até ate (inclusive), ambos em (mes, ano)"""
+    (mes, ano), fim = de, ate
+    meses = []
+    while (ano, mes) <= (fim[1], fim[0]):
+        meses.append((mes, ano))
+        mes, ano = (1, ano + 1) if mes == 12 else (mes + 1, ano)
+    return meses
+
+def ler_mes(texto):
+    """'AAAA-MM' → (mes, ano)"""
+    try:
+        ano, mes = (int(parte) for parte in texto.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"mês inválido: {texto!r} (use AAAA-MM)")
+    if not 1 <= mes <= 12:
+        raise argparse.ArgumentTypeError(f"mês inválido: {texto!r} (use AAAA-MM)")
+    return mes, ano
+
+def mostrar_tabela(linhas, tempo_total):
+    """Imprime o resumo de tempos e resultados por (valência, mês)"""
+    print(f"\n{'Valência':<25} {'Mês':>7}  {'Estado':<7} {'Perfil':<11} {'Escalas':>7} {'Ins/Rem':>11} {'Solver':>8} {'Total':>8}")
+    print('-' * 92)
+    for linha in linhas:
+        gravacao = linha['gravacao']
+        alteracoes = f"{gravacao['inseridas']}/{gravacao['removidas']}" if gravacao else '-'
+        solver = f"{linha['tempo_resolucao']:.1f}s" if linha['tempo_resolucao'] is not None else '-'
+        print(f"{linha['valencia'][:25]:<25} {linha['mes']:02d}/{linha['ano']}  {linha['estado']:<7} "
+              f"{linha['perfil'] or '-':<11} {linha['escalas']:>7} {alteracoes:>11} {solver:>8} {linha['tempo_total']:>7.1f}s")
+        if linha['mensagem']:
+            print(f"    {linha['mensagem']}")
+    soma = sum(linha['tempo_total'] for linha in linhas)
+    print('-' * 92)
+    print(f"{len(linhas)} escalas em {tempo_total:.1f}s (soma dos tempos {soma:.1f}s, "
+          f"paralelismo efetivo {soma / tempo_total if tempo_total else 0:.1f}×)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Geração de escalas em lote")
+    parser.add_argument('--valencias', nargs='+', help="Valências a gerar (por omissão, todas as que têm funcionários ativos)")
+    parser.add_argument('--meses', nargs='+', type=ler_mes, default=[], metavar='AAAA-MM')
+    parser.add_argument('--de', type=ler_mes, metavar='AAAA-MM', help="Primeiro mês de um intervalo")
+    parser.add_argument('--ate', type=ler_mes, metavar='AAAA-MM', help="Último mês do intervalo (por omissão, igual a --de)")
+    nucleos = os.cpu_count() or 1
+    parser.add_argument('--workers', type=int, default=None, help=f"Processos em paralelo (por omissão, {nucleos})")
+    parser.add_argument('--threads', type=int, default=None, help="Threads do CP-SAT por processo (por omissão, núcleos / workers)")
+    parser.add_argument('--tempo-limite', type=float, default=None, help="Tempo máximo do solver por mês, em segundos")
+    parser.add_argument('--arranque-quente', choices=['atual', 'anterior'])
+    parser.add_argument('--perfil', help="Perfil do solver (por omissão, o da configuração de cada valência)")
+    parser.add_argument('--equipas', type=int, default=None,
+                        help="Gerar por N subequipas (0 = um só modelo; por omissão, o da configuração de cada valência)")
+    args = parser.parse_args()
+
+    meses = list(args.meses)
+    if args.de:
+        meses += meses_entre(args.de, args.ate or args.de)
+    if not meses:
+        parser.error("indique --meses ou --de/--ate")
+
+    _iniciar_worker()
+    from models import db, Funcionario
+    from migracoes import aplicar_colunas, aplicar_indices
+    from perfis_solver import criar_perfis_predefinidos, listar_perfis
+    with _app.app_context():
+        db.create_all()
+        aplicar_colunas()
+        aplicar_indices()
+        criar_perfis_predefinidos()
+        if args.perfil and args.perfil not in listar_perfis():
+            parser.error(f"perfil desconhecido: {args.perfil!r} (disponíveis: {', '.join(listar_perfis())})")
+    valencias = args.valencias
+    if not valencias:
+        with _app.app_context():
+            valencias = [v for (v,) in db.session.query(Funcionario.valencia).filter_by(ativo=True).distinct().order_by(Funcionario.valencia)]
+    meses = list(dict.fromkeys(meses))
+    if not valencias:
+        print("❌ Nenhuma valência com funcionários ativos")
+        return 1
+
+    # Só valências diferentes correm em paralelo (os meses de cada uma encadeiam pela fronteira)
+    workers = max(1, min(args.workers or nucleos, len(valencias)))
+    threads = max(1, args.threads or nucleos // workers)
+    if workers * threads > nucleos:
+        print(f"⚠️  {workers} workers × {threads} threads excede os {nucleos} núcleos disponíveis")
+    print(f"A gerar {len(valencias) * len(meses)} escalas com {workers} workers × {threads} threads do CP-SAT"
+          f"{f' (perfil {args.perfil})' if args.perfil else ''}")
+
+    inicio = time.perf_counter()
+    linhas = []
+    # 'spawn' evita herdar ligações à base de dados e threads do processo principal
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_iniciar_worker) as executor:
+        futuros = [
+            executor.submit(gerar_valencia, valencia, meses, threads, args.tempo_limite, args.arranque_quente,
+                            args.perfil, args.equipas)
+            for valencia in valencias
+        ]
+        for futuro in as_completed(futuros):
+            for linha in futuro.result():
+                print(f"{'✅' if linha['estado'] != 'falhou' else '❌'} {linha['valencia']} "
+                      f"{linha['mes']:02d}/{linha['ano']} ({linha['tempo_total']:.1f}s)")
+                linhas.append(linha)
+
+    linhas.sort(key=lambda linha: (linha['valencia'], linha['ano'], linha['mes']))
+    mostrar_tabela(linhas, time.perf_counter() - inicio)
+    return 0 if all(linha['estado'] != 'falhou' for linha in linhas) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
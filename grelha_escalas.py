@@ -0,0 +1,77 @@
+import calendar
+from datetime import date
+
+from models import db, Escala, Funcionario, Turno
+
+LETRAS_DIAS_SEMANA = ["S", "T", "Q", "Q", "S", "S", "D"]
+CODIGOS_TURNOS = ['M', 'I', 'T', 'N']
+
+def consulta_grelha_mensal(data_inicio, data_fim, valencia=None):
+    """Consulta (funcionario_id, funcionario_nome, data, turno_nome) das escalas do período, pela ordem de gravação.
+
+    Só lê as colunas necessárias para a grelha (sem carregar objetos ORM); valencia None = todas.
+    """
+    consulta = db.session.query(
+        Escala.funcionario_id,
+        Funcionario.nome,
+        Escala.data,
+        Turno.nome
+    ).join(Funcionario, Escala.funcionario_id == Funcionario.id).outerjoin(
+        Turno, Escala.turno_id == Turno.id
+    ).filter(
+        Escala.data >= data_inicio,
+        Escala.data <= data_fim
+    )
+    if valencia:
+        consulta = consulta.filter(Escala.valencia == valencia)
+    return consulta.order_by(Escala.id)
+
+def montar_grelha_escalas(linhas, ano, mes):
+    """Monta numa só passagem a grelha funcionário × dia usada pela vista mensal.
+
+    linhas: iterável de tuplos (funcionario_id, funcionario_nome, data, turno_nome)
+
+    Devolve um dict com a lista de dias, as linhas por funcionário (células
+    indexadas pelo dia do mês e total), as contagens por dia/turno e os totais,
+    para que o template só tenha de consultar valores.
+    """
+    n_dias = calendar.monthrange(ano, mes)[1]
+    dias = [
+        {'dia': d, 'letra': LETRAS_DIAS_SEMANA[date(ano, mes, d).weekday()]}
+        for d in range(1, n_dias + 1)
+    ]
+
+    por_funcionario = {}
+    contagem_por_dia = [dict.fromkeys(CODIGOS_TURNOS, 0) for _ in range(n_dias)]
+    total_por_dia = [0] * n_dias
+    total_escalas = 0
+
+    for funcionario_id, nome, data, turno_nome in linhas:
+        linha = por_funcionario.get(funcionario_id)
+        if linha is None:
+            linha = {'id': funcionario_id, 'nome': nome, 'celulas': [None] * n_dias, 'total': 0}
+            por_funcionario[funcionario_id] = linha
+
+        turno_nome = turno_nome or ''
+        codigo = turno_nome[0].upper() if turno_nome else ''
+        i = data.day - 1
+
+        # Se houver mais de uma escala no mesmo dia, mostra-se a primeira
+        if linha['celulas'][i] is None:
+            linha['celulas'][i] = {'codigo': codigo, 'turno': turno_nome}
+        linha['total'] += 1
+        total_por_dia[i] += 1
+        total_escalas += 1
+        if codigo in contagem_por_dia[i]:
+            contagem_por_dia[i][codigo] += 1
+
+    funcionarios = sorted(por_funcionario.values(), key=lambda linha: linha['nome'])
+
+    return {
+        'dias': dias,
+        'funcionarios': funcionarios,
+        'contagem_por_dia': contagem_por_dia,
+        'total_por_dia': total_por_dia,
+        'total_escalas': total_escalas,
+        'media_por_funcionario': round(total_escalas / len(funcionarios), 1) if funcionarios else 0
+    }
@@ -0,0 +1,307 @@
+"""Heurística construtiva com pesquisa local, sem CP-SAT.
+
+Constrói a escala dia a dia (escolha gulosa por disponibilidade e equilíbrio) e
+depois melhora-a com movimentos que respeitam as folgas, as sequências proibidas e
+o máximo de dias consecutivos: preencher vagas (diretamente ou trocando o turno de
+quem já trabalha nesse dia), passar turnos de quem tem a mais para quem tem a menos
+e trocar turnos entre dois funcionários no mesmo dia (perfil ideal).
+
+Nunca põe mais pessoas num turno do que as necessárias: o que não for possível
+preencher fica na lista de vagas. Serve de primeira resposta rápida e de
+alternativa quando o solver não devolve escala.
+"""
+
+from escalonador import matriz_disponibilidade, MAX_DIAS_CONSECUTIVOS
+import logging
+import numpy as np
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pesos do custo: uma vaga vale mais do que qualquer desequilíbrio, que vale mais do que o perfil
+PESO_VAGA = 1000
+PESO_EQUILIBRIO = 10
+
+class EscalaHeuristica:
+    """Estado da escala (matriz funcionários × dias com o índice do turno, -1 = folga) e os movimentos"""
+
+    def __init__(self, funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia,
+                 sequencias_proibidas, perfil_ideal=None, fronteira=None, semente=0):
+        self.funcionarios = funcionarios
+        self.turnos = turnos
+        self.dias = dias
+        self.n_func, self.n_dias, self.n_turnos = len(funcionarios), len(dias), len(turnos)
+        self.disponivel = matriz_disponibilidade(funcionarios, dias, restricoes)
+        self.procura = np.array([turnos_necessarios_por_dia[dia] for dia in dias], dtype=np.int32).reshape(self.n_dias, self.n_turnos)
+        self.rng = np.random.default_rng(semente)
+
+        # proibido[anterior, atual]; a linha n_turnos é "folga na véspera" (nada proibido)
+        turno_idx = {t['nome'][0].upper(): i for i, t in enumerate(turnos)}
+        self.proibido = np.zeros((self.n_turnos + 1, self.n_turnos), dtype=bool)
+        for anterior, atual in sequencias_proibidas:
+            if anterior in turno_idx and atual in turno_idx:
+                self.proibido[turno_idx[anterior], turno_idx[atual]] = True
+
+        # Estado à entrada do primeiro dia (ver escalonador.estado_fronteira)
+        indice_turno = {t['id']: i for i, t in enumerate(turnos)}
+        self.seguidos_inicio = np.zeros(self.n_func, dtype=np.int32)
+        self.ultimo_inicio = np.full(self.n_func, -1, dtype=np.int32)
+        for f, funcionario in enumerate(funcionarios):
+            if fronteira and funcionario['id'] in fronteira:
+                dias_seguidos, turno_id = fronteira[funcionario['id']]
+                if turno_id in indice_turno:
+                    self.seguidos_inicio[f] = min(dias_seguidos, MAX_DIAS_CONSECUTIVOS)
+                    self.ultimo_inicio[f] = indice_turno[turno_id]
+
+        # Equilíbrio igual ao do modelo: entre min_turnos e min_turnos + 1 turnos por funcionário
+        self.min_turnos = int(self.procura.sum()) // max(1, self.n_func)
+        self.max_turnos = self.min_turnos + 1
+        self.ideal = np.zeros((self.n_func, self.n_turnos), dtype=np.int32)
+        if perfil_ideal:
+            for f, funcionario in enumerate(funcionarios):
+                for t, turno in enumerate(turnos):
+                    self.ideal[f, t] = perfil_ideal.get(funcionario['id'], {}).get(turno['nome'][0].upper(), 0)
+        self.com_perfil = bool(perfil_ideal)
+
+        self.escala = np.full((self.n_func, self.n_dias), -1, dtype=np.int32)
+        self.cobertura = np.zeros((self.n_dias, self.n_turnos), dtype=np.int32)
+        self.total = np.zeros(self.n_func, dtype=np.int32)
+        self.contagem = np.zeros((self.n_func, self.n_turnos), dtype=np.int32)
+
+    # --- Construção ---
+
+    def construir(self):
+        """Preenchimento guloso dia a dia, vetorizado por turno"""
+        seguidos = self.seguidos_inicio.copy()
+        ultimo = np.where(self.ultimo_inicio >= 0, self.ultimo_inicio, self.n_turnos)
+        # Ritmo esperado de cada funcionário: alvo proporcional aos dias em que está disponível
+        alvo = (self.min_turnos + self.max_turnos) / 2
+        disponiveis_ate = np.cumsum(self.disponivel, axis=1)
+        disponiveis_total = np.maximum(disponiveis_ate[:, -1], 1) if self.n_dias else np.ones(self.n_func)
+        ruido = self.rng.random((self.n_dias, self.n_func)) * 0.01
+
+        for d in range(self.n_dias):
+            livre = self.disponivel[:, d] & (seguidos < MAX_DIAS_CONSECUTIVOS)
+            atraso = alvo * disponiveis_ate[:, d] / disponiveis_total - self.total
+            pendentes = list(range(self.n_turnos))
+            while pendentes:
+                # Primeiro o turno com menos candidatos, para não ficar sem ninguém
+                elegiveis = {t: livre & ~self.proibido[ultimo, t] for t in pendentes}
+                t = min(pendentes, key=lambda t: elegiveis[t].sum() - self.procura[d, t])
+                pendentes.remove(t)
+                candidatos = np.flatnonzero(elegiveis[t])
+                necessarios = self.procura[d, t]
+                if necessarios <= 0 or not len(candidatos):
+                    continue
+                pontuacao = -atraso[candidatos] * 10 + seguidos[candidatos] * 0.5 + ruido[d, candidatos]
+                pontuacao += (self.total[candidatos] >= self.max_turnos) * 1000
+                if self.com_perfil:
+                    pontuacao -= np.maximum(self.ideal[candidatos, t] - self.contagem[candidatos, t], 0) * 3
+                escolhidos = candidatos[np.argsort(pontuacao, kind='stable')[:necessarios]]
+                self.escala[escolhidos, d] = t
+                self.total[escolhidos] += 1
+                self.contagem[escolhidos, t] += 1
+                self.cobertura[d, t] += len(escolhidos)
+                livre[escolhidos] = False
+
+            trabalha = self.escala[:, d] >= 0
+            seguidos = np.where(trabalha, seguidos + 1, 0)
+            ultimo = np.where(trabalha, self.escala[:, d], self.n_turnos)
+
+    # --- Regras ---
+
+    def _anterior(self, f, d):
+        return self.escala[f, d - 1] if d > 0 else self.ultimo_inicio[f]
+
+    def _seguidos_antes(self, f, d):
+        seguidos = 0
+        while seguidos < MAX_DIAS_CONSECUTIVOS and d - seguidos - 1 >= 0 and self.escala[f, d - seguidos - 1] >= 0:
+            seguidos += 1
+        if seguidos == d:
+            seguidos += self.seguidos_inicio[f]
+        return seguidos
+
+    def _seguidos_depois(self, f, d):
+        seguidos = 0
+        while seguidos < MAX_DIAS_CONSECUTIVOS and d + seguidos + 1 < self.n_dias and self.escala[f, d + seguidos + 1] >= 0:
+            seguidos += 1
+        return seguidos
+
+    def pares_validos(self, f, d, t):
+        """O turno t no dia d respeita as sequências com a véspera e com o dia seguinte"""
+        anterior = self._anterior(f, d)
+        if anterior >= 0 and self.proibido[anterior, t]:
+            return False
+        return not (d + 1 < self.n_dias and self.escala[f, d + 1] >= 0 and self.proibido[t, self.escala[f, d + 1]])
+
+    def pode_trabalhar(self, f, d, t):
+        """f está de folga em d e pode passar a fazer o turno t sem violar nenhuma regra"""
+        if not self.disponivel[f, d] or self.escala[f, d] >= 0 or not self.pares_validos(f, d, t):
+            return False
+        return self._seguidos_antes(f, d) + 1 + self._seguidos_depois(f, d) <= MAX_DIAS_CONSECUTIVOS
+
+    def atribuir(self, f, d, t):
+        anterior = self.escala[f, d]
+        if anterior >= 0:
+            self.contagem[f, anterior] -= 1
+            self.cobertura[d, anterior] -= 1
+            self.total[f] -= 1
+        self.escala[f, d] = t
+        if t >= 0:
+            self.contagem[f, t] += 1
+            self.cobertura[d, t] += 1
+            self.total[f] += 1
+
+    # --- Custo ---
+
+    def desvio_equilibrio(self, total):
+        return max(0, self.min_turnos - total) + max(0, total - self.max_turnos)
+
+    def custo(self):
+        vagas = int((self.procura - self.cobertura).sum())
+        equilibrio = sum(self.desvio_equilibrio(int(total)) for total in self.total)
+        perfil = int(np.abs(self.contagem - self.ideal).sum()) if self.com_perfil else 0
+        return PESO_VAGA * vagas + PESO_EQUILIBRIO * equilibrio + perfil
+
+    def _delta(self, f, t, sinal):
+        """Variação do custo (equilíbrio e perfil) se f ganhar (+1) ou perder (-1) um turno t"""
+        total = int(self.total[f])
+        delta = PESO_EQUILIBRIO * (self.desvio_equilibrio(total + sinal) - self.desvio_equilibrio(total))
+        if self.com_perfil:
+            contagem, ideal = int(self.contagem[f, t]), int(self.ideal[f, t])
+            delta += abs(contagem + sinal - ideal) - abs(contagem - ideal)
+        return delta
+
+    # --- Pesquisa local ---
+
+    def preencher_vaga(self, d, t):
+        """Tenta preencher uma vaga: alguém de folga, ou troca de turno de quem trabalha + alguém de folga"""
+        folga = np.flatnonzero((self.escala[:, d] < 0) & self.disponivel[:, d])
+        for f in sorted(folga, key=lambda f: self._delta(f, t, +1)):
+            if self.pode_trabalhar(f, d, t):
+                self.atribuir(f, d, t)
+                return True
+        for g in np.flatnonzero(self.escala[:, d] >= 0):
+            t_g = self.escala[g, d]
+            if t_g == t or not self.pares_validos(g, d, t):
+                continue
+            self.atribuir(g, d, t)
+            for f in folga:
+                if self.pode_trabalhar(f, d, t_g):
+                    self.atribuir(f, d, t_g)
+                    return True
+            self.atribuir(g, d, t_g)
+        return False
+
+    def passar_turno(self, f, g):
+        """Passa um turno de f (com a mais) para g (com a menos) num dia em que g possa fazê-lo"""
+        for d in self.rng.permutation(np.flatnonzero(self.escala[f] >= 0)):
+            t = self.escala[f, d]
+            if self.pode_trabalhar(g, d, t) and self._delta(f, t, -1) + self._delta(g, t, +1) < 0:
+                self.atribuir(f, d, -1)
+                self.atribuir(g, d, t)
+                return True
+        return False
+
+    def trocar_turnos(self, f, g, d):
+        """Troca os turnos de f e g no dia d se respeitar as sequências e aproximar do perfil ideal"""
+        t_f, t_g = self.escala[f, d], self.escala[g, d]
+        if t_f == t_g or t_f < 0 or t_g < 0:
+            return False
+        delta = (self._delta(f, t_f, -1) + self._delta(f, t_g, +1) + self._delta(g, t_g, -1) + self._delta(g, t_f, +1))
+        if delta >= 0:
+            return False
+        self.atribuir(f, d, t_g)
+        self.atribuir(g, d, t_f)
+        if self.pares_validos(f, d, t_g) and self.pares_validos(g, d, t_f):
+            return True
+        self.atribuir(f, d, t_f)
+        self.atribuir(g, d, t_g)
+        return False
+
+    def melhorar(self, limite):
+        """Aplica movimentos que baixam o custo até não haver melhorias ou passar o tempo limite"""
+        movimentos = 0
+        melhorou = True
+        while melhorou and time.perf_counter() < limite:
+            melhorou = False
+            for d, t in zip(*np.nonzero(self.procura > self.cobertura)):
+                while self.cobertura[d, t] < self.procura[d, t] and self.preencher_vaga(d, t):
+                    movimentos += 1
+                    melhorou = True
+            if time.perf_counter() >= limite:
+                break
+
+            # Quem passa do máximo dá turnos a quem ainda não chegou ao máximo, e quem não chega
+            # ao mínimo recebe de quem já passou o mínimo (os movimentos só contam se baixarem o custo)
+            excesso, falta = self.total > self.max_turnos, self.total < self.min_turnos
+            dadores = np.flatnonzero(excesso | (falta.any() & (self.total > self.min_turnos)))
+            recetores = np.flatnonzero(falta | (excesso.any() & (self.total < self.max_turnos)))
+            for f in dadores[np.argsort(-self.total[dadores], kind='stable')]:
+                for g in recetores[np.argsort(self.total[recetores], kind='stable')]:
+                    if self.total[f] > self.total[g] + 1 and self.passar_turno(f, g):
+                        movimentos += 1
+                        melhorou = True
+                        break
+                if time.perf_counter() >= limite:
+                    break
+
+            if self.com_perfil:
+                for d in range(self.n_dias):
+                    trabalham = np.flatnonzero(self.escala[:, d] >= 0)
+                    for i, f in enumerate(trabalham):
+                        for g in trabalham[i + 1:]:
+                            if self.trocar_turnos(f, g, d):
+                                movimentos += 1
+                                melhorou = True
+                    if time.perf_counter() >= limite:
+                        break
+        return movimentos
+
+    # --- Resultado ---
+
+    def escalas(self):
+        f_idx, d_idx = np.nonzero(self.escala >= 0)
+        return [
+            {'funcionario_id': self.funcionarios[f]['id'], 'turno_id': self.turnos[self.escala[f, d]]['id'], 'data': self.dias[d]}
+            for d, f in sorted(zip(d_idx.tolist(), f_idx.tolist()))
+        ]
+
+    def vagas(self):
+        return [
+            {'data': self.dias[d], 'turno_id': self.turnos[t]['id'], 'turno': self.turnos[t]['nome'],
+             'em_falta': int(self.procura[d, t] - self.cobertura[d, t])}
+            for d, t in zip(*np.nonzero(self.procura > self.cobertura))
+        ]
+
+def gerar_escala_heuristica(funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia, sequencias_proibidas,
+                            perfil_ideal=None, fronteira=None, tempo_limite=2.0, semente=0, estatisticas=None):
+    """Escala heurística com os mesmos dados de entrada de gerar_escala_ortools.
+
+    Devolve (escalas, vagas): escalas no formato do solver e vagas
+    [{'data', 'turno_id', 'turno', 'em_falta'}] com os turnos que ficaram por preencher.
+    tempo_limite limita a pesquisa local (a construção corre sempre até ao fim).
+    """
+    inicio = time.perf_counter()
+    escala = EscalaHeuristica(funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia,
+                              sequencias_proibidas, perfil_ideal, fronteira, semente)
+    escala.construir()
+    custo_inicial = escala.custo()
+    tempo_construcao = time.perf_counter() - inicio
+    movimentos = escala.melhorar(inicio + tempo_limite)
+    vagas = escala.vagas()
+
+    tempo = time.perf_counter() - inicio
+    em_falta = sum(vaga['em_falta'] for vaga in vagas)
+    logger.info("Heurística: %s vagas por preencher, custo %s → %s (%s movimentos) em %.2fs",
+                em_falta, custo_inicial, escala.custo(), movimentos, tempo)
+    if estatisticas is not None:
+        estatisticas.update({
+            'vagas': em_falta,
+            'custo_inicial': custo_inicial,
+            'custo': escala.custo(),
+            'movimentos': movimentos,
+            'tempo_construcao': tempo_construcao,
+            'tempo': tempo
+        })
+    return escala.escalas(), vagas
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Migração das colunas e índices novos e verificação dos planos das consultas mais frequentes.
+
+Uso:
+    python migracoes.py                 # cria as colunas e os índices em falta na base de dados configurada
+    python migracoes.py --verificar     # mostra os planos e falha se alguma consulta fizer full scan
+
+A base de dados é a da aplicação (DATABASE_URL ou instance/escalas.db).
+"""
+
+import os
+import re
+import sys
+from datetime import timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from models import db, Escala
+from perfis_solver import criar_perfis_predefinidos
+
+# Tabelas que nunca devem ser percorridas por inteiro nas consultas verificadas
+TABELAS_GRANDES = ('escala', 'restricao', 'funcionario')
+
+def aplicar_colunas():
+    """Acrescenta as colunas declaradas nos modelos que faltam em tabelas já existentes (sempre anuláveis)"""
+    criadas = []
+    inspetor = db.inspect(db.engine)
+    for tabela in db.metadata.sorted_tables:
+        if not inspetor.has_table(tabela.name):
+            continue
+        existentes = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+        for coluna in tabela.columns:
+            if coluna.name in existentes:
+                continue
+            tipo = coluna.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'))
+            criadas.append(f'{tabela.name}.{coluna.name}')
+    return criadas
+
+def aplicar_indices():
+    """Cria os índices declarados nos modelos que ainda não existem (tabelas já criadas por create_all)"""
+    criados = []
+    for tabela in db.metadata.sorted_tables:
+        existentes = {indice['name'] for indice in db.inspect(db.engine).get_indexes(tabela.name)}
+        for indice in tabela.indexes:
+            if indice.name not in existentes:
+                indice.create(db.engine, checkfirst=True)
+                criados.append(indice.name)
+    return criados
+
+def consultas_frequentes():
+    """Consultas do dia a dia, construídas pelo código que as usa, com valores de exemplo"""
+    from app import consulta_escalas_futuras
+    from escalonador import MAX_DIAS_CONSECUTIVOS
+    from grelha_escalas import consulta_grelha_mensal
+    from otimizador_mensal import OtimizadorMensal
+
+    otimizador = OtimizadorMensal(8, 2025, 'Lar de Idosos')
+    inicio, fim = otimizador.limites_mes()
+    return {
+        'grelha mensal (/escalas)': consulta_grelha_mensal(inicio, fim, otimizador.valencia),
+        'grelha mensal de todas as valências': consulta_grelha_mensal(inicio, fim),
+        'escalas existentes do mês': otimizador.consulta_escalas(
+            inicio, fim, Escala.id, Escala.funcionario_id, Escala.data, Escala.turno_id
+        ).order_by(Escala.id),
+        'fronteira do mês anterior': otimizador.consulta_escalas(
+            inicio - timedelta(days=MAX_DIAS_CONSECUTIVOS), inicio - timedelta(days=1)
+        ),
+        'escalas futuras do funcionário': consulta_escalas_futuras(Escala.funcionario_id, 1, inicio),
+        'escalas futuras do turno': consulta_escalas_futuras(Escala.turno_id, 1, inicio),
+        'escalas futuras da valência': consulta_escalas_futuras(Escala.valencia, otimizador.valencia, inicio),
+        'restrições do mês (carregar_dados)': otimizador.consulta_restricoes(inicio, fim),
+        'funcionários ativos da valência': otimizador.consulta_funcionarios(),
+    }
+
+def verificar_planos():
+    """Devolve [(nome, linhas do plano, ok)] para cada consulta frequente (SQLite)"""
+    resultados = []
+    for nome, consulta in consultas_frequentes().items():
+        sql = str(consulta.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        # Ligação nova, para ver o esquema depois de uma migração feita noutra ligação
+        with db.engine.connect() as conn:
+            plano = [linha[-1] for linha in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        full_scan = any(
+            re.match(rf'SCAN ({"|".join(TABELAS_GRANDES)})\b', linha) for linha in plano
+        )
+        resultados.append((nome, plano, not full_scan))
+    return resultados
+
+def main():
+    from app import app
+
+    verificar = '--verificar' in sys.argv[1:]
+    with app.app_context():
+        db.create_all()
+        colunas = aplicar_colunas()
+        criados = aplicar_indices()
+        perfis = criar_perfis_predefinidos()
+        print(f"Base de dados: {db.engine.url}")
+        if colunas:
+            print(f"✅ Colunas criadas: {', '.join(colunas)}")
+        if perfis:
+            print(f"✅ Perfis do solver criados: {', '.join(perfis)}")
+        if criados:
+            print(f"✅ Índices criados: {', '.join(criados)}")
+        else:
+            print("✅ Todos os índices já existiam")
+
+        if not verificar:
+            return 0
+        if db.engine.dialect.name != 'sqlite':
+            print("⚠️  A verificação de planos só está disponível para SQLite")
+            return 0
+
+        falhas = 0
+        for nome, plano, ok in verificar_planos():
+            print(f"\n{'✅' if ok else '❌'} {nome}")
+            for linha in plano:
+                print(f"    {linha}")
+            falhas += not ok
+        if falhas:
+            print(f"\n❌ {falhas} consulta(s) com full scan")
+            return 1
+        print("\n✅ Nenhuma consulta faz full scan")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
 
 db = SQLAlchemy()
 
@@ -10,6 +11,10 @@ class Funcionario(db.Model):
     telefone = db.Column(db.String(20))
     valencia = db.Column(db.String(50), nullable=False)
     ativo = db.Column(db.Boolean, default=True)
+    equipa = db.Column(db.String(50))  # subequipa para a geração por subequipas (ver decomposicao)
+    __table_args__ = (
+        db.Index('ix_funcionario_valencia_ativo', 'valencia', 'ativo'),
+    )
     restricoes = db.relationship('Restricao', backref='funcionario', lazy=True, cascade='all, delete-orphan')
     escalas = db.relationship('Escala', backref='funcionario', lazy=True, cascade='all, delete-orphan')
 
@@ -20,6 +25,10 @@ class Restricao(db.Model):
     data_inicio = db.Column(db.Date, nullable=False)
     data_fim = db.Column(db.Date, nullable=False)
     descricao = db.Column(db.Text)
+    __table_args__ = (
+        # Restrições de um funcionário que se sobrepõem a um período (data_fim >= início)
+        db.Index('ix_restricao_funcionario_periodo', 'funcionario_id', 'data_fim', 'data_inicio'),
+    )
 
 class Turno(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -36,6 +45,13 @@ class Escala(db.Model):
     turno_id = db.Column(db.Integer, db.ForeignKey('turno.id'), nullable=False)
     data = db.Column(db.Date, nullable=False)
     valencia = db.Column(db.String(50), nullable=False)
+    __table_args__ = (
+        # Grelha mensal e gravação (intervalo de datas, com ou sem valência)
+        db.Index('ix_escala_data_valencia', 'data', 'valencia'),
+        # Verificações de escalas futuras antes de eliminar funcionários e turnos
+        db.Index('ix_escala_funcionario_data', 'funcionario_id', 'data'),
+        db.Index('ix_escala_turno_data', 'turno_id', 'data'),
+    )
 
 class Configuracao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -47,4 +63,56 @@ class Configuracao(db.Model):
     # Campos para rodízio automático
     ativar_rodizio = db.Column(db.Boolean, default=False)
     data_inicio_rodizio = db.Column(db.Date)          # Data de início do padrão
-    padrao_rodizio = db.Column(db.String(200))        # JSON string com o padrão personalizado 
\ No newline at end of file
+    padrao_rodizio = db.Column(db.String(200))        # JSON string com o padrão personalizado 
+    perfil_solver = db.Column(db.String(50))          # Perfil do solver por omissão (None = 'equilibrado')
+    equipas_solver = db.Column(db.Integer)            # Gerar por N subequipas (None = um só modelo)
+
+class PerfilSolver(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(50), unique=True, nullable=False)  # ex: 'rápido', 'equilibrado', 'qualidade'
+    descricao = db.Column(db.String(200))
+    num_workers = db.Column(db.Integer)  # threads de procura do CP-SAT (None = todos os núcleos)
+    tempo_limite = db.Column(db.Float, nullable=False, default=60.0)  # segundos
+    gap_relativo = db.Column(db.Float, default=0.0)  # para quando a solução está a esta distância relativa do limite
+    semente = db.Column(db.Integer, default=0)
+    nivel_presolve = db.Column(db.Integer, default=2)  # 0 = sem presolve, 1 = uma passagem, 2 = completo
+    nivel_linearizacao = db.Column(db.Integer, default=1)  # linearization_level do CP-SAT (0, 1 ou 2)
+
+class TarefaGeracao(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 em hexadecimal
+    valencia = db.Column(db.String(50), nullable=False)
+    mes = db.Column(db.Integer, nullable=False)
+    ano = db.Column(db.Integer, nullable=False)
+    estado = db.Column(db.String(20), nullable=False, default='pendente')  # 'pendente', 'em_execucao', 'a_cancelar', 'a_aceitar', 'concluida', 'falhou', 'cancelada'
+    fase = db.Column(db.String(50))
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    iniciada_em = db.Column(db.DateTime)
+    terminada_em = db.Column(db.DateTime)
+    melhor_objetivo = db.Column(db.Float)
+    solucoes_encontradas = db.Column(db.Integer, default=0)
+    mensagem = db.Column(db.Text)
+    estatisticas = db.Column(db.Text)  # JSON com as estatísticas da geração
+    arranque_quente = db.Column(db.String(20))  # None, 'atual' ou 'anterior'
+    gap = db.Column(db.Float)  # distância relativa da melhor solução ao limite do solver
+    melhor_solucao = db.Column(db.Text)  # JSON [[funcionario_id, data, turno_id], ...] da melhor solução até agora
+    perfil_solver = db.Column(db.String(50))  # perfil usado (os parâmetros efetivos ficam nas estatísticas)
+    reparacao = db.Column(db.Text)  # JSON {funcionario_id, data_inicio, data_fim} de uma reparação (None = gerar o mês)
+    diagnostico = db.Column(db.Boolean)  # True = só diagnosticar o mês, sem gerar nem gravar escala
+    __table_args__ = (
+        # Fila de tarefas pendentes do serviço de geração
+        db.Index('ix_tarefa_geracao_estado_criada', 'estado', 'criada_em'),
+    )
+
+class CacheSolucao(db.Model):
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 dos dados de entrada do solver
+    valencia = db.Column(db.String(50), nullable=False)
+    solucao = db.Column(db.Text, nullable=False)  # JSON [[funcionario_id, data, turno_id], ...]
+    status = db.Column(db.String(20))
+    objetivo = db.Column(db.Float)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    usada_em = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    acessos = db.Column(db.Integer, default=0)
+    __table_args__ = (
+        # Remoção das entradas usadas há mais tempo (LRU)
+        db.Index('ix_cache_solucao_usada_em', 'usada_em'),
+    )
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""Otimização de períodos longos (ano, semestre ou trimestre) em horizonte deslizante.
+
+Em vez de um só modelo para o período inteiro, cada mês é resolvido numa janela que
+inclui os primeiros dias do mês seguinte como previsão. Só o mês fica decidido: o
+estado dos seus últimos dias (ver estado_fronteira) passa para a janela seguinte, que
+também recebe a previsão como arranque a quente. Todas as janelas têm o tamanho de
+um mês, por isso o tempo e a memória crescem linearmente com o número de meses.
+
+Uso:
+    python otimizador_anual.py --ano 2026 --valencia "Lar de Idosos"
+    python otimizador_anual.py --ano 2026 --valencia "Lar de Idosos" --periodo trimestral --perfil rápido
+"""
+
+from otimizador_mensal import OtimizadorMensal, get_app_context
+from escalonador import estado_fronteira
+from perfis_solver import obter_perfil
+from diagnostico import registar_estatisticas
+from datetime import datetime
+import argparse
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PERIODOS = ('anual', 'semestral', 'trimestral')
+# Dias do mês seguinte acrescentados a cada janela como previsão
+DIAS_SOBREPOSICAO = 7
+
+def meses_periodo(ano, periodo, hoje=None):
+    """Lista [(mes, ano)] do período: o ano inteiro, ou o semestre/trimestre de hoje"""
+    mes_atual = (hoje or datetime.now()).month
+    if periodo == 'anual':
+        primeiro, ultimo = 1, 12
+    elif periodo == 'semestral':
+        primeiro = 1 if mes_atual <= 6 else 7
+        ultimo = primeiro + 5
+    elif periodo == 'trimestral':
+        primeiro = (mes_atual - 1) // 3 * 3 + 1
+        ultimo = primeiro + 2
+    else:
+        raise ValueError(f"Período desconhecido: {periodo!r} (use {', '.join(PERIODOS)})")
+    return [(mes, ano) for mes in range(primeiro, ultimo + 1)]
+
+class OtimizadorAnual:
+    def __init__(self, ano, valencia, periodo='anual', callback_progresso=None, perfil_solver=None,
+                 sobreposicao=DIAS_SOBREPOSICAO):
+        self.ano = ano
+        self.valencia = valencia
+        self.periodo = periodo
+        self.meses = meses_periodo(ano, periodo)
+        self.callback_progresso = callback_progresso
+        # Perfil do solver de cada janela (ver perfis_solver); None = o da configuração da valência
+        self.perfil_solver = perfil_solver
+        # Parâmetros que se sobrepõem aos do perfil
+        self.parametros_solver = {}
+        self.sobreposicao = sobreposicao
+        # Ativar para interromper a geração (a janela em curso fica com a melhor solução encontrada)
+        self.parar = threading.Event()
+        self.estatisticas = {}
+
+    def notificar_progresso(self, fase, **dados):
+        """Informa quem acompanha a geração da fase atual"""
+        if self.callback_progresso:
+            self.callback_progresso(fase, dados)
+
+    def carregar_mes(self, mes, ano):
+        """OtimizadorMensal do mês com os dados carregados (ou None sem funcionários/turnos)"""
+        otimizador = OtimizadorMensal(mes, ano, self.valencia)
+        otimizador.carregar_dados()
+        if not otimizador.funcionarios or not otimizador.turnos:
+            return None
+        # O estado de entrada é dado pela janela anterior, não pelas escalas guardadas
+        otimizador.fronteira = {}
+        return otimizador
+
+    def resolver_janela(self, problema, parametros, dicas):
+        """Resolve uma janela; devolve (escalas, estatisticas do solver)"""
+        estatisticas = {}
+        verificacao = problema.verificar()
+        if not verificacao['viavel']:
+            estatisticas['diagnostico'] = verificacao['motivos']
+            return None, estatisticas
+        escalas = problema.resolver(dicas=dicas, estatisticas=estatisticas, parar=self.parar, **parametros)
+        return escalas or None, estatisticas
+
+    def gerar_escala_periodo(self):
+        """Gera o período mês a mês; devolve {(mes, ano): escalas}, ou None se algum mês falhar"""
+        logger.info("A gerar escala %s de %s para %s (%s meses, janelas de um mês + %s dias)",
+                    self.periodo, self.ano, self.valencia, len(self.meses), self.sobreposicao)
+        inicio = time.perf_counter()
+        with get_app_context():
+            self.perfil_solver, parametros = obter_perfil(self.perfil_solver, self.valencia)
+        parametros.update(self.parametros_solver)
+        self.estatisticas = {'perfil_solver': {'nome': self.perfil_solver, 'parametros': parametros}, 'meses': []}
+
+        resultado = {}
+        atual = self.carregar_mes(*self.meses[0])
+        if atual is not None:
+            # O primeiro mês continua a partir das escalas já guardadas
+            atual.fronteira = atual.carregar_fronteira()
+            # Geração por subequipas (ver decomposicao) se a valência estiver configurada para isso
+            if getattr(atual.config, 'equipas_solver', None) and 'equipas' not in self.parametros_solver:
+                parametros['equipas'] = atual.config.equipas_solver
+        dicas = None
+        for i, (mes, ano) in enumerate(self.meses):
+            if atual is None:
+                logger.error("Sem funcionários ou turnos para %s em %s/%s", self.valencia, mes, ano)
+                return None
+            if self.parar.is_set():
+                logger.info("Geração do período interrompida antes de %s/%s", mes, ano)
+                return None
+            self.notificar_progresso(f'mês {i + 1}/{len(self.meses)}', mes=mes, ano=ano)
+
+            seguinte = self.carregar_mes(*self.meses[i + 1]) if i + 1 < len(self.meses) else None
+            problema = atual.criar_problema()
+            janela = problema
+            if seguinte is not None and self.sobreposicao:
+                janela = problema.com_previsao(seguinte.criar_problema(), self.sobreposicao)
+
+            escalas, estatisticas = self.resolver_janela(janela, parametros, dicas)
+            if escalas is None and janela is not problema and not self.parar.is_set():
+                # A previsão pode ser impossível a partir desta fronteira; o mês sozinho pode não ser
+                logger.warning("Janela %s/%s sem solução com previsão; a resolver só o mês", mes, ano)
+                janela = problema
+                escalas, estatisticas = self.resolver_janela(janela, parametros, dicas)
+
+            self.estatisticas['meses'].append({
+                'mes': mes, 'ano': ano, 'dias': len(problema.dias), 'dias_previsao': janela.dias_previsao,
+                'fronteira': len(problema.fronteira), 'variaveis': estatisticas.get('variaveis'),
+                'status': estatisticas.get('status'), 'objetivo': estatisticas.get('objetivo'),
+                'tempo_resolucao': estatisticas.get('tempo_resolucao'), 'diagnostico': estatisticas.get('diagnostico')
+            })
+            if escalas is None:
+                logger.error("Falha ao gerar a escala de %s/%s", mes, ano)
+                self.registar_estatisticas(inicio)
+                return None
+
+            # Só o mês fica decidido; a previsão orienta a janela seguinte
+            dias_mes = set(problema.dias)
+            resultado[mes, ano] = [e for e in escalas if e['data'] in dias_mes]
+            logger.info("Mês %s/%s: %s escalas", mes, ano, len(resultado[mes, ano]))
+            if seguinte is not None:
+                primeiro_dia, _ = seguinte.limites_mes()
+                seguinte.fronteira = estado_fronteira(
+                    ((e['funcionario_id'], e['data'], e['turno_id']) for e in resultado[mes, ano]), primeiro_dia
+                )
+                dicas = {(e['funcionario_id'], e['data'], e['turno_id']) for e in escalas if e['data'] not in dias_mes}
+            atual = seguinte
+
+        self.registar_estatisticas(inicio)
+        return resultado
+
+    def registar_estatisticas(self, inicio):
+        """Escreve no log as estatísticas do período, com uma linha por mês"""
+        self.estatisticas['tempo_total'] = time.perf_counter() - inicio
+        registar_estatisticas(logger, f"Estatísticas {self.valencia} {self.periodo} {self.ano}:", self.estatisticas)
+
+    def salvar_escala_otimizada(self, resultado):
+        """Grava cada mês por diferenças; devolve {(mes, ano): resumo} ou None se algum mês falhar"""
+        if not resultado:
+            logger.error("Nenhuma escala para salvar!")
+            return None
+        resumos = {}
+        for (mes, ano), escalas in resultado.items():
+            resumos[mes, ano] = OtimizadorMensal(mes, ano, self.valencia).salvar_escala_otimizada(escalas)
+            if resumos[mes, ano] is None:
+                return None
+        return resumos
+
+def gerar_escala_periodo_otimizada(ano, valencia, periodo, perfil_solver=None):
+    """Gera e grava a escala do período ('anual', 'semestral' ou 'trimestral')"""
+    otimizador = OtimizadorAnual(ano, valencia, periodo, perfil_solver=perfil_solver)
+    resultado = otimizador.gerar_escala_periodo()
+
+    if resultado:
+        if otimizador.salvar_escala_otimizada(resultado):
+            logger.info("Escala %s otimizada gerada com sucesso!", periodo)
+            return True
+        logger.error("Erro ao salvar escala %s otimizada!", periodo)
+        return False
+    logger.error("Falha ao gerar escala %s!", periodo)
+    return False
+
+def gerar_escala_anual_otimizada(ano, valencia):
+    """Gera uma escala anual otimizada"""
+    return gerar_escala_periodo_otimizada(ano, valencia, 'anual')
+
+def gerar_escala_semestral_otimizada(ano, valencia):
+    """Gera uma escala semestral otimizada"""
+    return gerar_escala_periodo_otimizada(ano, valencia, 'semestral')
+
+def gerar_escala_trimestral_otimizada(ano, valencia):
+    """Gera uma escala trimestral otimizada"""
+    return gerar_escala_periodo_otimizada(ano, valencia, 'trimestral')
+
+def main():
+    parser = argparse.ArgumentParser(description="Geração de escalas de um ano, semestre ou trimestre")
+    parser.add_argument('--ano', type=int, default=datetime.now().year)
+    parser.add_argument('--valencia', required=True)
+    parser.add_argument('--periodo', choices=PERIODOS, default='anual',
+                        help="Semestre e trimestre são os do mês atual")
+    parser.add_argument('--perfil', help="Perfil do solver (por omissão, o da configuração da valência)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app import app
+    from migracoes import aplicar_colunas
+    with app.app_context():
+        aplicar_colunas()
+        return 0 if gerar_escala_periodo_otimizada(args.ano, args.valencia, args.periodo, args.perfil) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
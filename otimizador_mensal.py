@@ -1,12 +1,25 @@
 from models import db, Escala, Funcionario, Turno, Configuracao, Restricao
 from datetime import datetime, timedelta
-from escalonador import gerar_escala_ortools
+from escalonador import gerar_escala_ortools, diagnosticar_inviabilidade, estado_fronteira, resumo_turnos, MAX_DIAS_CONSECUTIVOS
+from viabilidade import verificar_viabilidade
+from folgas import analisar_folgas
+from diagnostico import Diagnostico, registar_estatisticas
+from problema import Problema, FuncionarioProblema, TurnoProblema
+from cache_solucoes import impressao_digital, obter_solucao, guardar_solucao, estatisticas_cache
+from perfis_solver import obter_perfil
 from ortools.sat.python import cp_model
+from sqlalchemy import bindparam
+import heapq
 import json
+import logging
+import numpy as np
 import random
-from collections import defaultdict
+import threading
+from functools import lru_cache
 from flask import current_app
 
+logger = logging.getLogger(__name__)
+
 def get_app_context():
     """Obtém o contexto da aplicação Flask"""
     try:
@@ -16,8 +29,69 @@ def get_app_context():
         from app import app
         return app.app_context()
 
+# Sequências de turnos proibidas em dias consecutivos (turno de ontem, turno de hoje)
+SEQUENCIAS_PROIBIDAS = [
+    ('N', 'M'), ('M', 'T'), ('I', 'T'), ('I', 'N'), ('T', 'N'),
+]
+
+def construir_disponibilidade(funcionario_ids, dias, intervalos):
+    """Matriz booleana funcionários × dias (True = disponível) a partir de intervalos de restrição.
+
+    intervalos: iterável de (funcionario_id, data_inicio, data_fim); cada intervalo é
+    aplicado como uma fatia sobre o calendário (somas acumuladas de +1/-1), e no fim
+    só ficam as colunas dos dias de funcionamento.
+    """
+    disponibilidade = np.ones((len(funcionario_ids), len(dias)), dtype=bool)
+    if not dias:
+        return disponibilidade
+    
+    indice = {funcionario_id: i for i, funcionario_id in enumerate(funcionario_ids)}
+    linhas = [(indice[f_id], inicio, fim) for f_id, inicio, fim in intervalos if f_id in indice]
+    if not linhas:
+        return disponibilidade
+    
+    base = np.datetime64(dias[0], 'D')
+    n_calendario = int((np.datetime64(dias[-1], 'D') - base).astype(int)) + 1
+    i, inicio, fim = (np.array(coluna) for coluna in zip(*linhas))
+    a = np.clip((inicio.astype('datetime64[D]') - base).astype(int), 0, n_calendario)
+    b = np.clip((fim.astype('datetime64[D]') - base).astype(int) + 1, 0, n_calendario)
+    validos = a < b
+    
+    delta = np.zeros((len(funcionario_ids), n_calendario + 1), dtype=np.int32)
+    np.add.at(delta, (i[validos], a[validos]), 1)
+    np.add.at(delta, (i[validos], b[validos]), -1)
+    em_restricao = np.cumsum(delta, axis=1)[:, :n_calendario] > 0
+    
+    colunas = (np.array(dias, dtype='datetime64[D]') - base).astype(int)
+    return ~em_restricao[:, colunas]
+
+@lru_cache(maxsize=32)
+def expandir_ciclo_rodizio(padrao_rodizio):
+    """Expande o padrão de rodízio (JSON) num array com uma posição por dia do ciclo (True = folga)"""
+    padrao = json.loads(padrao_rodizio)
+    ciclo = np.repeat(
+        np.array([periodo['tipo'] == 'folga' for periodo in padrao], dtype=bool),
+        [max(int(periodo['dias']), 0) for periodo in padrao]
+    )
+    ciclo.setflags(write=False)
+    return ciclo
+
+@lru_cache(maxsize=64)
+def mascara_rodizio(data_inicio_rodizio, padrao_rodizio, offsets, dias):
+    """Folgas do rodízio funcionários × dias (True = folga), guardadas em cache por configuração e horizonte.
+
+    offsets: tuplo com o desfasamento de cada funcionário no ciclo; dias: tuplo de datas.
+    A posição no ciclo é (dias desde o início + offset) % comprimento do ciclo.
+    """
+    ciclo = expandir_ciclo_rodizio(padrao_rodizio)
+    desde_inicio = (np.array(dias, dtype='datetime64[D]') - np.datetime64(data_inicio_rodizio, 'D')).astype(int)
+    posicoes = (desde_inicio[np.newaxis, :] + np.array(offsets, dtype=int)[:, np.newaxis]) % len(ciclo)
+    mascara = ciclo[posicoes]
+    mascara.setflags(write=False)
+    return mascara
+
 class OtimizadorMensal:
-    def __init__(self, mes, ano, valencia):
+    def __init__(self, mes, ano, valencia, callback_progresso=None, arranque_quente=None, usar_cache=True, perfil_solver=None):
         self.mes = mes
         self.ano = ano
         self.valencia = valencia
@@ -25,13 +99,85 @@ class OtimizadorMensal:
         self.turnos = []
         self.config = None
         self.dias = []
-        self.restricoes = {}
+        # Disponibilidade funcionários × dias (True = disponível), pela ordem de self.funcionarios e self.dias
+        self.disponibilidade = np.ones((0, 0), dtype=bool)
         self.perfil_ideal = None
+        self.callback_progresso = callback_progresso
+        # Estado à entrada do mês (ver estado_fronteira); None = ler das escalas guardadas do mês anterior
+        self.fronteira = None
+        # Arranque a quente: None, 'atual' (escalas já guardadas do mês) ou 'anterior' (mês anterior deslocado)
+        self.arranque_quente = arranque_quente
+        # Perfil do solver (ver perfis_solver); None = o da configuração da valência
+        self.perfil_solver = perfil_solver
+        # Parâmetros que se sobrepõem aos do perfil (ex: threads atribuídas pelo pool)
+        self.parametros_solver = {}
+        # Reutilizar a solução guardada quando os dados de entrada não mudaram
+        self.usar_cache = usar_cache
+        # Escala heurística: ponto de partida do solver e alternativa (parcial) quando este não devolve escala
+        self.usar_heuristica = True
+        # Escala parcial da heurística quando o solver falha; só é gravada por salvar_alternativa
+        self.alternativa = None
+        # Ativar para interromper a procura em curso (ex: cancelamento da tarefa)
+        self.parar = threading.Event()
+        self.estatisticas = {}
+        # Diagnósticos detalhados, só calculados com o logger em DEBUG
+        self.diagnostico = Diagnostico(logger)
+        
+    def notificar_progresso(self, fase, **dados):
+        """Informa quem acompanha a geração (ex: tarefas em segundo plano) da fase atual"""
+        if self.callback_progresso:
+            self.callback_progresso(fase, dados)
+        
+    @property
+    def restricoes(self):
+        """Vista {funcionario_id: set(dias_folga)} da matriz de disponibilidade (só leitura)"""
+        return {
+            funcionario.id: {self.dias[d] for d in np.flatnonzero(~self.disponibilidade[i])}
+            for i, funcionario in enumerate(self.funcionarios)
+            if not self.disponibilidade[i].all()
+        }
+    
+    def dias_de_folga(self, i):
+        """Dias de folga/restrição (ordenados) do funcionário na posição i"""
+        return [self.dias[d] for d in np.flatnonzero(~self.disponibilidade[i]).tolist()]
+    
+    def limites_mes(self):
+        """Devolve o primeiro e o último dia do mês (datetime.date)"""
+        data_inicio = datetime(self.ano, self.mes, 1).date()
+        if self.mes == 12:
+            data_fim = datetime(self.ano + 1, 1, 1).date() - timedelta(days=1)
+        else:
+            data_fim = datetime(self.ano, self.mes + 1, 1).date() - timedelta(days=1)
+        return data_inicio, data_fim
         
+    def consulta_funcionarios(self):
+        """Consulta dos funcionários ativos da valência"""
+        return Funcionario.query.filter_by(valencia=self.valencia, ativo=True)
+
+    def consulta_restricoes(self, data_inicio, data_fim):
+        """Consulta (funcionario_id, data_inicio, data_fim) das restrições da valência que tocam o período"""
+        return db.session.query(Restricao.funcionario_id, Restricao.data_inicio, Restricao.data_fim).join(Funcionario).filter(
+            Funcionario.valencia == self.valencia,
+            Restricao.data_fim >= data_inicio,
+            Restricao.data_inicio <= data_fim,
+        )
+
+    def consulta_escalas(self, data_inicio, data_fim, *colunas):
+        """Consulta das escalas guardadas da valência entre data_inicio e data_fim (inclusive).
+
+        Por omissão devolve (funcionario_id, data, turno_id); colunas escolhe outras.
+        """
+        colunas = colunas or (Escala.funcionario_id, Escala.data, Escala.turno_id)
+        return db.session.query(*colunas).filter(
+            Escala.valencia == self.valencia,
+            Escala.data >= data_inicio,
+            Escala.data <= data_fim
+        )
+
     def carregar_dados(self):
         """Carrega todos os dados necessários"""
         with get_app_context():
-            self.funcionarios = Funcionario.query.filter_by(valencia=self.valencia, ativo=True).all()
+            self.funcionarios = self.consulta_funcionarios().all()
             self.turnos = Turno.query.filter_by(valencia=self.valencia).all()
             self.config = Configuracao.query.filter_by(valencia=self.valencia).first()
             
@@ -45,28 +191,12 @@ class OtimizadorMensal:
             # Filtrar apenas dias de funcionamento
             self.dias = self.filtrar_dias_funcionamento(data_inicio, data_fim)
             
-            # Carregar restrições cadastradas no banco
-            restricoes_db = (
-                db.session.query(Restricao)
-                .join(Funcionario)
-                .filter(
-                    Funcionario.valencia == self.valencia,
-                    Restricao.data_fim >= data_inicio.date(),
-                    Restricao.data_inicio <= data_fim.date(),
-                )
-                .all()
+            # Carregar restrições cadastradas no banco e aplicá-las como intervalos na matriz
+            intervalos = self.consulta_restricoes(data_inicio.date(), data_fim.date()).all()
+            self.disponibilidade = construir_disponibilidade(
+                [f.id for f in self.funcionarios], self.dias, intervalos
             )
 
-            self.restricoes = defaultdict(set)
-            for r in restricoes_db:
-                inicio = max(r.data_inicio, data_inicio.date())
-                fim = min(r.data_fim, data_fim.date())
-                dia_atual = inicio
-                while dia_atual <= fim:
-                    if dia_atual in self.dias:
-                        self.restricoes[r.funcionario_id].add(dia_atual)
-                    dia_atual += timedelta(days=1)
-
             # Aplicar rodízio automático se configurado
             if self.config and self.config.ativar_rodizio:
                 self.aplicar_rodizio_automatico()
@@ -83,9 +213,6 @@ class OtimizadorMensal:
                         self.perfil_ideal[nome_para_id[nome]] = contagem
             except Exception as e:
                 self.perfil_ideal = None
-    
-            # Converter defaultdict para dict simples
-            self.restricoes = {k: v for k, v in self.restricoes.items()}
             
     def filtrar_dias_funcionamento(self, data_inicio, data_fim):
         """Filtra apenas os dias de funcionamento baseado na configuração"""
@@ -94,7 +221,7 @@ class OtimizadorMensal:
         if self.config and self.config.dias_funcionamento:
             try:
                 dias_config = json.loads(self.config.dias_funcionamento)
-                print(f"Dias de funcionamento configurados: {dias_config}")
+                logger.debug("Dias de funcionamento configurados: %s", dias_config)
                 
                 # Mapear dias da semana
                 dias_semana = {
@@ -107,7 +234,7 @@ class OtimizadorMensal:
                     if dia in dias_semana:
                         dias_habilitados.add(dias_semana[dia])
                 
-                print(f"Dias habilitados (0=Segunda, 6=Domingo): {dias_habilitados}")
+                logger.debug("Dias habilitados (0=Segunda, 6=Domingo): %s", dias_habilitados)
                 
                 # Filtrar apenas dias de funcionamento
                 data_atual = data_inicio
@@ -116,10 +243,10 @@ class OtimizadorMensal:
                         dias_funcionamento.append(data_atual.date())
                     data_atual += timedelta(days=1)
                 
-                print(f"Total de dias de funcionamento no mês: {len(dias_funcionamento)}")
+                logger.debug("Total de dias de funcionamento no mês: %s", len(dias_funcionamento))
                 
             except Exception as e:
-                print(f"Erro ao filtrar dias de funcionamento: {e}")
+                logger.error("Erro ao filtrar dias de funcionamento: %s", e)
                 # Se houver erro, incluir todos os dias
                 data_atual = data_inicio
                 while data_atual <= data_fim:
@@ -127,7 +254,7 @@ class OtimizadorMensal:
                     data_atual += timedelta(days=1)
         else:
             # Se não há configuração, incluir todos os dias
-            print("⚠️  Nenhuma configuração de dias de funcionamento encontrada. Incluindo todos os dias.")
+            logger.warning("Nenhuma configuração de dias de funcionamento encontrada. Incluindo todos os dias.")
             data_atual = data_inicio
             while data_atual <= data_fim:
                 dias_funcionamento.append(data_atual.date())
@@ -135,278 +262,193 @@ class OtimizadorMensal:
         
         return dias_funcionamento
     
+    def carregar_fronteira(self):
+        """Estado de cada funcionário à entrada do mês, a partir das escalas guardadas dos últimos dias do mês anterior"""
+        data_inicio, _ = self.limites_mes()
+        with get_app_context():
+            linhas = self.consulta_escalas(
+                data_inicio - timedelta(days=MAX_DIAS_CONSECUTIVOS), data_inicio - timedelta(days=1)
+            ).all()
+        return estado_fronteira(linhas, data_inicio)
+
+    def carregar_dicas(self):
+        """Carrega a escala de partida para o arranque a quente do solver.
+
+        'atual' reutiliza as escalas guardadas deste mês; 'anterior' reutiliza as do
+        mês anterior deslocadas por um múltiplo do ciclo de rodízio (ou da semana),
+        para que as folgas de cada funcionário continuem alinhadas.
+        Devolve um set {(funcionario_id, dia, turno_id)} com datas deste mês.
+        """
+        if self.arranque_quente not in ('atual', 'anterior') or not self.dias:
+            return None
+
+        data_inicio, data_fim = self.limites_mes()
+
+        deslocamento = timedelta(days=0)
+        if self.arranque_quente == 'anterior':
+            fim_anterior = data_inicio - timedelta(days=1)
+            dias_anterior = fim_anterior.day
+            ciclo = 7
+            if self.config and getattr(self.config, 'ativar_rodizio', False) and self.config.padrao_rodizio:
+                try:
+                    ciclo = len(expandir_ciclo_rodizio(self.config.padrao_rodizio)) or 7
+                except Exception:
+                    ciclo = 7
+            if ciclo > dias_anterior:
+                ciclo = 7
+            deslocamento = timedelta(days=ciclo * (dias_anterior // ciclo))
+            data_inicio, data_fim = data_inicio - deslocamento, fim_anterior
+
+        with get_app_context():
+            linhas = self.consulta_escalas(data_inicio, data_fim).all()
+
+        dias_validos = set(self.dias)
+        dicas = set()
+        for funcionario_id, data, turno_id in linhas:
+            dia = data + deslocamento
+            if dia in dias_validos:
+                dicas.add((funcionario_id, dia, turno_id))
+
+        logger.info("Arranque a quente (%s): %s atribuições sugeridas", self.arranque_quente, len(dicas))
+        return dicas
+
     def aplicar_rodizio_automatico(self):
         """Aplica rodízio automático criando restrições de folga"""
         if not self.config.ativar_rodizio or not self.config.data_inicio_rodizio or not self.config.padrao_rodizio:
-            print("❌ Rodízio não configurado ou dados incompletos")
+            logger.warning("Rodízio não configurado ou dados incompletos")
             return
         
         try:
             padrao_personalizado = json.loads(self.config.padrao_rodizio)
+            ciclo = expandir_ciclo_rodizio(self.config.padrao_rodizio)
         except Exception as e:
-            print(f"❌ Erro ao carregar padrão de rodízio: {e}")
+            logger.error("Erro ao carregar padrão de rodízio: %s", e)
             return
         
-        print(f"✅ Aplicando rodízio automático...")
-        print(f"Padrão: {padrao_personalizado}")
+        if not len(ciclo):
+            logger.error("Padrão de rodízio sem dias")
+            return
         
-        # Calcular ciclo total
-        ciclo_total = sum(periodo['dias'] for periodo in padrao_personalizado)
-        print(f"Ciclo total: {ciclo_total} dias")
+        logger.debug("Rodízio: padrão %s, ciclo de %s dias", padrao_personalizado, len(ciclo))
         
-        # Aplicar padrão personalizado para todos os funcionários
-        funcionarios_com_rodizio = 0
-        for funcionario in self.funcionarios:
-            # Calcular offset baseado no ID do funcionário para distribuir o início do ciclo
-            offset_funcionario = funcionario.id % len(self.funcionarios)
-            
-            folgas_funcionario = []
-            for dia in self.dias:  # Usar apenas dias de funcionamento
-                # Calcular posição no ciclo personalizado
-                dias_desde_inicio = (dia - self.config.data_inicio_rodizio).days
-                posicao_ciclo = (dias_desde_inicio + offset_funcionario) % ciclo_total
-                
-                # Determinar se está em período de folga
-                posicao_acumulada = 0
-                em_folga = False
-                
-                for periodo in padrao_personalizado:
-                    if posicao_ciclo < posicao_acumulada + periodo['dias']:
-                        em_folga = (periodo['tipo'] == 'folga')
-                        break
-                    posicao_acumulada += periodo['dias']
-                
-                # Se está em folga, adicionar à restrição
-                if em_folga:
-                    if funcionario.id not in self.restricoes:
-                        self.restricoes[funcionario.id] = set()
-                    self.restricoes[funcionario.id].add(dia)
-                    folgas_funcionario.append(dia)
-            
-            if folgas_funcionario:
-                funcionarios_com_rodizio += 1
-                print(f"  {funcionario.nome}: {len(folgas_funcionario)} folgas aplicadas")
-                
-                # Verificar se as folgas estão em pares
-                folgas_ordenadas = sorted(folgas_funcionario)
-                pares_folgas = []
-                folgas_isoladas = []
-                
-                i = 0
-                while i < len(folgas_ordenadas):
-                    if i + 1 < len(folgas_ordenadas):
-                        # Verificar se são dias consecutivos
-                        if (folgas_ordenadas[i+1] - folgas_ordenadas[i]).days == 1:
-                            pares_folgas.append((folgas_ordenadas[i], folgas_ordenadas[i+1]))
-                            i += 2  # Pular o próximo dia
-                        else:
-                            folgas_isoladas.append(folgas_ordenadas[i])
-                            i += 1
-                    else:
-                        folgas_isoladas.append(folgas_ordenadas[i])
-                        i += 1
-                
-                print(f"    Pares de folgas: {len(pares_folgas)}")
-                for par in pares_folgas:
-                    print(f"      {par[0].strftime('%d/%m')} - {par[1].strftime('%d/%m')}")
-                
-                if folgas_isoladas:
-                    print(f"    ⚠️  Folgas isoladas: {len(folgas_isoladas)}")
-                    for folga in folgas_isoladas:
-                        print(f"      {folga.strftime('%d/%m')}")
-                else:
-                    print(f"    ✅ Todas as folgas estão em pares!")
+        # Offset baseado no ID do funcionário para distribuir o início do ciclo
+        offsets = tuple(funcionario.id % len(self.funcionarios) for funcionario in self.funcionarios)
+        folgas_rodizio = mascara_rodizio(
+            self.config.data_inicio_rodizio, self.config.padrao_rodizio, offsets, tuple(self.dias)
+        )
+        self.disponibilidade &= ~folgas_rodizio
         
-        print(f"✅ Rodízio aplicado para {funcionarios_com_rodizio}/{len(self.funcionarios)} funcionários")
+        funcionarios_com_rodizio = int(folgas_rodizio.any(axis=1).sum())
+        logger.info("Rodízio aplicado para %s/%s funcionários", funcionarios_com_rodizio, len(self.funcionarios))
+        self.diagnostico.registar('rodizio', lambda: self.resumo_pares_folgas(folgas_rodizio, listar_pares=True))
         
         # Verificar se há funcionários suficientes para preencher todos os turnos
         self.verificar_e_ajustar_viabilidade()
     
     def verificar_e_ajustar_viabilidade(self):
-        """Verifica se há funcionários suficientes e ajusta folgas se necessário"""
-        # Calcular quantos funcionários precisamos por dia
-        funcionarios_por_dia = {}
-        for dia in self.dias:
-            funcionarios_por_dia[dia] = sum(turno.funcionarios_necessarios for turno in self.turnos)
-        
-        # Calcular total de funcionários necessários no mês
-        total_turnos_necessarios = sum(funcionarios_por_dia.values())
+        """Verifica, dia a dia, se há funcionários suficientes e ajusta folgas se necessário"""
+        funcionarios_dict, _, turnos_necessarios_por_dia = self.preparar_dados_solver()
+        verificacao = verificar_viabilidade(funcionarios_dict, self.dias, self.disponibilidade, turnos_necessarios_por_dia)
         
-        # Calcular funcionários disponíveis
-        total_funcionarios_disponiveis = 0
-        for funcionario in self.funcionarios:
-            folgas_funcionario = len(self.restricoes.get(funcionario.id, set()))
-            dias_disponiveis = len(self.dias) - folgas_funcionario
-            total_funcionarios_disponiveis += dias_disponiveis
-        
-        print(f"Total turnos necessários: {total_turnos_necessarios}")
-        print(f"Total funcionários disponíveis: {total_funcionarios_disponiveis}")
-        
-        if total_funcionarios_disponiveis < total_turnos_necessarios:
-            print(f"⚠️  AVISO: Pode não ser possível preencher todos os turnos!")
-            print(f"   Necessários: {total_turnos_necessarios}")
-            print(f"   Disponíveis: {total_funcionarios_disponiveis}")
-            print(f"   Diferença: {total_turnos_necessarios - total_funcionarios_disponiveis}")
+        if verificacao['dias_em_falta']:
+            logger.warning("Faltam funcionários em %s dias; a ajustar folgas para garantir preenchimento",
+                           len(verificacao['dias_em_falta']))
             
             # Se não há funcionários suficientes, reduzir as folgas para garantir preenchimento
-            print("🔄 Ajustando folgas para garantir preenchimento dos turnos...")
+            funcionarios_por_dia = {dia: sum(necessarios) for dia, necessarios in turnos_necessarios_por_dia.items()}
             self.ajustar_folgas_para_preenchimento(funcionarios_por_dia)
     
     def ajustar_folgas_para_preenchimento(self, funcionarios_por_dia):
         """Ajusta as folgas para garantir que haja funcionários suficientes para preencher todos os turnos"""
-        print("🔄 Iniciando ajuste de folgas para garantir preenchimento...")
-        
         # Calcular quantos dias de folga cada funcionário tem
-        folgas_por_funcionario = {}
-        for funcionario in self.funcionarios:
-            folgas_por_funcionario[funcionario.id] = len(self.restricoes.get(funcionario.id, set()))
-        
-        # Mostrar folgas antes do ajuste
-        print("Folgas antes do ajuste:")
-        for funcionario in self.funcionarios:
-            folgas_funcionario = sorted(self.restricoes.get(funcionario.id, set()))
-            if folgas_funcionario:
-                print(f"  {funcionario.nome}: {len(folgas_funcionario)} folgas")
-                # Verificar pares
-                pares = []
-                folgas_isoladas = []
-                i = 0
-                while i < len(folgas_funcionario):
-                    if i + 1 < len(folgas_funcionario):
-                        if (folgas_funcionario[i+1] - folgas_funcionario[i]).days == 1:
-                            pares.append((folgas_funcionario[i], folgas_funcionario[i+1]))
-                            i += 2
-                        else:
-                            folgas_isoladas.append(folgas_funcionario[i])
-                            i += 1
-                    else:
-                        folgas_isoladas.append(folgas_funcionario[i])
-                        i += 1
-                
-                if folgas_isoladas:
-                    print(f"    ⚠️  Folgas isoladas: {len(folgas_isoladas)}")
-                else:
-                    print(f"    ✅ Todas em pares: {len(pares)} pares")
+        folgas_por_funcionario = (~self.disponibilidade).sum(axis=1)
         
-        # Para cada dia, verificar se há funcionários suficientes
-        folgas_removidas = 0
-        for dia in self.dias:
-            funcionarios_disponiveis = 0
-            for funcionario in self.funcionarios:
-                if dia not in self.restricoes.get(funcionario.id, set()):
-                    funcionarios_disponiveis += 1
+        self.diagnostico.registar('folgas_antes_ajuste', self.resumo_pares_folgas)
+        
+        # Défice de cada dia; remover folgas num dia não altera o défice dos outros
+        necessarios_por_dia = np.array([funcionarios_por_dia[dia] for dia in self.dias], dtype=int)
+        disponiveis_por_dia = self.disponibilidade.sum(axis=0)
+        deficit = necessarios_por_dia - disponiveis_por_dia
+        # Dias (de funcionamento) seguidos no calendário, para saber se uma folga faz par com a vizinha
+        ordinais = np.array([dia.toordinal() for dia in self.dias], dtype=np.int64)
+        seguido_anterior = np.diff(ordinais, prepend=ordinais[0] - 2 if len(ordinais) else 0) == 1
+        
+        folgas_removidas = []
+        for d in np.flatnonzero(deficit > 0):
+            dia = self.dias[d]
             
-            necessarios = funcionarios_por_dia[dia]
+            # Funcionários com folga neste dia, e se essa folga faz par com a do dia anterior ou seguinte
+            com_folga = ~self.disponibilidade[:, d]
+            em_par = np.zeros(len(self.funcionarios), dtype=bool)
+            if d > 0 and seguido_anterior[d]:
+                em_par |= ~self.disponibilidade[:, d-1]
+            if d < len(self.dias) - 1 and seguido_anterior[d+1]:
+                em_par |= ~self.disponibilidade[:, d+1]
             
-            # Se não há funcionários suficientes, remover algumas folgas
-            if funcionarios_disponiveis < necessarios:
-                print(f"  Dia {dia}: {funcionarios_disponiveis}/{necessarios} funcionários")
-                
-                # Encontrar funcionários com folga neste dia
-                funcionarios_com_folga = []
-                for funcionario in self.funcionarios:
-                    if dia in self.restricoes.get(funcionario.id, set()):
-                        # Calcular se esta folga faz parte de um par
-                        folgas_funcionario = sorted(self.restricoes.get(funcionario.id, set()))
-                        folga_isolada = True
-                        
-                        # Verificar se esta folga faz parte de um par
-                        idx = folgas_funcionario.index(dia)
-                        if idx > 0 and (dia - folgas_funcionario[idx-1]).days == 1:
-                            folga_isolada = False
-                        elif idx < len(folgas_funcionario) - 1 and (folgas_funcionario[idx+1] - dia).days == 1:
-                            folga_isolada = False
-                        
-                        funcionarios_com_folga.append((funcionario, folgas_por_funcionario[funcionario.id], folga_isolada))
-                
-                # Ordenar: primeiro folgas isoladas, depois por quem tem mais folgas
-                funcionarios_com_folga.sort(key=lambda x: (not x[2], -x[1]))
-                
-                # Remover folgas até ter funcionários suficientes
-                folgas_para_remover = necessarios - funcionarios_disponiveis
-                funcionarios_para_remover_folga = funcionarios_com_folga[:folgas_para_remover]
-                
-                for funcionario, _, folga_isolada in funcionarios_para_remover_folga:
-                    if funcionario.id in self.restricoes:
-                        self.restricoes[funcionario.id].discard(dia)
-                        folgas_por_funcionario[funcionario.id] -= 1
-                        folgas_removidas += 1
-                        tipo_folga = "isolada" if folga_isolada else "em par"
-                        print(f"    Removida folga {tipo_folga} de {funcionario.nome} no dia {dia}")
-        
-        print(f"Total de folgas removidas: {folgas_removidas}")
-        
-        # Mostrar folgas após o ajuste
-        print("Folgas após o ajuste:")
-        for funcionario in self.funcionarios:
-            folgas_funcionario = sorted(self.restricoes.get(funcionario.id, set()))
-            if folgas_funcionario:
-                print(f"  {funcionario.nome}: {len(folgas_funcionario)} folgas")
-                # Verificar pares
-                pares = []
-                folgas_isoladas = []
-                i = 0
-                while i < len(folgas_funcionario):
-                    if i + 1 < len(folgas_funcionario):
-                        if (folgas_funcionario[i+1] - folgas_funcionario[i]).days == 1:
-                            pares.append((folgas_funcionario[i], folgas_funcionario[i+1]))
-                            i += 2
-                        else:
-                            folgas_isoladas.append(folgas_funcionario[i])
-                            i += 1
-                    else:
-                        folgas_isoladas.append(folgas_funcionario[i])
-                        i += 1
-                
-                if folgas_isoladas:
-                    print(f"    ⚠️  Folgas isoladas: {len(folgas_isoladas)}")
-                    for folga in folgas_isoladas:
-                        print(f"      {folga.strftime('%d/%m')}")
-                else:
-                    print(f"    ✅ Todas em pares: {len(pares)} pares")
-        
-        # Recalcular estatísticas
-        total_funcionarios_disponiveis = 0
-        for funcionario in self.funcionarios:
-            folgas_funcionario = len(self.restricoes.get(funcionario.id, set()))
-            dias_disponiveis = len(self.dias) - folgas_funcionario
-            total_funcionarios_disponiveis += dias_disponiveis
-        
-        print(f"✅ Após ajuste: {total_funcionarios_disponiveis} funcionários disponíveis")
+            # Prioridade: primeiro folgas isoladas, depois quem tem mais folgas (empate: ordem dos funcionários)
+            indices = np.flatnonzero(com_folga)
+            candidatos = list(zip(em_par[indices].tolist(), (-folgas_por_funcionario[indices]).tolist(), indices.tolist()))
+            heapq.heapify(candidatos)
+            
+            # Remover folgas até ter funcionários suficientes
+            for _ in range(min(int(deficit[d]), len(candidatos))):
+                folga_em_par, _, f = heapq.heappop(candidatos)
+                self.disponibilidade[f, d] = True
+                folgas_por_funcionario[f] -= 1
+                folgas_removidas.append((f, dia, folga_em_par))
+        
+        self.estatisticas['folgas_removidas'] = len(folgas_removidas)
+        self.diagnostico.registar('folgas_removidas', lambda: [
+            {'funcionario': self.funcionarios[f].nome, 'dia': dia.strftime('%d/%m'),
+             'tipo': 'em par' if folga_em_par else 'isolada'}
+            for f, dia, folga_em_par in folgas_removidas
+        ])
+        self.diagnostico.registar('folgas_apos_ajuste', self.resumo_pares_folgas)
         
         # Verificar se agora há funcionários suficientes
+        total_funcionarios_disponiveis = int(self.disponibilidade.sum())
         total_turnos_necessarios = sum(funcionarios_por_dia.values())
-        if total_funcionarios_disponiveis >= total_turnos_necessarios:
-            print("✅ Agora há funcionários suficientes para preencher todos os turnos!")
-        else:
-            print("❌ Ainda não há funcionários suficientes!")
+        logger.info("Ajuste de folgas: %s removidas, %s/%s dias-funcionário disponíveis",
+                    len(folgas_removidas), total_funcionarios_disponiveis, total_turnos_necessarios)
+        if total_funcionarios_disponiveis < total_turnos_necessarios:
+            logger.warning("Ainda não há funcionários suficientes!")
+    
+    def resumo_pares_folgas(self, folgas=None, listar_pares=False):
+        """{nome: {'folgas', 'pares', 'isoladas'}} para cada funcionário com folgas (por omissão, as da matriz)"""
+        if folgas is None:
+            folgas = ~self.disponibilidade
+        resumo = {}
+        for f, funcionario in enumerate(self.funcionarios):
+            folgas_funcionario = [self.dias[d] for d in np.flatnonzero(folgas[f]).tolist()]
+            if not folgas_funcionario:
+                continue
+            pares, isoladas = analisar_folgas(folgas_funcionario)
+            resumo[funcionario.nome] = {
+                'folgas': len(folgas_funcionario),
+                'pares': [[a.strftime('%d/%m'), b.strftime('%d/%m')] for a, b in pares] if listar_pares else len(pares),
+                'isoladas': [folga.strftime('%d/%m') for folga in isoladas]
+            }
+        return resumo
     
     def gerar_escala_mensal_completa(self):
         """Gera a escala para o mês inteiro de uma só vez"""
-        print(f"=== GERANDO ESCALA MENSAL COMPLETA ===")
-        print(f"Mês/Ano: {self.mes}/{self.ano}")
-        print(f"Valência: {self.valencia}")
+        logger.info("A gerar escala mensal completa de %s/%s para %s", self.mes, self.ano, self.valencia)
         
         # Carregar dados
+        self.notificar_progresso('a carregar dados')
         self.carregar_dados()
         
-        # Logs detalhados para diagnóstico
-        print(f"DEBUG: Funcionários encontrados: {len(self.funcionarios)}")
-        print(f"DEBUG: Turnos encontrados: {len(self.turnos)}")
-        print(f"DEBUG: Configuração encontrada: {self.config is not None}")
-        print(f"DEBUG: Dias de funcionamento: {len(self.dias)}")
-        
         if not self.funcionarios:
-            print("❌ Nenhum funcionário encontrado para esta valência!")
+            logger.error("Nenhum funcionário encontrado para esta valência!")
             return None
         
         if not self.turnos:
-            print("❌ Nenhum turno encontrado para esta valência!")
+            logger.error("Nenhum turno encontrado para esta valência!")
             return None
         
         # Configuração é opcional - se não existir, usar valores padrão
         if not self.config:
-            print("⚠️  Nenhuma configuração encontrada para esta valência. Usando valores padrão.")
+            logger.warning("Nenhuma configuração encontrada para esta valência. Usando valores padrão.")
             # Criar configuração padrão
             from datetime import time
             self.config = type('ConfigPadrao', (), {
@@ -414,15 +456,187 @@ class OtimizadorMensal:
                 'ativar_rodizio': False
             })()
         
-        print(f"Funcionários: {len(self.funcionarios)}")
-        print(f"Turnos: {len(self.turnos)}")
-        print(f"Dias de funcionamento: {len(self.dias)}")
+        # Dimensão do problema e restrições aplicadas
+        self.estatisticas['funcionarios'] = len(self.funcionarios)
+        self.estatisticas['turnos'] = len(self.turnos)
+        self.estatisticas['dias'] = len(self.dias)
+        self.estatisticas['folgas'] = int((~self.disponibilidade).sum())
+        self.diagnostico.registar('dias', lambda: [d.strftime('%d/%m') for d in self.dias])
         
-        # Verificar restrições aplicadas
-        total_restricoes = sum(len(restricoes) for restricoes in self.restricoes.values())
-        print(f"Total de restrições aplicadas: {total_restricoes}")
+        # Parâmetros efetivos do solver, registados para se poder reproduzir a geração
+        with get_app_context():
+            self.perfil_solver, parametros = obter_perfil(self.perfil_solver, self.valencia)
+        # Geração por subequipas (ver decomposicao) se a valência estiver configurada para isso
+        if getattr(self.config, 'equipas_solver', None):
+            parametros['equipas'] = self.config.equipas_solver
+        parametros.update(self.parametros_solver)
+        self.estatisticas['perfil_solver'] = {'nome': self.perfil_solver, 'parametros': parametros}
+        
+        # Fotografia dos dados para o solver (a partir daqui já não é preciso o ORM)
+        problema = self.criar_problema()
+        funcionarios_dict, turnos_dict, turnos_necessarios_por_dia = problema.dados_solver()
+        # Funcionários que chegam ao mês a meio de uma sequência de dias de trabalho
+        self.estatisticas['fronteira'] = len(self.fronteira)
+        
+        # Rejeitar de imediato meses sem solução óbvia, antes de construir o modelo
+        verificacao = problema.verificar()
+        self.estatisticas['pre_verificacao'] = verificacao['viavel']
+        self.estatisticas['tempo_pre_verificacao'] = verificacao['tempo']
+        if not verificacao['viavel']:
+            self.estatisticas['diagnostico'] = verificacao['motivos']
+            logger.error("Falha ao gerar escala mensal: %s", '; '.join(verificacao['motivos']))
+            self.alternativa_heuristica(problema)
+            self.registar_estatisticas()
+            return None
+        
+        # Mesmo problema já resolvido: devolver a solução guardada sem chamar o solver
+        chave = None
+        if self.usar_cache:
+            chave = impressao_digital(
+                funcionarios_dict, turnos_dict, self.dias, self.disponibilidade, turnos_necessarios_por_dia,
+                SEQUENCIAS_PROIBIDAS, self.perfil_ideal, parametros, self.fronteira
+            )
+            with get_app_context():
+                resultado, info = obter_solucao(chave)
+            self.estatisticas['cache'] = dict(estatisticas_cache(), resultado='acerto' if resultado else 'falha')
+            if resultado:
+                logger.info("Escala obtida da cache de soluções (%s escalas)", len(resultado))
+                self.estatisticas['status'] = info['status']
+                if info['objetivo'] is not None:
+                    self.estatisticas['objetivo'] = info['objetivo']
+                self.mostrar_estatisticas_escala(resultado)
+                self.registar_estatisticas()
+                return resultado
+        
+        # Escala de partida para o arranque a quente (se pedido) ou, sem ela, a da heurística
+        dicas = self.carregar_dicas()
+        heuristica = None
+        if dicas is None and self.usar_heuristica:
+            heuristica = self.resolver_heuristica(problema)
+            dicas = {(e['funcionario_id'], e['data'], e['turno_id']) for e in heuristica[0]} or None
+        
+        # Chamar o solver para o mês inteiro
+        self.notificar_progresso('a resolver')
+        resultado = problema.resolver(
+            callback_solucao=lambda info: self.notificar_progresso('a resolver', **info),
+            dicas=dicas,
+            estatisticas=self.estatisticas,
+            diagnostico=self.diagnostico,
+            parar=self.parar,
+            **parametros
+        )
+        
+        if resultado:
+            logger.info("Escala mensal gerada com sucesso: %s escalas", len(resultado))
+            # Soluções de procuras interrompidas não ficam na cache (não são as de uma execução completa)
+            if chave and not self.estatisticas.get('interrompida'):
+                with get_app_context():
+                    guardar_solucao(chave, self.valencia, resultado, self.estatisticas.get('status'),
+                                    self.estatisticas.get('objetivo'))
+            
+            # Mostrar estatísticas finais (o solver já contou os turnos por funcionário)
+            self.mostrar_estatisticas_escala(resultado, self.estatisticas.get('turnos_por_funcionario'))
+        else:
+            logger.error("Falha ao gerar escala mensal!")
+            self.alternativa_heuristica(problema, heuristica)
+        self.registar_estatisticas()
+        return resultado or None
+    
+    def resolver_heuristica(self, problema):
+        """Corre a heurística (ver heuristica.py) e regista as suas estatísticas; devolve (escalas, vagas)"""
+        self.notificar_progresso('heurística')
+        estatisticas = {}
+        escalas, vagas = problema.resolver_heuristica(estatisticas=estatisticas)
+        self.estatisticas['heuristica'] = estatisticas
+        return escalas, vagas
+    
+    def alternativa_heuristica(self, problema, heuristica=None):
+        """Guarda em self.alternativa a escala parcial da heurística quando o solver não devolve escala.
+
+        Não a grava: ver salvar_alternativa. O resumo fica em estatisticas['alternativa']
+        e os turnos que ficaram por preencher em estatisticas['vagas'].
+        """
+        if not self.usar_heuristica:
+            return None
+        escalas, vagas = heuristica or self.resolver_heuristica(problema)
+        if not escalas:
+            return None
+        em_falta = sum(vaga['em_falta'] for vaga in vagas)
+        self.alternativa = escalas
+        self.estatisticas['alternativa'] = {'escalas': len(escalas), 'em_falta': em_falta, 'gravada': False}
+        self.estatisticas['vagas'] = vagas
+        logger.warning("Escala heurística parcial disponível: %s escalas, %s turnos por preencher",
+                       len(escalas), em_falta)
+        self.mostrar_estatisticas_escala(escalas)
+        return escalas
+    
+    def salvar_alternativa(self):
+        """Grava a escala parcial da heurística, depois de o utilizador a aceitar.
+
+        Nunca é chamada automaticamente quando o solver falha (ver GestorTarefas.aceitar_alternativa).
+        Devolve o resumo das alterações, ou None se não houver alternativa ou se não for gravada.
+        """
+        if not self.alternativa:
+            return None
+        resumo = self.salvar_escala_otimizada(self.alternativa)
+        if resumo is not None:
+            self.estatisticas.setdefault('alternativa', {})['gravada'] = True
+            logger.warning("Escala heurística parcial aceite e gravada")
+        return resumo
+    
+    def registar_estatisticas(self):
+        """Escreve as estatísticas da geração no log (e os diagnósticos detalhados, se ativos)"""
+        if self.diagnostico.secoes:
+            self.estatisticas['detalhes'] = self.diagnostico.secoes
+        registar_estatisticas(logger, f"Estatísticas {self.valencia} {self.mes}/{self.ano}:", self.estatisticas)
+    
+    def diagnosticar(self, tempo_limite=10.0):
+        """Explica porque é que o mês não tem solução (lista vazia se não for provado inviável)"""
+        self.carregar_dados()
+        if not self.funcionarios:
+            return ["Nenhum funcionário ativo nesta valência."]
+        if not self.turnos:
+            return ["Nenhum turno definido para esta valência."]
         
-        # Preparar dados para o solver
+        funcionarios_dict, turnos_dict, turnos_necessarios_por_dia = self.preparar_dados_solver()
+        verificacao = verificar_viabilidade(funcionarios_dict, self.dias, self.disponibilidade, turnos_necessarios_por_dia)
+        if not verificacao['viavel']:
+            return verificacao['motivos']
+        return diagnosticar_inviabilidade(
+            funcionarios_dict,
+            turnos_dict,
+            self.dias,
+            self.disponibilidade,
+            turnos_necessarios_por_dia,
+            SEQUENCIAS_PROIBIDAS,
+            tempo_limite=tempo_limite,
+            fronteira=self.carregar_fronteira() if self.fronteira is None else self.fronteira
+        )
+    
+    def criar_problema(self):
+        """Fotografia imutável (Problema) dos dados já carregados, com rodízio e ajustes aplicados"""
+        perfil_ideal = None
+        if self.perfil_ideal is not None:
+            perfil_ideal = tuple(
+                (funcionario_id, tuple(sorted(contagem.items())))
+                for funcionario_id, contagem in sorted(self.perfil_ideal.items())
+            )
+        if self.fronteira is None:
+            self.fronteira = self.carregar_fronteira()
+        return Problema(
+            valencia=self.valencia,
+            mes=self.mes,
+            ano=self.ano,
+            funcionarios=tuple(FuncionarioProblema(f.id, f.nome, f.equipa) for f in self.funcionarios),
+            turnos=tuple(TurnoProblema(t.id, t.nome, t.funcionarios_necessarios) for t in self.turnos),
+            dias=tuple(self.dias),
+            disponibilidade=self.disponibilidade,
+            sequencias_proibidas=tuple(SEQUENCIAS_PROIBIDAS),
+            perfil_ideal=perfil_ideal
+        ).com_fronteira(self.fronteira)
+    
+    def preparar_dados_solver(self):
+        """Converte funcionários, turnos e necessidades diárias para o formato do solver"""
         funcionarios_dict = [{'id': f.id, 'nome': f.nome} for f in self.funcionarios]
         turnos_dict = [{'id': t.id, 'nome': t.nome} for t in self.turnos]
         
@@ -434,132 +648,232 @@ class OtimizadorMensal:
                 turnos_necessarios.append(t.funcionarios_necessarios)
             turnos_necessarios_por_dia[dia] = turnos_necessarios
         
-        # Sequências proibidas
-        sequencias_proibidas = [
-            ('N', 'M'), ('M', 'T'), ('I', 'T'), ('I', 'N'), ('T', 'N'),
-        ]
-        
-        print(f"\n=== RESOLVENDO ESCALA MENSAL COMPLETA ===")
-        print(f"Dias a processar: {[d.strftime('%d/%m') for d in self.dias]}")
-        
-        # Chamar o solver para o mês inteiro
-        resultado = gerar_escala_ortools(
-            funcionarios_dict,
-            turnos_dict,
-            self.dias,
-            self.restricoes,
-            turnos_necessarios_por_dia,
-            sequencias_proibidas,
-            self.perfil_ideal
-        )
-        
-        if resultado:
-            print(f"✅ Escala mensal gerada com sucesso!")
-            print(f"Total de escalas: {len(resultado)}")
-            
-            # Mostrar estatísticas finais
-            self.mostrar_estatisticas_escala(resultado)
-            
-            return resultado
-        else:
-            print("❌ Falha ao gerar escala mensal!")
-            return None
+        return funcionarios_dict, turnos_dict, turnos_necessarios_por_dia
     
-    def mostrar_estatisticas_escala(self, escalas):
-        """Mostra estatísticas da escala para acompanhar a qualidade"""
+    def mostrar_estatisticas_escala(self, escalas, resumo=None):
+        """Regista estatísticas da escala para acompanhar a qualidade.
+
+        resumo: turnos por funcionário já calculados pelo solver (ver resumo_turnos); sem
+        ele são contados a partir das escalas.
+        """
         if not escalas:
             return
         
-        # Contar turnos por funcionário
-        turnos_por_funcionario = defaultdict(int)
-        for escala in escalas:
-            turnos_por_funcionario[escala['funcionario_id']] += 1
-        
-        # Calcular estatísticas
-        turnos_list = list(turnos_por_funcionario.values())
-        if turnos_list:
-            media = sum(turnos_list) / len(turnos_list)
-            min_turnos = min(turnos_list)
-            max_turnos = max(turnos_list)
-            
-            print(f"\nEstatísticas da Escala:")
-            print(f"  Média de turnos por funcionário: {media:.1f}")
-            print(f"  Mínimo: {min_turnos} turnos")
-            print(f"  Máximo: {max_turnos} turnos")
-            print(f"  Variação: {max_turnos - min_turnos} turnos")
-            
-            # Mostrar distribuição detalhada
-            print(f"\nDistribuição por funcionário:")
-            funcionarios_dict = {f.id: f.nome for f in self.funcionarios}
-            for funcionario_id, total in sorted(turnos_por_funcionario.items()):
-                nome = funcionarios_dict.get(funcionario_id, f"Funcionário {funcionario_id}")
-                print(f"  {nome}: {total} turnos")
+        if resumo is None:
+            _, totais = np.unique([escala['funcionario_id'] for escala in escalas], return_counts=True)
+            resumo = resumo_turnos(totais)
+        if resumo:
+            self.estatisticas['turnos_por_funcionario'] = resumo
+            min_turnos, max_turnos = resumo['minimo'], resumo['maximo']
             
             # Alertar se há desequilíbrios graves
             if max_turnos > 25:
-                print(f"  ⚠️  ALERTA: Funcionário com {max_turnos} turnos (muito alto)")
+                logger.warning("Funcionário com %s turnos (muito alto)", max_turnos)
             if min_turnos < 10:
-                print(f"  ⚠️  ALERTA: Funcionário com {min_turnos} turnos (muito baixo)")
+                logger.warning("Funcionário com %s turnos (muito baixo)", min_turnos)
     
     def salvar_escala_otimizada(self, escalas):
-        """Salva a escala otimizada no banco de dados"""
+        """Salva a escala otimizada, escrevendo só as células que mudaram.
+
+        Devolve o resumo {'inseridas', 'removidas', 'inalteradas', 'perfil_solver'} ou None em caso de erro.
+        """
         if not escalas:
-            print("❌ Nenhuma escala para salvar!")
-            return False
+            logger.error("Nenhuma escala para salvar!")
+            return None
         
+        existentes, duplicadas = self.carregar_escala_existente(com_duplicadas=True)
+        return self.salvar_diferencas(escalas, existentes, duplicadas)
+
+    def carregar_escala_existente(self, com_duplicadas=False):
+        """Devolve {(funcionario_id, dia): (escala_id, turno_id)} com as escalas guardadas do mês.
+
+        Com com_duplicadas=True devolve também a lista de ids de escalas repetidas
+        no mesmo dia para o mesmo funcionário (que devem ser apagadas).
+        """
+        data_inicio, data_fim = self.limites_mes()
         with get_app_context():
-            # Limpar escalas existentes
-            data_inicio = datetime(self.ano, self.mes, 1)
-            data_fim = datetime(self.ano, self.mes + 1, 1) - timedelta(days=1)
+            linhas = self.consulta_escalas(
+                data_inicio, data_fim, Escala.id, Escala.funcionario_id, Escala.data, Escala.turno_id
+            ).order_by(Escala.id).all()
+        
+        existentes = {}
+        duplicadas = []
+        for escala_id, funcionario_id, data, turno_id in linhas:
+            if (funcionario_id, data) in existentes:
+                duplicadas.append(escala_id)
+            else:
+                existentes[funcionario_id, data] = (escala_id, turno_id)
+        if com_duplicadas:
+            return existentes, duplicadas
+        return existentes
+    
+    def reparar_escala(self, funcionario_id, data_inicio, data_fim, raio=2, tempo_limite=10.0):
+        """Repara a escala guardada depois de uma nova restrição, sem regenerar o mês inteiro.
+
+        Só podem mudar as células do funcionário afetado (em todo o mês) e as de todos
+        os funcionários nos dias afetados ± raio; tudo o resto fica fixo. Se essa
+        vizinhança não tiver solução, o raio é duplicado até abranger o mês.
+        Devolve o resumo das alterações gravadas, ou None se não houver escala a reparar
+        ou se não for possível repará-la. Corre na fila de tarefas (ver GestorTarefas.submeter),
+        que limita as threads por parametros_solver['num_workers'].
+        """
+        self.notificar_progresso('a carregar dados')
+        self.carregar_dados()
+        if not self.funcionarios or not self.turnos:
+            return None
+        
+        existentes, duplicadas = self.carregar_escala_existente(com_duplicadas=True)
+        if not existentes:
+            logger.error("Nenhuma escala guardada para reparar neste mês!")
+            return None
+        
+        funcionarios_dict, turnos_dict, turnos_necessarios_por_dia = self.preparar_dados_solver()
+        dicas = {(f_id, dia, turno_id) for (f_id, dia), (_, turno_id) in existentes.items()}
+        fronteira = self.carregar_fronteira() if self.fronteira is None else self.fronteira
+        
+        primeiro_dia, ultimo_dia = self.limites_mes()
+        inicio = max(data_inicio, primeiro_dia)
+        fim = min(data_fim, ultimo_dia)
+        
+        raio_atual = raio
+        while True:
+            janela_inicio = inicio - timedelta(days=raio_atual)
+            janela_fim = fim + timedelta(days=raio_atual)
             
-            Escala.query.filter(
-                Escala.data >= data_inicio.date(),
-                Escala.data <= data_fim.date(),
-                Escala.valencia == self.valencia
-            ).delete()
+            # Fixar tudo o que está fora da vizinhança
+            fixas = {}
+            for funcionario in self.funcionarios:
+                if funcionario.id == funcionario_id:
+                    continue
+                for dia in self.dias:
+                    if janela_inicio <= dia <= janela_fim:
+                        continue
+                    atual = existentes.get((funcionario.id, dia))
+                    fixas[funcionario.id, dia] = atual[1] if atual else None
             
-            # Salvar novas escalas
-            escalas_salvas = 0
-            for escala in escalas:
-                try:
-                    nova_escala = Escala(
-                        funcionario_id=escala['funcionario_id'],
-                        turno_id=escala['turno_id'],
-                        data=escala['data'],
-                        valencia=self.valencia
-                    )
-                    db.session.add(nova_escala)
-                    escalas_salvas += 1
-                except Exception as e:
-                    print(f"Erro ao salvar escala: {e}")
+            logger.info("A reparar escala de %s/%s (±%s dias, %s células fixas)", self.mes, self.ano, raio_atual, len(fixas))
+            self.notificar_progresso('a resolver')
+            resultado = gerar_escala_ortools(
+                funcionarios_dict,
+                turnos_dict,
+                self.dias,
+                self.disponibilidade,
+                turnos_necessarios_por_dia,
+                SEQUENCIAS_PROIBIDAS,
+                self.perfil_ideal,
+                dicas=dicas,
+                estatisticas=self.estatisticas,
+                fixas=fixas,
+                tempo_limite=tempo_limite,
+                diagnostico=self.diagnostico,
+                parar=self.parar,
+                fronteira=fronteira,
+                num_workers=self.parametros_solver.get('num_workers')
+            )
             
+            if resultado or not fixas or self.parar.is_set():
+                break
+            logger.warning("Vizinhança de ±%s dias sem solução. A alargar...", raio_atual)
+            raio_atual *= 2
+        
+        if not resultado:
+            logger.error("Não foi possível reparar a escala!")
+            return None
+        
+        self.estatisticas['raio_reparacao'] = raio_atual
+        self.registar_estatisticas()
+        return self.salvar_diferencas(resultado, existentes, duplicadas)
+    
+    def salvar_diferencas(self, escalas, existentes, duplicadas=()):
+        """Grava apenas as células que mudaram face às escalas existentes.
+
+        duplicadas: ids de escalas repetidas já guardadas, que são apagadas. Uma escala nova com
+        dois turnos para o mesmo funcionário e dia é recusada (devolve None sem gravar nada).
+        As remoções e as inserções são feitas com um executemany cada, numa só transação.
+        """
+        novas = {}
+        for escala in escalas:
+            chave = (escala['funcionario_id'], escala['data'])
+            if chave in novas:
+                logger.error("Escala com dois turnos para o funcionário %s em %s: nada foi gravado", *chave)
+                return None
+            novas[chave] = escala['turno_id']
+        remover = list(duplicadas) + [
+            escala_id for chave, (escala_id, turno_id) in existentes.items()
+            if novas.get(chave) != turno_id
+        ]
+        inserir = [
+            {'funcionario_id': funcionario_id, 'turno_id': turno_id, 'data': dia, 'valencia': self.valencia}
+            for (funcionario_id, dia), turno_id in novas.items()
+            if (funcionario_id, dia) not in existentes or existentes[funcionario_id, dia][1] != turno_id
+        ]
+        
+        self.notificar_progresso('a guardar')
+        tabela = Escala.__table__
+        with get_app_context():
             try:
+                if remover:
+                    db.session.execute(
+                        tabela.delete().where(tabela.c.id == bindparam('escala_id')),
+                        [{'escala_id': escala_id} for escala_id in remover]
+                    )
+                if inserir:
+                    db.session.execute(tabela.insert(), inserir)
                 db.session.commit()
-                print(f"✅ {escalas_salvas} escalas otimizadas salvas!")
-                return True
             except Exception as e:
-                print(f"❌ Erro ao salvar: {e}")
+                logger.error("Erro ao salvar: %s", e)
                 db.session.rollback()
-                return False
+                return None
+        
+        resumo = {
+            'inseridas': len(inserir),
+            'removidas': len(remover),
+            'inalteradas': len(novas) - len(inserir),
+            # Perfil do solver que produziu a escala gravada (None numa reparação ou numa escala aceite)
+            'perfil_solver': self.perfil_solver
+        }
+        self.estatisticas['gravacao'] = resumo
+        logger.info("Alterações gravadas: %s", resumo)
+        return resumo
+
+def carregar_problema(mes, ano, valencia):
+    """Lê o mês da base de dados e devolve o Problema pronto a resolver (ou None sem funcionários/turnos)"""
+    otimizador = OtimizadorMensal(mes, ano, valencia)
+    otimizador.carregar_dados()
+    if not otimizador.funcionarios or not otimizador.turnos:
+        return None
+    return otimizador.criar_problema()
 
 # Função principal para usar o otimizador
 def gerar_escala_mensal_otimizada(mes, ano, valencia):
-    """Gera uma escala mensal otimizada"""
+    """Gera uma escala mensal otimizada e regista a geração (com o perfil do solver) na tabela de tarefas"""
+    from tarefas import registar_geracao
+
+    criada_em = datetime.now()
     otimizador = OtimizadorMensal(mes, ano, valencia)
     melhor_escala = otimizador.gerar_escala_mensal_completa()
     
+    sucesso = False
     if melhor_escala:
-        sucesso = otimizador.salvar_escala_otimizada(melhor_escala)
+        sucesso = otimizador.salvar_escala_otimizada(melhor_escala) is not None
         if sucesso:
-            print("🎉 Escala mensal otimizada gerada com sucesso!")
-            return True
+            logger.info("Escala mensal otimizada gerada com sucesso!")
+            mensagem = 'Gerada diretamente.'
         else:
-            print("❌ Erro ao salvar escala otimizada!")
-            return False
+            logger.error("Erro ao salvar escala otimizada!")
+            mensagem = 'Erro ao salvar a escala otimizada.'
     else:
-        print("❌ Falha ao gerar escala mensal!")
-        return False
+        logger.error("Falha ao gerar escala mensal!")
+        motivos = '; '.join(otimizador.estatisticas.get('diagnostico') or []) or 'o solver não devolveu escala'
+        mensagem = f'Geração direta sem solução: {motivos}.'
+        if otimizador.alternativa:
+            logger.warning("Há uma escala heurística parcial (%s turnos por preencher), não gravada",
+                           otimizador.estatisticas['alternativa']['em_falta'])
+    with get_app_context():
+        registar_geracao(otimizador, sucesso, mensagem, criada_em)
+    return sucesso
 
 if __name__ == "__main__":
     # Exemplo de como usar o otimizador
+    logging.basicConfig(level=logging.INFO)
     gerar_escala_mensal_otimizada(8, 2025, "Lar de Idosos")
\ No newline at end of file
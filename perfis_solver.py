@@ -0,0 +1,65 @@
+from models import db, Configuracao, PerfilSolver
+
+# Perfis criados por criar_perfis_predefinidos (e usados se a tabela ainda não existir)
+PERFIS_PREDEFINIDOS = {
+    'rápido': {
+        'descricao': 'Primeira solução boa em poucos segundos (pré-visualizações)',
+        'num_workers': None, 'tempo_limite': 10.0, 'gap_relativo': 0.05,
+        'semente': 0, 'nivel_presolve': 1, 'nivel_linearizacao': 0
+    },
+    'equilibrado': {
+        'descricao': 'Parâmetros por omissão do CP-SAT, até 60 segundos',
+        'num_workers': None, 'tempo_limite': 60.0, 'gap_relativo': 0.0,
+        'semente': 0, 'nivel_presolve': 2, 'nivel_linearizacao': 1
+    },
+    'qualidade': {
+        'descricao': 'Procura longa e relaxação mais forte, para a escala final',
+        'num_workers': None, 'tempo_limite': 300.0, 'gap_relativo': 0.0,
+        'semente': 0, 'nivel_presolve': 2, 'nivel_linearizacao': 2
+    },
+}
+PERFIL_POR_OMISSAO = 'equilibrado'
+
+CAMPOS_PERFIL = ('num_workers', 'tempo_limite', 'gap_relativo', 'semente', 'nivel_presolve', 'nivel_linearizacao')
+
+def criar_perfis_predefinidos():
+    """Cria os perfis predefinidos que ainda não existem; devolve os nomes criados"""
+    existentes = {nome for (nome,) in db.session.query(PerfilSolver.nome)}
+    criados = [nome for nome in PERFIS_PREDEFINIDOS if nome not in existentes]
+    for nome in criados:
+        db.session.add(PerfilSolver(nome=nome, **PERFIS_PREDEFINIDOS[nome]))
+    db.session.commit()
+    return criados
+
+def listar_perfis():
+    """Nomes dos perfis disponíveis (os predefinidos primeiro)"""
+    try:
+        nomes = [nome for (nome,) in db.session.query(PerfilSolver.nome).order_by(PerfilSolver.id)]
+    except Exception:
+        db.session.rollback()
+        nomes = []
+    return list(dict.fromkeys([*PERFIS_PREDEFINIDOS, *nomes]))
+
+def obter_perfil(nome=None, valencia=None):
+    """Devolve (nome, parametros) do perfil para gerar_escala_ortools.
+
+    Sem nome usa o perfil da configuração da valência e, sem este, PERFIL_POR_OMISSAO.
+    Lança ValueError se o perfil não existir.
+    """
+    if not nome and valencia:
+        nome = db.session.query(Configuracao.perfil_solver).filter(
+            Configuracao.valencia == valencia, Configuracao.perfil_solver.isnot(None)
+        ).limit(1).scalar()
+    nome = nome or PERFIL_POR_OMISSAO
+
+    try:
+        perfil = db.session.query(PerfilSolver).filter_by(nome=nome).first()
+    except Exception:
+        # Ex: tabela ainda não criada; ficam os perfis predefinidos
+        db.session.rollback()
+        perfil = None
+    if perfil is not None:
+        return nome, {campo: getattr(perfil, campo) for campo in CAMPOS_PERFIL}
+    if nome in PERFIS_PREDEFINIDOS:
+        return nome, {campo: PERFIS_PREDEFINIDOS[nome][campo] for campo in CAMPOS_PERFIL}
+    raise ValueError(f"Perfil do solver desconhecido: {nome!r}")
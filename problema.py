@@ -0,0 +1,155 @@
+"""Fotografia imutável dos dados de entrada do solver, sem Flask nem ORM.
+
+Um Problema contém tudo o que gerar_escala_ortools precisa (funcionários, turnos,
+dias, matriz de disponibilidade, procura, sequências proibidas, perfil ideal e o
+estado à entrada do período).
+É construído a partir da base de dados pelo OtimizadorMensal (ver criar_problema)
+e pode ser serializado para bytes e resolvido noutro processo.
+"""
+
+from dataclasses import dataclass, fields, replace
+from escalonador import gerar_escala_ortools
+from decomposicao import gerar_escala_decomposta
+from heuristica import gerar_escala_heuristica
+from viabilidade import verificar_viabilidade
+import numpy as np
+import pickle
+
+@dataclass(frozen=True, slots=True)
+class FuncionarioProblema:
+    id: int
+    nome: str
+    equipa: str = None  # subequipa configurada (ver decomposicao)
+
+@dataclass(frozen=True, slots=True)
+class TurnoProblema:
+    id: int
+    nome: str
+    necessarios: int
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Problema:
+    valencia: str
+    mes: int
+    ano: int
+    funcionarios: tuple  # (FuncionarioProblema, ...)
+    turnos: tuple  # (TurnoProblema, ...)
+    dias: tuple  # (datetime.date, ...) só dias de funcionamento
+    disponibilidade: np.ndarray  # bool funcionários × dias (True = disponível), só leitura
+    sequencias_proibidas: tuple = ()  # ((turno de ontem, turno de hoje), ...)
+    perfil_ideal: tuple = None  # ((funcionario_id, ((turno, quantidade), ...)), ...)
+    fronteira: tuple = ()  # ((funcionario_id, dias_seguidos, ultimo_turno_id), ...) à entrada do primeiro dia
+    dias_previsao: int = 0  # últimos dias só de previsão (fora do equilíbrio e do perfil ideal)
+
+    def __post_init__(self):
+        disponibilidade = np.array(self.disponibilidade, dtype=bool)
+        if disponibilidade.shape != (len(self.funcionarios), len(self.dias)):
+            raise ValueError(f"Matriz de disponibilidade {disponibilidade.shape} não corresponde a "
+                             f"{len(self.funcionarios)} funcionários × {len(self.dias)} dias")
+        disponibilidade.setflags(write=False)
+        object.__setattr__(self, 'disponibilidade', disponibilidade)
+
+    def __reduce__(self):
+        # Reconstruir pelo construtor, para a matriz voltar a ficar só de leitura
+        return (self.__class__, tuple(getattr(self, campo.name) for campo in fields(self)))
+
+    def para_bytes(self):
+        """Serializa o problema (pickle) para enviar a outro processo ou guardar"""
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def de_bytes(cls, dados):
+        """Reconstrói um problema serializado com para_bytes"""
+        problema = pickle.loads(dados)
+        if not isinstance(problema, cls):
+            raise TypeError(f"Esperado {cls.__name__}, obtido {type(problema).__name__}")
+        return problema
+
+    @property
+    def perfil(self):
+        """Perfil ideal no formato do solver {funcionario_id: {turno: quantidade}} (ou None)"""
+        if self.perfil_ideal is None:
+            return None
+        return {funcionario_id: dict(contagem) for funcionario_id, contagem in self.perfil_ideal}
+
+    def com_fronteira(self, fronteira):
+        """Cópia com o estado de entrada {funcionario_id: (dias_seguidos, ultimo_turno_id)} (ver estado_fronteira)"""
+        return replace(self, fronteira=tuple(sorted(
+            (funcionario_id, dias_seguidos, turno_id) for funcionario_id, (dias_seguidos, turno_id) in fronteira.items()
+        )))
+
+    def com_previsao(self, seguinte, n_dias):
+        """Cópia estendida com os primeiros n_dias do problema seguinte, como dias só de previsão.
+
+        Os funcionários que não existem no problema seguinte ficam indisponíveis nesses dias.
+        Devolve o próprio problema se não houver dias a acrescentar ou os turnos forem diferentes.
+        """
+        dias = seguinte.dias[:n_dias]
+        if not dias or seguinte.turnos != self.turnos:
+            return self
+        linha_seguinte = {f.id: i for i, f in enumerate(seguinte.funcionarios)}
+        previsao = np.zeros((len(self.funcionarios), len(dias)), dtype=bool)
+        for i, funcionario in enumerate(self.funcionarios):
+            if funcionario.id in linha_seguinte:
+                previsao[i] = seguinte.disponibilidade[linha_seguinte[funcionario.id], :len(dias)]
+        return replace(self, dias=self.dias + dias, disponibilidade=np.hstack([self.disponibilidade, previsao]),
+                       dias_previsao=self.dias_previsao + len(dias))
+
+    def dados_solver(self):
+        """(funcionarios, turnos, turnos_necessarios_por_dia) no formato de gerar_escala_ortools"""
+        funcionarios = [{'id': f.id, 'nome': f.nome} for f in self.funcionarios]
+        turnos = [{'id': t.id, 'nome': t.nome} for t in self.turnos]
+        necessarios = [t.necessarios for t in self.turnos]
+        turnos_necessarios_por_dia = {dia: list(necessarios) for dia in self.dias}
+        return funcionarios, turnos, turnos_necessarios_por_dia
+
+    def verificar(self):
+        """Pré-verificação polinomial de viabilidade (ver viabilidade.verificar_viabilidade)"""
+        funcionarios, _, turnos_necessarios_por_dia = self.dados_solver()
+        return verificar_viabilidade(funcionarios, self.dias, self.disponibilidade, turnos_necessarios_por_dia,
+                                     self.dias_previsao)
+
+    def resolver(self, equipas=None, **parametros):
+        """Resolve o problema com gerar_escala_ortools; parametros são passados ao solver.
+
+        Com equipas (número de subequipas) resolve por subequipas com gerar_escala_decomposta,
+        usando as equipas configuradas dos funcionários se existirem.
+        """
+        funcionarios, turnos, turnos_necessarios_por_dia = self.dados_solver()
+        if equipas:
+            parametros['equipas'] = {f.id: f.equipa for f in self.funcionarios if f.equipa} or None
+            parametros['n_equipas'] = equipas
+        resolver = gerar_escala_decomposta if equipas else gerar_escala_ortools
+        return resolver(
+            funcionarios,
+            turnos,
+            list(self.dias),
+            self.disponibilidade,
+            turnos_necessarios_por_dia,
+            list(self.sequencias_proibidas),
+            self.perfil,
+            fronteira={funcionario_id: (dias_seguidos, turno_id) for funcionario_id, dias_seguidos, turno_id in self.fronteira},
+            dias_previsao=self.dias_previsao,
+            **parametros
+        )
+
+    def resolver_heuristica(self, **parametros):
+        """Escala heurística (escalas, vagas) com gerar_escala_heuristica; parametros são passados à heurística"""
+        funcionarios, turnos, turnos_necessarios_por_dia = self.dados_solver()
+        return gerar_escala_heuristica(
+            funcionarios,
+            turnos,
+            list(self.dias),
+            self.disponibilidade,
+            turnos_necessarios_por_dia,
+            list(self.sequencias_proibidas),
+            self.perfil,
+            fronteira={funcionario_id: (dias_seguidos, turno_id) for funcionario_id, dias_seguidos, turno_id in self.fronteira},
+            **parametros
+        )
+
+def resolver_bytes(dados, **parametros):
+    """Resolve um problema serializado e devolve (escalas, estatisticas); pensado para pools de processos"""
+    estatisticas = {}
+    escalas = Problema.de_bytes(dados).resolver(estatisticas=estatisticas, **parametros)
+    return escalas, estatisticas
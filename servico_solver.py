@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Serviço de geração de escalas: um processo de longa duração que executa todo o trabalho do CP-SAT.
+
+Uso:
+    python servico_solver.py                            # usa GERACAO_MAX_WORKERS e GERACAO_MAX_THREADS
+    python servico_solver.py --geracoes 2 --threads 8
+
+Com GERACAO_MODO=servico a aplicação web só regista as tarefas (tabela tarefa_geracao)
+e consulta o seu estado; este serviço vai buscá-las à fila, alternando entre valências,
+com no máximo --geracoes gerações em simultâneo e --threads threads do CP-SAT no total.
+Os cancelamentos pedidos na aplicação interrompem a procura em curso.
+Termina com Ctrl+C / SIGTERM, depois de acabar as gerações em curso.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    from app import app
+    from models import db
+    from migracoes import aplicar_colunas, aplicar_indices
+    from tarefas import GestorTarefas, MODO_SERVICO
+
+    parser = argparse.ArgumentParser(description="Serviço de geração de escalas")
+    parser.add_argument('--geracoes', type=int, default=app.config['GERACAO_MAX_WORKERS'],
+                        help="Gerações em simultâneo")
+    parser.add_argument('--threads', type=int, default=app.config['GERACAO_MAX_THREADS'],
+                        help="Threads do CP-SAT no total (repartidas pelas gerações)")
+    parser.add_argument('--intervalo', type=float, default=0.5, help="Segundos entre consultas à fila")
+    args = parser.parse_args()
+
+    gestor = GestorTarefas(app, max_workers=args.geracoes, max_threads=args.threads, modo=MODO_SERVICO)
+    with app.app_context():
+        db.create_all()
+        aplicar_colunas()
+        aplicar_indices()
+        # As tarefas na fila continuam válidas; só as que estavam a correr se perderam
+        gestor.recuperar_tarefas_interrompidas(incluir_pendentes=False)
+
+    parar = threading.Event()
+    for sinal in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sinal, lambda *_: parar.set())
+    gestor.servir(intervalo=args.intervalo, parar=parar)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
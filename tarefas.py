@@ -0,0 +1,572 @@
+from models import db, TarefaGeracao
+from otimizador_mensal import OtimizadorMensal
+from perfis_solver import obter_perfil
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import func, or_, select
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PENDENTE = 'pendente'
+ESTADO_EM_EXECUCAO = 'em_execucao'
+ESTADO_A_CANCELAR = 'a_cancelar'
+ESTADO_A_ACEITAR = 'a_aceitar'
+ESTADO_CONCLUIDA = 'concluida'
+ESTADO_FALHOU = 'falhou'
+ESTADO_CANCELADA = 'cancelada'
+ESTADOS_TERMINADOS = (ESTADO_CONCLUIDA, ESTADO_FALHOU, ESTADO_CANCELADA)
+ESTADOS_EM_CURSO = (ESTADO_EM_EXECUCAO, ESTADO_A_CANCELAR, ESTADO_A_ACEITAR)
+
+# Espera máxima de cada long-poll da melhor solução (segundos); o cliente volta a pedir a seguir,
+# para nenhum pedido prender uma thread do servidor web durante muito tempo
+ESPERA_SOLUCAO = 5.0
+
+# 'local': a aplicação web executa as gerações; 'servico': só as regista e é o servico_solver.py que as executa
+MODO_LOCAL = 'local'
+MODO_SERVICO = 'servico'
+
+def ordem_fila(pendentes, em_curso):
+    """Ordem por que as tarefas pendentes vão arrancar na fila justa por valência.
+
+    pendentes: tarefas (dicts com 'valencia') por ordem de criação; em_curso: contagem das
+    gerações a correr por valência. Arranca sempre a mais antiga da valência com menos
+    gerações em curso, contando as que arrancaram antes dela na fila.
+    """
+    por_valencia = defaultdict(deque)
+    for posicao, tarefa in enumerate(pendentes):
+        por_valencia[tarefa['valencia']].append((posicao, tarefa))
+    em_curso = Counter(em_curso)
+    # (gerações em curso, posição da mais antiga por arrancar, valência)
+    heap = [(em_curso[valencia], fila[0][0], valencia) for valencia, fila in por_valencia.items()]
+    heapq.heapify(heap)
+    ordem = []
+    while heap:
+        n, _, valencia = heapq.heappop(heap)
+        fila = por_valencia[valencia]
+        ordem.append(fila.popleft()[1])
+        if fila:
+            heapq.heappush(heap, (n + 1, fila[0][0], valencia))
+    return ordem
+
+def contar_em_curso(ligacao):
+    """Gerações em curso por valência, em todos os processos: {valencia: n}"""
+    tabela = TarefaGeracao.__table__
+    return dict(ligacao.execute(
+        select(tabela.c.valencia, func.count()).where(tabela.c.estado.in_(ESTADOS_EM_CURSO)).group_by(tabela.c.valencia)
+    ).all())
+
+def registar_geracao(otimizador, sucesso, mensagem, criada_em):
+    """Regista como tarefa terminada uma geração feita fora do GestorTarefas (lote ou chamada direta).
+
+    Fica com o perfil do solver usado e as estatísticas; se o solver falhou, com a escala
+    heurística parcial em melhor_solucao, para poder ser aceite na aplicação.
+    """
+    melhor_solucao = None
+    if not sucesso and otimizador.alternativa:
+        melhor_solucao = json.dumps(
+            [[e['funcionario_id'], e['data'].isoformat(), e['turno_id']] for e in otimizador.alternativa],
+            separators=(',', ':')
+        )
+    tarefa = TarefaGeracao(
+        id=uuid.uuid4().hex, valencia=otimizador.valencia, mes=otimizador.mes, ano=otimizador.ano,
+        estado=ESTADO_CONCLUIDA if sucesso else ESTADO_FALHOU, fase='terminada',
+        criada_em=criada_em, iniciada_em=criada_em, terminada_em=datetime.now(),
+        melhor_objetivo=otimizador.estatisticas.get('objetivo'), mensagem=mensagem,
+        estatisticas=json.dumps(otimizador.estatisticas, default=str),
+        arranque_quente=otimizador.arranque_quente, perfil_solver=otimizador.perfil_solver,
+        melhor_solucao=melhor_solucao
+    )
+    db.session.add(tarefa)
+    db.session.commit()
+    return tarefa.id
+
+class GestorTarefas:
+    """Executa a geração de escalas em segundo plano, guardando o estado na base de dados.
+
+    O CP-SAT liberta o GIL durante a resolução, por isso um pool de threads no
+    próprio processo é suficiente e evita qualquer broker externo. A tabela de
+    tarefas funciona como fila: no máximo max_workers gerações correm ao mesmo
+    tempo, repartindo max_threads threads do CP-SAT, e a próxima tarefa é sempre
+    a mais antiga da valência com menos gerações em curso. O limite e a fila
+    contam as tarefas em curso na base de dados, por isso valem para todos os
+    processos que despacham da mesma tabela.
+    """
+    def __init__(self, app, max_workers=2, intervalo_progresso=1.0, max_threads=None, modo=MODO_LOCAL):
+        self.app = app
+        self.max_workers = max_workers
+        self.intervalo_progresso = intervalo_progresso
+        self.max_threads = max_threads or os.cpu_count() or 1
+        self.modo = modo
+        self._executor = None
+        self._lock = threading.RLock()
+        # tarefa_id -> (valencia, threading.Event para interromper a procura)
+        self._em_execucao = {}
+        self._a_terminar = False
+
+    @property
+    def threads_por_geracao(self):
+        """Threads do CP-SAT de cada geração, para não passar de max_threads no total"""
+        return max(1, self.max_threads // self.max_workers)
+
+    def _obter_executor(self):
+        """Cria o pool de workers apenas no primeiro pedido"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='gerador')
+            return self._executor
+
+    def submeter(self, mes, ano, valencia, arranque_quente=None, perfil_solver=None, reparacao=None,
+                 diagnostico=False):
+        """Regista a tarefa como pendente e devolve o seu id de imediato (perfil_solver None = o da valência).
+
+        reparacao: (funcionario_id, data_inicio, data_fim) para reparar a escala guardada
+        depois de uma nova restrição (ver OtimizadorMensal.reparar_escala) em vez de gerar o mês.
+        diagnostico: só explica porque é que o mês não tem solução (ver OtimizadorMensal.diagnosticar);
+        as mensagens ficam em estatisticas['diagnostico'].
+        """
+        if reparacao is not None:
+            funcionario_id, data_inicio, data_fim = reparacao
+            reparacao = json.dumps({'funcionario_id': funcionario_id, 'data_inicio': data_inicio.isoformat(),
+                                    'data_fim': data_fim.isoformat()})
+        tarefa = TarefaGeracao(
+            id=uuid.uuid4().hex,
+            valencia=valencia,
+            mes=mes,
+            ano=ano,
+            estado=ESTADO_PENDENTE,
+            fase='na fila',
+            arranque_quente=arranque_quente,
+            perfil_solver=perfil_solver,
+            reparacao=reparacao,
+            diagnostico=diagnostico or None
+        )
+        db.session.add(tarefa)
+        db.session.commit()
+
+        tipo = ' (reparação)' if reparacao else ' (diagnóstico)' if diagnostico else ''
+        logger.info(f"Tarefa {tarefa.id} submetida: {valencia} {mes}/{ano}{tipo}")
+        if self.modo == MODO_LOCAL:
+            self.despachar()
+        return tarefa.id
+
+    def cancelar(self, tarefa_id):
+        """Cancela a tarefa: na fila deixa de correr; em execução a procura é interrompida.
+
+        Devolve o novo estado ('cancelada' ou 'a_cancelar'), ou None se a tarefa não
+        existir ou já tiver terminado.
+        """
+        tabela = TarefaGeracao.__table__
+        with db.engine.begin() as conn:
+            resultado = conn.execute(tabela.update().where(
+                tabela.c.id == tarefa_id, tabela.c.estado == ESTADO_PENDENTE
+            ).values(estado=ESTADO_CANCELADA, fase='terminada', terminada_em=datetime.now(), mensagem='Geração cancelada.'))
+            if resultado.rowcount:
+                return ESTADO_CANCELADA
+        return self._pedir_paragem(tarefa_id, ESTADO_A_CANCELAR, 'a cancelar')
+
+    def aceitar(self, tarefa_id):
+        """Interrompe a procura em curso e grava a melhor solução encontrada até agora.
+
+        Devolve 'a_aceitar', ou None se a tarefa não estiver em execução.
+        """
+        return self._pedir_paragem(tarefa_id, ESTADO_A_ACEITAR, 'a aceitar solução atual')
+
+    def aceitar_alternativa(self, tarefa_id):
+        """Grava a escala heurística parcial de uma tarefa falhada, a pedido do utilizador.
+
+        Devolve o resumo das alterações, ou None se a tarefa não tiver alternativa por gravar.
+        """
+        tarefa = db.session.get(TarefaGeracao, tarefa_id)
+        if tarefa is None or tarefa.estado != ESTADO_FALHOU or not tarefa.melhor_solucao or not tarefa.estatisticas:
+            return None
+        estatisticas = json.loads(tarefa.estatisticas)
+        if not estatisticas.get('alternativa') or estatisticas['alternativa'].get('gravada'):
+            return None
+
+        otimizador = OtimizadorMensal(tarefa.mes, tarefa.ano, tarefa.valencia)
+        otimizador.alternativa = [
+            {'funcionario_id': funcionario_id, 'data': datetime.strptime(dia, '%Y-%m-%d').date(), 'turno_id': turno_id}
+            for funcionario_id, dia, turno_id in json.loads(tarefa.melhor_solucao)
+        ]
+        otimizador.estatisticas = estatisticas
+        resumo = otimizador.salvar_alternativa()
+        if resumo is not None:
+            tarefa.estatisticas = json.dumps(estatisticas, default=str)
+            tarefa.mensagem = (f'Escala heurística parcial aceite e gravada ({resumo["inseridas"]} inseridas, '
+                               f'{resumo["removidas"]} removidas, {resumo["inalteradas"]} inalteradas).')
+            db.session.commit()
+        return resumo
+
+    def ultimo_diagnostico(self, mes, ano, valencia):
+        """Último diagnóstico do mês: o de uma geração falhada ou o de uma tarefa de diagnóstico.
+
+        Devolve (tarefa, mensagens), com mensagens None se a tarefa de diagnóstico ainda não
+        terminou, ou (None, None) se a última tarefa não tiver diagnóstico.
+        """
+        tarefa = db.session.query(TarefaGeracao).filter(
+            TarefaGeracao.valencia == valencia, TarefaGeracao.mes == mes, TarefaGeracao.ano == ano,
+            or_(TarefaGeracao.estado == ESTADO_FALHOU, TarefaGeracao.diagnostico.is_(True))
+        ).order_by(TarefaGeracao.criada_em.desc()).first()
+        if tarefa is None:
+            return None, None
+        if tarefa.estado not in ESTADOS_TERMINADOS:
+            return tarefa, None
+        estatisticas = json.loads(tarefa.estatisticas) if tarefa.estatisticas else {}
+        if estatisticas.get('diagnostico') is None:
+            return None, None
+        return tarefa, estatisticas['diagnostico']
+
+    def _pedir_paragem(self, tarefa_id, novo_estado, fase):
+        """Marca uma tarefa em execução com o pedido de paragem e interrompe a procura se correr neste processo"""
+        tabela = TarefaGeracao.__table__
+        with db.engine.begin() as conn:
+            resultado = conn.execute(tabela.update().where(
+                tabela.c.id == tarefa_id, tabela.c.estado == ESTADO_EM_EXECUCAO
+            ).values(estado=novo_estado, fase=fase))
+            if not resultado.rowcount:
+                return None
+
+        # Se a geração corre neste processo, interrompê-la já; senão o serviço vê o pedido na base de dados
+        with self._lock:
+            em_execucao = self._em_execucao.get(tarefa_id)
+        if em_execucao:
+            em_execucao[1].set()
+        logger.info(f"Tarefa {tarefa_id}: {fase}")
+        return novo_estado
+
+    def obter_estado(self, tarefa_id):
+        """Devolve o estado da tarefa como dict (ou None se não existir)"""
+        tarefa = db.session.get(TarefaGeracao, tarefa_id)
+        if tarefa is None:
+            return None
+
+        tempo_decorrido = None
+        if tarefa.iniciada_em:
+            fim = tarefa.terminada_em or datetime.now()
+            tempo_decorrido = round((fim - tarefa.iniciada_em).total_seconds(), 1)
+
+        posicao_fila = None
+        if tarefa.estado == ESTADO_PENDENTE:
+            # A mesma ordem que o despacho segue (ver ordem_fila), com as gerações em curso de todos os processos
+            pendentes = db.session.query(TarefaGeracao.id, TarefaGeracao.valencia).filter(
+                TarefaGeracao.estado == ESTADO_PENDENTE
+            ).order_by(TarefaGeracao.criada_em).all()
+            ordem = ordem_fila([{'id': id_, 'valencia': valencia} for id_, valencia in pendentes],
+                               contar_em_curso(db.session))
+            posicao_fila = next((i + 1 for i, pendente in enumerate(ordem) if pendente['id'] == tarefa.id), None)
+
+        return {
+            'id': tarefa.id,
+            'valencia': tarefa.valencia,
+            'mes': tarefa.mes,
+            'ano': tarefa.ano,
+            'estado': tarefa.estado,
+            'fase': tarefa.fase,
+            'perfil_solver': tarefa.perfil_solver,
+            'reparacao': json.loads(tarefa.reparacao) if tarefa.reparacao else None,
+            'diagnostico': bool(tarefa.diagnostico),
+            'posicao_fila': posicao_fila,
+            'tempo_decorrido': tempo_decorrido,
+            'melhor_objetivo': tarefa.melhor_objetivo,
+            'gap': tarefa.gap,
+            'solucoes_encontradas': tarefa.solucoes_encontradas or 0,
+            'mensagem': tarefa.mensagem,
+            'estatisticas': json.loads(tarefa.estatisticas) if tarefa.estatisticas else None,
+            'terminada': tarefa.estado in ESTADOS_TERMINADOS
+        }
+
+    def aguardar_solucao(self, tarefa_id, desde=0, espera=ESPERA_SOLUCAO, intervalo=0.5):
+        """Long-poll da melhor solução: espera até haver uma solução posterior à n.º desde, a tarefa terminar ou passar espera.
+
+        Devolve None se a tarefa não existir, senão um dict com 'solucoes', 'objetivo', 'gap',
+        'tempo', 'estado', 'terminada' e 'escalas' ([(funcionario_id, data, turno_id)] ou None
+        se não houver solução nova).
+        """
+        limite = time.monotonic() + espera
+        while True:
+            tarefa = db.session.get(TarefaGeracao, tarefa_id)
+            if tarefa is None:
+                return None
+            solucoes = tarefa.solucoes_encontradas or 0
+            nova = solucoes > desde and tarefa.melhor_solucao is not None
+            terminada = tarefa.estado in ESTADOS_TERMINADOS
+            if nova or terminada or time.monotonic() >= limite:
+                break
+            # Largar a sessão para ler o estado escrito pela thread (ou pelo processo) da geração
+            db.session.rollback()
+            time.sleep(intervalo)
+
+        tempo = None
+        if tarefa.iniciada_em:
+            tempo = round(((tarefa.terminada_em or datetime.now()) - tarefa.iniciada_em).total_seconds(), 1)
+        escalas = None
+        if nova:
+            escalas = [
+                (funcionario_id, datetime.strptime(dia, '%Y-%m-%d').date(), turno_id)
+                for funcionario_id, dia, turno_id in json.loads(tarefa.melhor_solucao)
+            ]
+        return {
+            'solucoes': solucoes if nova else desde,
+            'objetivo': tarefa.melhor_objetivo,
+            'gap': tarefa.gap,
+            'tempo': tempo,
+            'estado': tarefa.estado,
+            'terminada': terminada,
+            'escalas': escalas
+        }
+
+    def recuperar_tarefas_interrompidas(self, incluir_pendentes=True):
+        """Marca como falhadas as tarefas que ficaram a meio num reinício do servidor.
+
+        Com incluir_pendentes=False (serviço de geração) as tarefas na fila são mantidas.
+        """
+        estados = list(ESTADOS_EM_CURSO)
+        if incluir_pendentes:
+            estados.append(ESTADO_PENDENTE)
+        num_tarefas = TarefaGeracao.query.filter(
+            TarefaGeracao.estado.in_(estados)
+        ).update({
+            'estado': ESTADO_FALHOU,
+            'fase': 'interrompida',
+            'terminada_em': datetime.now(),
+            'mensagem': 'Tarefa interrompida por reinício do servidor.'
+        }, synchronize_session=False)
+        db.session.commit()
+        if num_tarefas:
+            logger.warning(f"{num_tarefas} tarefas interrompidas marcadas como falhadas")
+        return num_tarefas
+
+    def despachar(self):
+        """Arranca tarefas pendentes enquanto houver workers livres; devolve quantas arrancaram"""
+        arrancadas = 0
+        with self._lock:
+            while not self._a_terminar and len(self._em_execucao) < self.max_workers:
+                tarefa = self._reclamar_proxima()
+                if tarefa is None:
+                    break
+                parar = threading.Event()
+                self._em_execucao[tarefa['id']] = (tarefa['valencia'], parar)
+                self._obter_executor().submit(self._executar, tarefa, parar)
+                arrancadas += 1
+        return arrancadas
+
+    def _reclamar_proxima(self):
+        """Escolhe a próxima tarefa pendente (fila justa por valência) e marca-a como em execução.
+
+        Devolve None se não houver tarefas pendentes ou se já houver max_workers gerações em
+        curso, contando as de todos os processos.
+        """
+        tabela = TarefaGeracao.__table__
+        outras = tabela.alias('em_curso')
+        total_em_curso = select(func.count()).select_from(outras).where(
+            outras.c.estado.in_(ESTADOS_EM_CURSO)
+        ).scalar_subquery()
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                em_curso = contar_em_curso(conn)
+                if sum(em_curso.values()) >= self.max_workers:
+                    return None
+                pendentes = conn.execute(
+                    select(tabela.c.id, tabela.c.valencia, tabela.c.mes, tabela.c.ano, tabela.c.arranque_quente,
+                           tabela.c.perfil_solver, tabela.c.reparacao, tabela.c.diagnostico)
+                    .where(tabela.c.estado == ESTADO_PENDENTE)
+                    .order_by(tabela.c.criada_em)
+                ).mappings().all()
+                for tarefa in ordem_fila(pendentes, em_curso):
+                    # Só um processo consegue passar a tarefa de pendente a em execução, e só
+                    # enquanto houver menos de max_workers em curso (a contagem é feita no próprio UPDATE)
+                    resultado = conn.execute(tabela.update().where(
+                        tabela.c.id == tarefa['id'], tabela.c.estado == ESTADO_PENDENTE,
+                        total_em_curso < self.max_workers
+                    ).values(estado=ESTADO_EM_EXECUCAO, fase='a iniciar', iniciada_em=datetime.now()))
+                    if resultado.rowcount:
+                        return dict(tarefa)
+                    if conn.execute(select(total_em_curso)).scalar() >= self.max_workers:
+                        return None
+        return None
+
+    def propagar_cancelamentos(self):
+        """Interrompe as gerações deste processo cujo cancelamento (ou aceitação) foi pedido na base de dados"""
+        with self._lock:
+            ids = list(self._em_execucao)
+        if not ids:
+            return
+        with self.app.app_context():
+            a_cancelar = db.session.query(TarefaGeracao.id).filter(
+                TarefaGeracao.id.in_(ids), TarefaGeracao.estado.in_([ESTADO_A_CANCELAR, ESTADO_A_ACEITAR])
+            ).all()
+            db.session.remove()
+        with self._lock:
+            for (tarefa_id,) in a_cancelar:
+                if tarefa_id in self._em_execucao:
+                    self._em_execucao[tarefa_id][1].set()
+
+    def servir(self, intervalo=0.5, parar=None):
+        """Ciclo do serviço de geração: arranca tarefas da fila e propaga cancelamentos até parar ser ativado.
+
+        No fim espera que as gerações em curso terminem.
+        """
+        parar = parar or threading.Event()
+        logger.info(f"Serviço de geração: {self.max_workers} gerações × {self.threads_por_geracao} threads")
+        while not parar.is_set():
+            self.propagar_cancelamentos()
+            self.despachar()
+            parar.wait(intervalo)
+        with self._lock:
+            self._a_terminar = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def _executar(self, tarefa, parar):
+        """Corre numa thread do pool: gera, guarda e regista o resultado"""
+        tarefa_id = tarefa['id']
+        mes, ano, valencia = tarefa['mes'], tarefa['ano'], tarefa['valencia']
+        with self.app.app_context():
+            # As atualizações usam o engine diretamente porque o callback do
+            # solver pode ser chamado a partir das threads internas do CP-SAT
+            engine = db.engine
+            tabela = TarefaGeracao.__table__
+            ultima_escrita = [0.0]
+            ultima_solucao = {}
+
+            def atualizar(**campos):
+                with engine.begin() as conn:
+                    conn.execute(tabela.update().where(tabela.c.id == tarefa_id).values(**campos))
+
+            def estado_atual():
+                with engine.connect() as conn:
+                    return conn.execute(select(tabela.c.estado).where(tabela.c.id == tarefa_id)).scalar()
+
+            def progresso(fase, dados):
+                if 'solucoes' not in dados:
+                    atualizar(fase=fase)
+                    return
+                ultima_solucao.update(melhor_objetivo=dados['objetivo'], gap=dados['gap'],
+                                      solucoes_encontradas=dados['solucoes'])
+                agora = time.monotonic()
+                if agora - ultima_escrita[0] < self.intervalo_progresso and dados['solucoes'] > 1:
+                    return
+                ultima_escrita[0] = agora
+                # A atribuição só é extraída quando vai ser publicada
+                campos = dict(ultima_solucao)
+                if 'escalas' in dados:
+                    campos['melhor_solucao'] = json.dumps(
+                        [[f_id, dia.isoformat(), turno_id] for f_id, dia, turno_id in dados['escalas']()],
+                        separators=(',', ':')
+                    )
+                atualizar(fase=fase, **campos)
+
+            try:
+                otimizador = OtimizadorMensal(mes, ano, valencia, callback_progresso=progresso,
+                                              arranque_quente=tarefa.get('arranque_quente'))
+                otimizador.parar = parar
+                # O perfil escolhe as threads, mas sem passar da parte desta geração no pool
+                perfil_solver, parametros = obter_perfil(tarefa.get('perfil_solver'), valencia)
+                otimizador.perfil_solver = perfil_solver
+                otimizador.parametros_solver['num_workers'] = min(parametros['num_workers'] or self.threads_por_geracao,
+                                                                  self.threads_por_geracao)
+                atualizar(perfil_solver=perfil_solver)
+                if tarefa.get('reparacao'):
+                    self._reparar(otimizador, json.loads(tarefa['reparacao']), atualizar, estado_atual)
+                    return
+                if tarefa.get('diagnostico'):
+                    self._diagnosticar(otimizador, atualizar)
+                    return
+                melhor_escala = otimizador.gerar_escala_mensal_completa()
+                atualizar(estatisticas=json.dumps(otimizador.estatisticas, default=str))
+
+                estado = estado_atual()
+                if estado == ESTADO_A_CANCELAR:
+                    atualizar(estado=ESTADO_CANCELADA, fase='terminada', terminada_em=datetime.now(),
+                              mensagem='Geração cancelada.')
+                    return
+
+                if melhor_escala is None:
+                    diagnostico = otimizador.estatisticas.get('diagnostico')
+                    if diagnostico:
+                        mensagem = 'Escala impossível: ' + '; '.join(diagnostico) + '.'
+                    elif otimizador.estatisticas.get('interrompida'):
+                        mensagem = 'A procura foi interrompida antes de encontrar uma solução.'
+                    else:
+                        mensagem = 'Erro ao gerar escala. Verifique se há funcionários e turnos suficientes.'
+                    campos = {}
+                    if otimizador.alternativa:
+                        # A escala heurística parcial fica na tarefa; só é gravada se o utilizador a aceitar
+                        campos['melhor_solucao'] = json.dumps(
+                            [[e['funcionario_id'], e['data'].isoformat(), e['turno_id']] for e in otimizador.alternativa],
+                            separators=(',', ':')
+                        )
+                        em_falta = otimizador.estatisticas['alternativa']['em_falta']
+                        mensagem += (f' Há uma escala heurística parcial ({em_falta} turno(s) por preencher) '
+                                     f'que pode ser aceite.')
+                        campos['estatisticas'] = json.dumps(otimizador.estatisticas, default=str)
+                    atualizar(estado=ESTADO_FALHOU, fase='terminada', terminada_em=datetime.now(), mensagem=mensagem,
+                              **campos)
+                    return
+
+                resumo = otimizador.salvar_escala_otimizada(melhor_escala)
+                atualizar(estatisticas=json.dumps(otimizador.estatisticas, default=str))
+                if resumo is None:
+                    atualizar(estado=ESTADO_FALHOU, fase='terminada', terminada_em=datetime.now(),
+                              mensagem='Erro ao salvar a escala otimizada.')
+                else:
+                    alteracoes = (f'({resumo["inseridas"]} inseridas, {resumo["removidas"]} removidas, '
+                                  f'{resumo["inalteradas"]} inalteradas)')
+                    aceite = ' (solução aceite antes do fim da procura)' if estado == ESTADO_A_ACEITAR else ''
+                    mensagem = f'Escala mensal gerada e salva com sucesso para {valencia}{aceite}! {alteracoes}'
+                    atualizar(estado=ESTADO_CONCLUIDA, fase='terminada', terminada_em=datetime.now(),
+                              mensagem=mensagem, **ultima_solucao)
+            except Exception as e:
+                logger.error(f"Erro na tarefa {tarefa_id}: {str(e)}")
+                atualizar(estado=ESTADO_FALHOU, fase='terminada', terminada_em=datetime.now(),
+                          mensagem=f'Erro inesperado ao gerar escala: {str(e)}')
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._em_execucao.pop(tarefa_id, None)
+                # Um worker ficou livre: arrancar a próxima tarefa da fila
+                self.despachar()
+
+    def _diagnosticar(self, otimizador, atualizar):
+        """Corre o diagnóstico do mês de uma tarefa e regista as mensagens nas estatísticas"""
+        inicio = time.perf_counter()
+        mensagens = otimizador.diagnosticar()
+        otimizador.estatisticas.update(diagnostico=mensagens, tempo_diagnostico=time.perf_counter() - inicio)
+        if mensagens:
+            mensagem = 'Escala impossível: ' + '; '.join(mensagens) + '.'
+        else:
+            mensagem = 'Não foi encontrado nenhum motivo para o mês não ter solução.'
+        atualizar(estado=ESTADO_CONCLUIDA, fase='terminada', terminada_em=datetime.now(), mensagem=mensagem,
+                  estatisticas=json.dumps(otimizador.estatisticas, default=str))
+
+    def _reparar(self, otimizador, reparacao, atualizar, estado_atual):
+        """Corre a reparação local de uma tarefa e regista o resultado"""
+        mes, ano = otimizador.mes, otimizador.ano
+        resumo = otimizador.reparar_escala(
+            reparacao['funcionario_id'],
+            datetime.strptime(reparacao['data_inicio'], '%Y-%m-%d').date(),
+            datetime.strptime(reparacao['data_fim'], '%Y-%m-%d').date()
+        )
+        atualizar(estatisticas=json.dumps(otimizador.estatisticas, default=str))
+        if estado_atual() == ESTADO_A_CANCELAR:
+            atualizar(estado=ESTADO_CANCELADA, fase='terminada', terminada_em=datetime.now(),
+                      mensagem='Reparação cancelada.')
+        elif resumo is None:
+            diagnostico = otimizador.estatisticas.get('diagnostico')
+            if diagnostico:
+                mensagem = f'A escala de {mes}/{ano} deixou de ser possível: {"; ".join(diagnostico)}.'
+            else:
+                mensagem = f'Não foi possível reparar a escala de {mes}/{ano}. Gere novamente a escala do mês.'
+            atualizar(estado=ESTADO_FALHOU, fase='terminada', terminada_em=datetime.now(), mensagem=mensagem)
+        else:
+            atualizar(estado=ESTADO_CONCLUIDA, fase='terminada', terminada_em=datetime.now(),
+                      mensagem=(f'Escala de {mes}/{ano} reparada: {resumo["inseridas"]} turnos atribuídos, '
+                                f'{resumo["removidas"]} removidos, {resumo["inalteradas"]} inalterados.'))
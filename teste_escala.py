@@ -6,6 +6,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from otimizador_mensal import OtimizadorMensal
+from folgas import analisar_folgas
 from datetime import datetime
 
 def testar_geracao_escala():
@@ -49,20 +50,7 @@ def testar_geracao_escala():
                 print(f"\n{funcionario.nome}: {len(folgas_funcionario)} folgas")
                 
                 # Verificar pares
-                pares = []
-                folgas_isoladas = []
-                i = 0
-                while i < len(folgas_funcionario):
-                    if i + 1 < len(folgas_funcionario):
-                        if (folgas_funcionario[i+1] - folgas_funcionario[i]).days == 1:
-                            pares.append((folgas_funcionario[i], folgas_funcionario[i+1]))
-                            i += 2
-                        else:
-                            folgas_isoladas.append(folgas_funcionario[i])
-                            i += 1
-                    else:
-                        folgas_isoladas.append(folgas_funcionario[i])
-                        i += 1
+                pares, folgas_isoladas = analisar_folgas(folgas_funcionario)
                 
                 print(f"  Pares de folgas: {len(pares)}")
                 for par in pares:
@@ -100,20 +88,7 @@ def testar_geracao_escala():
                     print(f"\n{funcionario.nome}: {len(folgas_finais)} folgas finais")
                     
                     # Verificar pares
-                    pares = []
-                    folgas_isoladas = []
-                    i = 0
-                    while i < len(folgas_finais):
-                        if i + 1 < len(folgas_finais):
-                            if (folgas_finais[i+1] - folgas_finais[i]).days == 1:
-                                pares.append((folgas_finais[i], folgas_finais[i+1]))
-                                i += 2
-                            else:
-                                folgas_isoladas.append(folgas_finais[i])
-                                i += 1
-                        else:
-                            folgas_isoladas.append(folgas_finais[i])
-                            i += 1
+                    pares, folgas_isoladas = analisar_folgas(folgas_finais)
                     
                     print(f"  Pares de folgas: {len(pares)}")
                     for par in pares:
@@ -0,0 +1,23 @@
+"""Configuração comum dos testes: a aplicação usa uma base de dados SQLite temporária."""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tem de estar definido antes do primeiro import da aplicação (config.py lê-o nessa altura)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='escalas_testes_'), 'escalas.db')
+
+@pytest.fixture
+def app():
+    """Aplicação com as tabelas criadas (e apagadas no fim do teste), dentro do contexto"""
+    from app import app
+    from models import db
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
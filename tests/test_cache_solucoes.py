@@ -0,0 +1,21 @@
+"""Impressão digital dos dados de entrada do solver (chave da cache de soluções)."""
+
+from benchmark_escalas import instancia_sintetica
+from cache_solucoes import impressao_digital
+from escalonador import matriz_disponibilidade
+from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+
+def chave(parametros):
+    funcionarios, turnos, dias, restricoes, procura = instancia_sintetica(21, 28)
+    disponibilidade = matriz_disponibilidade(funcionarios, dias, restricoes)
+    return impressao_digital(funcionarios, turnos, dias, disponibilidade, procura,
+                             SEQUENCIAS_PROIBIDAS, parametros=parametros)
+
+def test_threads_nao_mudam_a_chave():
+    parametros = {'tempo_limite': 60.0, 'gap_relativo': 0.0, 'num_workers': 8}
+    assert chave(parametros) == chave(dict(parametros, num_workers=2)) == chave(dict(parametros, num_workers=None))
+
+def test_parametros_do_resultado_mudam_a_chave():
+    parametros = {'tempo_limite': 60.0, 'gap_relativo': 0.0, 'num_workers': 8}
+    assert chave(parametros) != chave(dict(parametros, gap_relativo=0.05))
+    assert chave(parametros) != chave(dict(parametros, equipas=2))
@@ -0,0 +1,306 @@
+"""Validação das escalas geradas pelas várias variantes do solver.
+
+Uso:
+    python -m pytest -q tests
+
+As escalas passam todas pelo mesmo validador, que verifica as regras diretamente
+sobre a lista de escalas, sem usar o modelo CP-SAT.
+"""
+
+import os
+import sys
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gerar_lote
+from benchmark_escalas import instancia_sintetica
+from decomposicao import gerar_escala_decomposta, particionar_equipas
+from escalonador import (classes_equivalencia, construir_modelo, diagnosticar_inviabilidade, gerar_escala_ortools,
+                         matriz_disponibilidade, MAX_DIAS_CONSECUTIVOS)
+from heuristica import gerar_escala_heuristica
+from otimizador_mensal import SEQUENCIAS_PROIBIDAS
+from viabilidade import verificar_viabilidade
+
+TEMPO_LIMITE = 20.0
+
+def validar_escala(escalas, funcionarios, turnos, dias, restricoes, turnos_necessarios_por_dia,
+                   sequencias_proibidas, fronteira=None, dias_previsao=0, vagas=None):
+    """Devolve a lista de regras violadas pela escala (vazia se for válida).
+
+    Com vagas (resultado da heurística) a cobertura tem de bater certo contando os turnos
+    por preencher, e o equilíbrio não é verificado.
+    """
+    erros = []
+    disponibilidade = matriz_disponibilidade(funcionarios, dias, restricoes)
+    posicao = {funcionario['id']: f for f, funcionario in enumerate(funcionarios)}
+    indice_dia = {dia: d for d, dia in enumerate(dias)}
+    letra = {turno['id']: turno['nome'][0].upper() for turno in turnos}
+    proibidas = set(sequencias_proibidas)
+
+    # Um turno por funcionário e por dia, só em dias disponíveis
+    por_funcionario = defaultdict(dict)
+    for escala in escalas:
+        f, d = posicao[escala['funcionario_id']], indice_dia[escala['data']]
+        if d in por_funcionario[f]:
+            erros.append(f"{funcionarios[f]['nome']} tem dois turnos em {escala['data']}")
+        por_funcionario[f][d] = escala['turno_id']
+        if not disponibilidade[f, d]:
+            erros.append(f"{funcionarios[f]['nome']} trabalha em {escala['data']}, que não está disponível")
+
+    # Cobertura exata (ou com as vagas declaradas pela heurística)
+    cobertura = Counter((escala['data'], escala['turno_id']) for escala in escalas)
+    em_falta = Counter({(vaga['data'], vaga['turno_id']): vaga['em_falta'] for vaga in vagas or ()})
+    for dia in dias:
+        for t, turno in enumerate(turnos):
+            if cobertura[dia, turno['id']] + em_falta[dia, turno['id']] != turnos_necessarios_por_dia[dia][t]:
+                erros.append(f"{turno['nome']} em {dia}: {cobertura[dia, turno['id']]} de "
+                             f"{turnos_necessarios_por_dia[dia][t]} (vagas declaradas: {em_falta[dia, turno['id']]})")
+
+    # Sequências proibidas e dias consecutivos, a contar com a véspera do período
+    fronteira = fronteira or {}
+    for f, funcionario in enumerate(funcionarios):
+        dias_seguidos, turno_anterior = fronteira.get(funcionario['id'], (0, None))
+        for d in range(len(dias)):
+            turno = por_funcionario[f].get(d)
+            if turno is None:
+                dias_seguidos, turno_anterior = 0, None
+                continue
+            dias_seguidos += 1
+            if dias_seguidos > MAX_DIAS_CONSECUTIVOS:
+                erros.append(f"{funcionario['nome']} trabalha {dias_seguidos} dias seguidos até {dias[d]}")
+            if turno_anterior is not None and (letra[turno_anterior], letra[turno]) in proibidas:
+                erros.append(f"{funcionario['nome']}: {letra[turno_anterior]}→{letra[turno]} em {dias[d]}")
+            turno_anterior = turno
+
+    # Equilíbrio obrigatório, só nos dias contados
+    if vagas is None:
+        dias_contados = len(dias) - dias_previsao
+        total_turnos = sum(sum(turnos_necessarios_por_dia[dia]) for dia in dias[:dias_contados])
+        min_turnos = total_turnos // len(funcionarios)
+        for f, funcionario in enumerate(funcionarios):
+            total = sum(1 for d in por_funcionario[f] if d < dias_contados)
+            if not min_turnos <= total <= min_turnos + 1:
+                erros.append(f"{funcionario['nome']} tem {total} turnos (devia ter {min_turnos} ou {min_turnos + 1})")
+    return erros
+
+@pytest.fixture(scope='module')
+def instancia():
+    return instancia_sintetica(21, 28)
+
+def fronteira_parcial(funcionarios):
+    """Um em cada quatro chega ao período com dois dias seguidos e Tarde na véspera"""
+    return {funcionario['id']: (2, 3) for funcionario in funcionarios[::4]}
+
+@pytest.mark.parametrize('esparso', [True, False])
+@pytest.mark.parametrize('codificacao_sequencias', ['clausulas', 'automato'])
+def test_variantes_do_modelo(instancia, esparso, codificacao_sequencias):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    escalas = gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                   tempo_limite=TEMPO_LIMITE, esparso=esparso,
+                                   codificacao_sequencias=codificacao_sequencias)
+    assert escalas is not None
+    assert validar_escala(escalas, funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS) == []
+
+def test_modelo_esparso_sem_variaveis_indisponiveis(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    disponibilidade = matriz_disponibilidade(funcionarios, dias, restricoes)
+    _, x = construir_modelo(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS)
+    assert all(disponibilidade[f, d] for f, d, _ in x)
+    assert len(x) == int(disponibilidade.sum()) * len(turnos)
+
+@pytest.mark.parametrize('codificacao_sequencias', ['clausulas', 'automato'])
+def test_sequencia_proibida_torna_inviavel(codificacao_sequencias):
+    funcionarios = [{'id': 1, 'nome': 'F1'}]
+    turnos = [{'id': 1, 'nome': 'Manhã'}, {'id': 4, 'nome': 'Noite'}]
+    dias = [date(2025, 8, 1), date(2025, 8, 2)]
+    disponibilidade = np.ones((1, 2), dtype=bool)
+    # Noite seguida de Manhã é a única forma de cobrir os dois dias
+    necessarios = {dias[0]: [0, 1], dias[1]: [1, 0]}
+    for sequencias, viavel in (([], True), (SEQUENCIAS_PROIBIDAS, False)):
+        escalas = gerar_escala_ortools(funcionarios, turnos, dias, disponibilidade, necessarios, sequencias,
+                                       tempo_limite=TEMPO_LIMITE, codificacao_sequencias=codificacao_sequencias,
+                                       diagnosticar=False)
+        assert (escalas is not None) == viavel
+
+def test_pre_verificacao_aceita_instancia_viavel(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    assert verificar_viabilidade(funcionarios, dias, restricoes, necessarios)['viavel']
+
+def test_pre_verificacao_rejeita_dia_sem_cobertura():
+    funcionarios = [{'id': i, 'nome': f'F{i}'} for i in range(1, 4)]
+    dias = [date(2025, 8, 1) + timedelta(days=i) for i in range(3)]
+    necessarios = {dia: [2] for dia in dias}
+    disponibilidade = np.ones((3, 3), dtype=bool)
+    disponibilidade[:2, 1] = False
+    resultado = verificar_viabilidade(funcionarios, dias, disponibilidade, necessarios)
+    assert not resultado['viavel']
+    assert resultado['dias_em_falta'] == {dias[1]: 1}
+
+def test_pre_verificacao_rejeita_minimo_de_turnos():
+    funcionarios = [{'id': i, 'nome': f'F{i}'} for i in range(1, 3)]
+    dias = [date(2025, 8, 1) + timedelta(days=i) for i in range(4)]
+    necessarios = {dia: [1] for dia in dias}
+    disponibilidade = np.ones((2, 4), dtype=bool)
+    disponibilidade[0, 1:] = False
+    resultado = verificar_viabilidade(funcionarios, dias, disponibilidade, necessarios)
+    assert not resultado['viavel']
+    assert any('F1' in motivo for motivo in resultado['motivos'])
+
+def test_pre_verificacao_rejeita_pelo_fluxo():
+    # Cada dia e cada funcionário passam sozinhos, mas F1 e F2 disputam o único turno do dia 1
+    funcionarios = [{'id': i, 'nome': f'F{i}'} for i in range(1, 4)]
+    dias = [date(2025, 8, 1) + timedelta(days=i) for i in range(3)]
+    necessarios = {dia: [1] for dia in dias}
+    disponibilidade = np.ones((3, 3), dtype=bool)
+    disponibilidade[:2, 1:] = False
+    resultado = verificar_viabilidade(funcionarios, dias, disponibilidade, necessarios)
+    assert not resultado['viavel']
+    assert resultado['dias_em_falta'] == {}
+
+@pytest.mark.parametrize('codificacao_sequencias', ['clausulas', 'automato'])
+def test_fronteira(instancia, codificacao_sequencias):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    fronteira = fronteira_parcial(funcionarios)
+    escalas = gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                   tempo_limite=TEMPO_LIMITE, fronteira=fronteira,
+                                   codificacao_sequencias=codificacao_sequencias)
+    assert escalas is not None
+    assert validar_escala(escalas, funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                          fronteira=fronteira) == []
+
+def janela_com_previsao():
+    """Janela de 30 dias + 7 de previsão em que F1 só está disponível nos dias 10 a 29 dos contados"""
+    funcionarios = [{'id': i, 'nome': f'F{i}'} for i in range(1, 6)]
+    turnos = [{'id': 10, 'nome': 'Manhã'}]
+    dias = [date(2025, 8, 1) + timedelta(days=i) for i in range(37)]
+    necessarios = {dia: [3] for dia in dias}
+    disponibilidade = np.ones((5, 37), dtype=bool)
+    disponibilidade[0, :10] = False
+    disponibilidade[0, 30:] = False
+    return funcionarios, turnos, dias, disponibilidade, necessarios
+
+def test_pre_verificacao_conta_so_os_dias_contados():
+    """Regressão: os dias de previsão não entram no mínimo de turnos da pré-verificação"""
+    funcionarios, turnos, dias, disponibilidade, necessarios = janela_com_previsao()
+    assert not verificar_viabilidade(funcionarios, dias, disponibilidade, necessarios)['viavel']
+    assert verificar_viabilidade(funcionarios, dias, disponibilidade, necessarios, dias_previsao=7)['viavel']
+
+    escalas = gerar_escala_ortools(funcionarios, turnos, dias, disponibilidade, necessarios, [],
+                                   tempo_limite=TEMPO_LIMITE, dias_previsao=7)
+    assert escalas is not None
+    assert validar_escala(escalas, funcionarios, turnos, dias, disponibilidade, necessarios, [],
+                          dias_previsao=7) == []
+    assert diagnosticar_inviabilidade(funcionarios, turnos, dias, disponibilidade, necessarios, [],
+                                      dias_previsao=7) == []
+
+def test_lote_gera_meses_da_valencia_por_ordem(monkeypatch):
+    gerados = []
+    monkeypatch.setattr(gerar_lote, 'gerar_par',
+                        lambda valencia, mes, ano, *args: gerados.append((ano, mes)) or (ano, mes))
+    resumos = gerar_lote.gerar_valencia('Lar', [(2, 2026), (11, 2025), (1, 2026), (12, 2025)], threads=1)
+    assert gerados == resumos == [(2025, 11), (2025, 12), (2026, 1), (2026, 2)]
+
+def test_classes_de_equivalencia():
+    funcionarios = [{'id': i, 'nome': f'F{i}'} for i in range(1, 7)]
+    disponibilidade = np.ones((6, 3), dtype=bool)
+    disponibilidade[5, 0] = False
+    # F1..F4 seriam intermutáveis, mas F3 tem fronteira e F4 uma célula fixa; F6 tem outra disponibilidade
+    classes = classes_equivalencia(funcionarios, disponibilidade, fronteira={3: (1, 1)},
+                                   fixas={(4, date(2025, 8, 1)): 1})
+    assert classes == [[0, 1, 4]]
+
+def test_quebra_de_simetrias(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    estatisticas = {}
+    escalas = gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                   tempo_limite=TEMPO_LIMITE, quebrar_simetrias=True, estatisticas=estatisticas)
+    assert escalas is not None
+    assert estatisticas['simetrias']['classes'] > 0
+    assert validar_escala(escalas, funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS) == []
+
+    # Dentro de cada classe as linhas (0 = folga, t+1 = turno t) ficam por ordem lexicográfica decrescente
+    rotulo_turno = {turno['id']: t + 1 for t, turno in enumerate(turnos)}
+    linhas = defaultdict(lambda: [0] * len(dias))
+    for escala in escalas:
+        linhas[escala['funcionario_id']][dias.index(escala['data'])] = rotulo_turno[escala['turno_id']]
+    disponibilidade = matriz_disponibilidade(funcionarios, dias, restricoes)
+    for classe in classes_equivalencia(funcionarios, disponibilidade):
+        ordenadas = [linhas[funcionarios[f]['id']] for f in classe]
+        assert ordenadas == sorted(ordenadas, reverse=True)
+
+def test_particao_em_equipas():
+    funcionarios = [{'id': i, 'nome': f'F{i}'} for i in range(1, 8)]
+    disponibilidade = np.ones((7, 3), dtype=bool)
+    particao = particionar_equipas(funcionarios, disponibilidade, 3, equipas={1: 'Piso 1', 2: 'Piso 1'})
+    # A equipa configurada fica inteira; os restantes cinco dividem-se pelas outras duas
+    assert particao[0] == [0, 1]
+    assert sorted(len(grupo) for grupo in particao[1:]) == [2, 3]
+    assert sorted(f for grupo in particao for f in grupo) == list(range(7))
+
+def test_decomposicao(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    fronteira = fronteira_parcial(funcionarios)
+    estatisticas = {}
+    escalas = gerar_escala_decomposta(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                      n_equipas=2, estatisticas=estatisticas, tempo_limite=TEMPO_LIMITE,
+                                      fronteira=fronteira)
+    assert escalas is not None
+    assert len(estatisticas['decomposicao']['equipas']) == 2
+    assert validar_escala(escalas, funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                          fronteira=fronteira) == []
+
+def test_decomposicao_inviavel_diagnostica_uma_vez(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    # Todos chegam com MAX_DIAS_CONSECUTIVOS dias seguidos: ninguém pode trabalhar no primeiro dia
+    fronteira = {funcionario['id']: (MAX_DIAS_CONSECUTIVOS, 1) for funcionario in funcionarios}
+    estatisticas = {}
+    escalas = gerar_escala_decomposta(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                      n_equipas=2, estatisticas=estatisticas, tempo_limite=TEMPO_LIMITE,
+                                      fronteira=fronteira)
+    assert escalas is None
+    # A alocação já é inviável, por isso nenhuma subequipa é resolvida; só o modelo completo diagnostica
+    assert estatisticas['decomposicao']['equipas'] == []
+    assert any('dias seguidos' in mensagem for mensagem in estatisticas['diagnostico'])
+
+def test_heuristica(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    escalas, vagas = gerar_escala_heuristica(funcionarios, turnos, dias, restricoes, necessarios,
+                                             SEQUENCIAS_PROIBIDAS, tempo_limite=1.0)
+    assert escalas
+    assert validar_escala(escalas, funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                          vagas=vagas) == []
+
+def test_heuristica_com_vagas(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    # Procura impossível de cobrir: a heurística deixa vagas, mas o que atribui continua válido
+    necessarios = {dia: [n + 3 for n in procura] for dia, procura in necessarios.items()}
+    escalas, vagas = gerar_escala_heuristica(funcionarios, turnos, dias, restricoes, necessarios,
+                                             SEQUENCIAS_PROIBIDAS, tempo_limite=1.0)
+    assert vagas
+    assert validar_escala(escalas, funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                          vagas=vagas) == []
+
+def test_diagnostico_com_fronteira():
+    funcionarios = [{'id': 1, 'nome': 'F1'}]
+    turnos = [{'id': 10, 'nome': 'Manhã'}]
+    dias = [date(2025, 8, 1) + timedelta(days=i) for i in range(3)]
+    necessarios = {dia: [1] for dia in dias}
+    disponibilidade = np.ones((1, 3), dtype=bool)
+    assert diagnosticar_inviabilidade(funcionarios, turnos, dias, disponibilidade, necessarios, []) == []
+    mensagens = diagnosticar_inviabilidade(funcionarios, turnos, dias, disponibilidade, necessarios, [],
+                                           fronteira={1: (MAX_DIAS_CONSECUTIVOS, 10)})
+    assert any('dias seguidos' in mensagem for mensagem in mensagens)
+
+def test_validador_deteta_violacoes(instancia):
+    funcionarios, turnos, dias, restricoes, necessarios = instancia
+    escalas = gerar_escala_ortools(funcionarios, turnos, dias, restricoes, necessarios, SEQUENCIAS_PROIBIDAS,
+                                   tempo_limite=TEMPO_LIMITE)
+    # Trocar o turno de uma célula estraga a cobertura desse dia
+    alterada = dict(escalas[0], turno_id=next(t['id'] for t in turnos if t['id'] != escalas[0]['turno_id']))
+    assert validar_escala([alterada] + escalas[1:], funcionarios, turnos, dias, restricoes, necessarios,
+                          SEQUENCIAS_PROIBIDAS)
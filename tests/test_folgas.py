@@ -0,0 +1,33 @@
+"""Ajuste das folgas para haver funcionários suficientes em cada dia."""
+
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from otimizador_mensal import OtimizadorMensal
+
+DIAS = [date(2025, 8, 4) + timedelta(days=i) for i in range(10)]
+# Folgas de cada funcionário (índices em DIAS); os dias 0 e 5 precisam de 5 funcionários e os outros de 4
+FOLGAS = {1: [0, 1, 5], 2: [0, 3, 4, 7], 3: [0, 5, 6], 4: [1, 2, 5, 9], 5: [5, 8], 6: [0, 9]}
+# Resultado da implementação original (percurso dia a dia com sort), calculado sobre este mesmo exemplo:
+# saem primeiro as folgas isoladas de quem tem mais folgas, ficam as que fazem par
+FOLGAS_AJUSTADAS = {1: [0, 1], 2: [3, 4, 7], 3: [5, 6], 4: [1, 2, 9], 5: [8], 6: [9]}
+
+def test_ajuste_de_folgas_igual_ao_original():
+    otimizador = OtimizadorMensal(8, 2025, 'Teste')
+    otimizador.funcionarios = [SimpleNamespace(id=funcionario_id, nome=f'F{funcionario_id}') for funcionario_id in FOLGAS]
+    otimizador.dias = DIAS
+    otimizador.disponibilidade = np.ones((len(FOLGAS), len(DIAS)), dtype=bool)
+    for f, folgas in enumerate(FOLGAS.values()):
+        otimizador.disponibilidade[f, folgas] = False
+    necessarios = {dia: 5 if d in (0, 5) else 4 for d, dia in enumerate(DIAS)}
+
+    otimizador.ajustar_folgas_para_preenchimento(necessarios)
+
+    ajustadas = {
+        funcionario.id: np.flatnonzero(~otimizador.disponibilidade[f]).tolist()
+        for f, funcionario in enumerate(otimizador.funcionarios)
+    }
+    assert ajustadas == FOLGAS_AJUSTADAS
+    assert otimizador.estatisticas['folgas_removidas'] == 6
@@ -0,0 +1,68 @@
+"""Gravação por diferenças das escalas do mês (salvar_escala_otimizada / salvar_diferencas)."""
+
+from datetime import date, timedelta
+
+from models import db, Escala
+from otimizador_mensal import OtimizadorMensal
+
+VALENCIA = 'Teste'
+
+def escalas_do_mes(mes, ano, turnos):
+    """Uma escala por (funcionário, dia) a partir de {(funcionario_id, dia do mês): turno_id}"""
+    return [{'funcionario_id': funcionario_id, 'data': date(ano, mes, dia), 'turno_id': turno_id}
+            for (funcionario_id, dia), turno_id in turnos.items()]
+
+def guardadas():
+    """{(funcionario_id, data): (id, turno_id)} de todas as escalas na base de dados"""
+    return {(e.funcionario_id, e.data): (e.id, e.turno_id) for e in Escala.query.filter_by(valencia=VALENCIA)}
+
+def test_so_grava_as_celulas_alteradas(app):
+    otimizador = OtimizadorMensal(8, 2025, VALENCIA)
+    turnos = {(funcionario_id, dia): 1 + (funcionario_id + dia) % 3 for funcionario_id in (1, 2, 3) for dia in (1, 2, 3)}
+    assert otimizador.salvar_escala_otimizada(escalas_do_mes(8, 2025, turnos))['inseridas'] == 9
+    antes = guardadas()
+
+    turnos[1, 1] = 4           # turno alterado
+    del turnos[2, 2]           # deixa de trabalhar
+    turnos[3, 4] = 1           # novo dia de trabalho
+    resumo = otimizador.salvar_escala_otimizada(escalas_do_mes(8, 2025, turnos))
+    assert (resumo['inseridas'], resumo['removidas'], resumo['inalteradas']) == (2, 2, 7)
+
+    depois = guardadas()
+    assert {chave: turno_id for chave, (_, turno_id) in depois.items()} == {
+        (funcionario_id, date(2025, 8, dia)): turno_id for (funcionario_id, dia), turno_id in turnos.items()
+    }
+    # As linhas inalteradas são as mesmas (não foram apagadas e inseridas de novo)
+    for chave, (escala_id, turno_id) in antes.items():
+        if chave in depois and depois[chave][1] == turno_id:
+            assert depois[chave][0] == escala_id
+
+def test_dezembro_nao_toca_em_janeiro(app):
+    janeiro = escalas_do_mes(1, 2026, {(1, 1): 2})
+    OtimizadorMensal(1, 2026, VALENCIA).salvar_escala_otimizada(janeiro)
+    dezembro = OtimizadorMensal(12, 2025, VALENCIA)
+    assert dezembro.limites_mes() == (date(2025, 12, 1), date(2025, 12, 31))
+
+    escalas = escalas_do_mes(12, 2025, {(1, 1): 1, (1, 31): 3})
+    assert dezembro.salvar_escala_otimizada(escalas)['inseridas'] == 2
+    assert dezembro.salvar_escala_otimizada(escalas)['inalteradas'] == 2
+    assert set(dezembro.carregar_escala_existente()) == {(1, date(2025, 12, 1)), (1, date(2025, 12, 31))}
+    assert guardadas()[1, date(2026, 1, 1)][1] == 2
+
+def test_duplicadas_guardadas_sao_apagadas(app):
+    otimizador = OtimizadorMensal(8, 2025, VALENCIA)
+    dia = date(2025, 8, 1)
+    db.session.add_all([Escala(funcionario_id=1, turno_id=turno_id, data=dia, valencia=VALENCIA) for turno_id in (1, 2)])
+    db.session.commit()
+
+    resumo = otimizador.salvar_escala_otimizada([{'funcionario_id': 1, 'data': dia, 'turno_id': 1}])
+    assert (resumo['inseridas'], resumo['removidas'], resumo['inalteradas']) == (0, 1, 1)
+    assert Escala.query.filter_by(valencia=VALENCIA).count() == 1
+
+def test_escala_nova_com_duplicadas_e_recusada(app):
+    otimizador = OtimizadorMensal(8, 2025, VALENCIA)
+    dia = date(2025, 8, 1)
+    escalas = [{'funcionario_id': 1, 'data': dia, 'turno_id': 1}, {'funcionario_id': 1, 'data': dia, 'turno_id': 2},
+               {'funcionario_id': 2, 'data': dia + timedelta(days=1), 'turno_id': 1}]
+    assert otimizador.salvar_escala_otimizada(escalas) is None
+    assert Escala.query.filter_by(valencia=VALENCIA).count() == 0
@@ -0,0 +1,18 @@
+"""Índices das consultas frequentes: criados pela migração e usados pelo SQLite."""
+
+from sqlalchemy import text
+
+from migracoes import aplicar_indices, verificar_planos
+from models import db
+
+def test_consultas_frequentes_sem_full_scan(app):
+    # Base de dados anterior aos índices: as tabelas existem, os índices não
+    indices = [indice for tabela in db.metadata.sorted_tables for indice in tabela.indexes]
+    for indice in indices:
+        db.session.execute(text(f'DROP INDEX {indice.name}'))
+    db.session.commit()
+    assert not all(ok for _, _, ok in verificar_planos())
+
+    assert sorted(aplicar_indices()) == sorted(indice.name for indice in indices)
+    falhas = {nome: plano for nome, plano, ok in verificar_planos() if not ok}
+    assert falhas == {}
@@ -0,0 +1,24 @@
+"""Fila de tarefas de geração: ordem justa por valência e limite de gerações em curso."""
+
+from models import db, TarefaGeracao
+from tarefas import GestorTarefas, ordem_fila, ESTADO_CONCLUIDA, ESTADO_EM_EXECUCAO, MODO_SERVICO
+
+def test_ordem_fila_justa_por_valencia():
+    pendentes = [{'id': i, 'valencia': valencia} for i, valencia in enumerate('AAABBC')]
+    ordem = [tarefa['id'] for tarefa in ordem_fila(pendentes, {'A': 1})]
+    assert ordem == [3, 5, 0, 4, 1, 2]
+
+def mudar_estado(tarefa_id, estado):
+    db.session.get(TarefaGeracao, tarefa_id).estado = estado
+    db.session.commit()
+
+def test_limite_e_fila_contam_as_geracoes_de_outros_processos(app):
+    gestor = GestorTarefas(app, max_workers=2, modo=MODO_SERVICO)
+    a1, a2, b1 = (gestor.submeter(8, 2025, valencia) for valencia in ('A', 'A', 'B'))
+    # A1 está a correr noutro processo: a fila passa B à frente de A2
+    mudar_estado(a1, ESTADO_EM_EXECUCAO)
+    assert gestor._reclamar_proxima()['id'] == b1
+    # Já há duas gerações em curso, embora só uma seja deste processo
+    assert gestor._reclamar_proxima() is None
+    mudar_estado(a1, ESTADO_CONCLUIDA)
+    assert gestor._reclamar_proxima()['id'] == a2
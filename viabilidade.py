@@ -0,0 +1,144 @@
+from escalonador import MAX_DIAS_CONSECUTIVOS, matriz_disponibilidade
+from collections import deque
+import numpy as np
+import time
+
+class FluxoMaximo:
+    """Fluxo máximo (Dinic) sobre listas de adjacência, suficiente para centenas de funcionários × 31 dias"""
+    def __init__(self, n_nos):
+        self.grafo = [[] for _ in range(n_nos)]
+
+    def adicionar_aresta(self, origem, destino, capacidade):
+        self.grafo[origem].append([destino, capacidade, len(self.grafo[destino])])
+        self.grafo[destino].append([origem, 0, len(self.grafo[origem]) - 1])
+
+    def _niveis(self, fonte, sumidouro):
+        self.nivel = [-1] * len(self.grafo)
+        self.nivel[fonte] = 0
+        fila = deque([fonte])
+        while fila:
+            no = fila.popleft()
+            for destino, capacidade, _ in self.grafo[no]:
+                if capacidade > 0 and self.nivel[destino] < 0:
+                    self.nivel[destino] = self.nivel[no] + 1
+                    fila.append(destino)
+        return self.nivel[sumidouro] >= 0
+
+    def _aumentar(self, no, sumidouro, limite):
+        if no == sumidouro:
+            return limite
+        arestas = self.grafo[no]
+        while self.proxima[no] < len(arestas):
+            aresta = arestas[self.proxima[no]]
+            destino, capacidade, inversa = aresta
+            if capacidade > 0 and self.nivel[destino] == self.nivel[no] + 1:
+                enviado = self._aumentar(destino, sumidouro, min(limite, capacidade))
+                if enviado:
+                    aresta[1] -= enviado
+                    self.grafo[destino][inversa][1] += enviado
+                    return enviado
+            self.proxima[no] += 1
+        return 0
+
+    def calcular(self, fonte, sumidouro):
+        total = 0
+        while self._niveis(fonte, sumidouro):
+            self.proxima = [0] * len(self.grafo)
+            enviado = self._aumentar(fonte, sumidouro, float('inf'))
+            while enviado:
+                total += enviado
+                enviado = self._aumentar(fonte, sumidouro, float('inf'))
+        return total
+
+def dias_trabalhaveis(disponivel):
+    """Máximo de dias que se podem trabalhar sem passar de MAX_DIAS_CONSECUTIVOS seguidos"""
+    # Comprimento de cada sequência de dias disponíveis, a partir das transições da linha
+    bordas = np.diff(np.concatenate(([0], np.asarray(disponivel, dtype=np.int8), [0])))
+    sequencias = np.flatnonzero(bordas == -1) - np.flatnonzero(bordas == 1)
+    return int((sequencias - sequencias // (MAX_DIAS_CONSECUTIVOS + 1)).sum())
+
+def verificar_viabilidade(funcionarios, dias, restricoes, turnos_necessarios_por_dia, dias_previsao=0):
+    """Verificação polinomial de viabilidade, feita antes de construir o modelo CP-SAT.
+
+    restricoes: dict {funcionario_id: set(dias_folga)} ou matriz de disponibilidade.
+    dias_previsao: os últimos dias_previsao dias só contam para a procura por dia (como
+    em construir_modelo, ficam fora do equilíbrio).
+
+    Verifica, por esta ordem: funcionários disponíveis por dia face à procura do
+    dia, dias trabalháveis de cada funcionário face ao mínimo de turnos do
+    equilíbrio, e um fluxo com limites inferiores funcionários → dias contados (cada
+    funcionário entre o mínimo e o máximo de turnos, cada dia com a procura exata).
+    É uma relaxação do modelo construído com os mesmos dias_previsao: não rejeita um
+    problema que esse modelo resolva. Chamada sem dias_previsao sobre uma janela com
+    previsão, conta a previsão no equilíbrio e pode rejeitar janelas com solução.
+    Devolve um dict com 'viavel', 'motivos', 'dias_em_falta' ({dia: falta}) e 'tempo'.
+    """
+    inicio = time.perf_counter()
+    n_func = len(funcionarios)
+    n_dias = len(dias)
+    procura = [sum(turnos_necessarios_por_dia[dia]) for dia in dias]
+    # O equilíbrio e o fluxo só olham para os dias contados
+    dias_contados = n_dias - dias_previsao
+    total_turnos = sum(procura[:dias_contados])
+    min_turnos = total_turnos // n_func if n_func else 0
+    max_turnos = min_turnos + 1
+
+    disponivel = matriz_disponibilidade(funcionarios, dias, restricoes)
+    disponiveis_por_dia = disponivel.sum(axis=0).tolist()
+
+    motivos = []
+    dias_em_falta = {}
+    for d, dia in enumerate(dias):
+        disponiveis = disponiveis_por_dia[d]
+        if disponiveis < procura[d]:
+            dias_em_falta[dia] = procura[d] - disponiveis
+            motivos.append(f"{dia.strftime('%d/%m')} precisa de {procura[d]} funcionários, só {disponiveis} disponíveis após folgas")
+
+    maximos = []
+    for f, funcionario in enumerate(funcionarios):
+        trabalhaveis = dias_trabalhaveis(disponivel[f, :dias_contados])
+        if trabalhaveis < min_turnos:
+            motivos.append(f"{funcionario['nome']} tem de fazer pelo menos {min_turnos} turnos, "
+                           f"mas só pode trabalhar {trabalhaveis} dias")
+        maximos.append(min(max_turnos, trabalhaveis))
+
+    if not motivos and n_func:
+        # Circulação com limites inferiores: fonte → funcionário [min, max],
+        # funcionário → dia [0, 1] se disponível, dia → sumidouro [procura, procura]
+        fonte, sumidouro = 0, 1
+        primeiro_func, primeiro_dia = 2, 2 + n_func
+        super_fonte, super_sumidouro = 2 + n_func + dias_contados, 3 + n_func + dias_contados
+        fluxo = FluxoMaximo(4 + n_func + dias_contados)
+        excesso = [0] * (4 + n_func + dias_contados)
+
+        for f in range(n_func):
+            no_func = primeiro_func + f
+            fluxo.adicionar_aresta(fonte, no_func, max(maximos[f] - min_turnos, 0))
+            excesso[no_func] += min_turnos
+            excesso[fonte] -= min_turnos
+            for d in np.flatnonzero(disponivel[f, :dias_contados]).tolist():
+                fluxo.adicionar_aresta(no_func, primeiro_dia + d, 1)
+        for d in range(dias_contados):
+            excesso[sumidouro] += procura[d]
+            excesso[primeiro_dia + d] -= procura[d]
+        fluxo.adicionar_aresta(sumidouro, fonte, total_turnos)
+
+        necessario = 0
+        for no, valor in enumerate(excesso):
+            if valor > 0:
+                fluxo.adicionar_aresta(super_fonte, no, valor)
+                necessario += valor
+            elif valor < 0:
+                fluxo.adicionar_aresta(no, super_sumidouro, -valor)
+
+        em_falta = necessario - fluxo.calcular(super_fonte, super_sumidouro)
+        if em_falta:
+            motivos.append(f"As folgas não permitem distribuir os {total_turnos} turnos com {min_turnos}-{max_turnos} "
+                           f"turnos por funcionário (faltam {em_falta} atribuições)")
+
+    return {
+        'viavel': not motivos,
+        'motivos': motivos,
+        'dias_em_falta': dias_em_falta,
+        'tempo': time.perf_counter() - inicio
+    }